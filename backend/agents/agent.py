@@ -41,9 +41,9 @@ class Agent:
             self.relationships.update_affinity(other_agent_id, event_delta)
 
 
-    async def act(self, other_agents_names, agent_id_map: dict[str, int] | None = None):
+    def build_decision_context(self, other_agents_names, agent_id_map: dict[str, int] | None = None):
         """
-        Принимает решение и возвращает действие.
+        Собрать контекст для планировщика: настроение, недавние воспоминания, отношения.
         agent_id_map: {имя: id} — для корректного поиска отношений.
         """
         recent = self.memory.get_recent(7)
@@ -62,16 +62,31 @@ class Agent:
             rel_parts.append(f"{other_name}: {affinity}")
         relations_str = ", ".join(rel_parts)
 
-        action = await self.planner.decide_action(
-            mood_label=mood_label,
-            recent_memories=recent_text,
-            other_agents_names=other_agents_names,
-            relations=relations_str
-        )
-        # Сохраняем текущий план 
+        return {
+            "mood_label": mood_label,
+            "recent_memories": recent_text,
+            "other_agents_names": other_agents_names,
+            "relations": relations_str,
+        }
+
+
+    def adopt_action(self, action):
+        """Запомнить принятое решение как текущий план"""
         if action.get("type") == "message":
             self.current_goal = action.get("content", "")[:50]
         else:
             self.current_goal = "Размышляет..."
+
+
+    async def act(self, other_agents_names, agent_id_map: dict[str, int] | None = None, on_delta=None):
+        """
+        Принимает решение и возвращает действие.
+        agent_id_map: {имя: id} — для корректного поиска отношений.
+        on_delta: колбэк для фрагментов ответа LLM по мере генерации
+        """
+        context = self.build_decision_context(other_agents_names, agent_id_map)
+        action = await self.planner.decide_action(**context, on_delta=on_delta)
+        # Сохраняем текущий план 
+        self.adopt_action(action)
         return action
 
@@ -43,7 +43,7 @@ async def generate_agent_profile(user_input: dict) -> dict:
         base_memory=base_memory,
     )
     llm = LLMClient()
-    response = await llm.generate(prompt, system_prompt=PROFILE_GEN_SYSTEM)
+    response = await llm.generate(prompt, system_prompt=PROFILE_GEN_SYSTEM, call_type="profile")
     
     try:
         start = response.find('{')
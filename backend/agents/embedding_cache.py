@@ -0,0 +1,139 @@
+"""
+Кэш эмбеддингов, общий для всех агентов.
+Ключ — sha256 нормализованного текста, поэтому одинаковое «[Событие мира] ...»,
+разосланное всем агентам, считается один раз на процесс.
+Два уровня: LRU в памяти и (опционально) SQLite на диске.
+Вызывается из потоков сервиса памяти — доступ защищён блокировкой.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация перед хэшированием: Unicode NFC и схлопывание пробелов."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Обёртка над функцией эмбеддингов ChromaDB с кэшем по хэшу текста."""
+
+    def __init__(self, inner: Any, memory_items: int, path: str | None = None) -> None:
+        self._inner = inner
+        self.memory_items = memory_items
+        self.path = path
+        # Модель входит в ключ, чтобы не смешивать векторы разных моделей
+        self._model = type(inner).__name__
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self._stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "deduplicated": 0}
+
+    def _key(self, text: str) -> str:
+        raw = f"{self._model}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection | None:
+        if self.path is None:
+            return None
+        if self._db is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                " key TEXT PRIMARY KEY,"
+                " vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: list[str]) -> dict[str, np.ndarray]:
+        found: dict[str, np.ndarray] = {}
+        missing: dict[str, None] = {}
+        for key in keys:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                found[key] = vector
+                self._stats["hits_memory"] += 1
+            else:
+                missing[key] = None
+
+        db = self._connection()
+        if db is not None and missing:
+            placeholders = ",".join("?" * len(missing))
+            rows = db.execute(
+                f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})",
+                list(missing),
+            ).fetchall()
+            for key, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                self._remember(key, vector)
+                found[key] = vector
+                self._stats["hits_disk"] += 1
+        return found
+
+    def __call__(self, input: Documents) -> Embeddings:
+        keys = [self._key(text) for text in input]
+        with self._lock:
+            found = self._lookup(keys)
+
+        # Тексты без эмбеддинга — каждый уникальный ровно один раз
+        todo: dict[str, str] = {}
+        for key, text in zip(keys, input):
+            if key not in found and key not in todo:
+                todo[key] = text
+
+        if todo:
+            vectors = self._inner(list(todo.values()))
+            fresh = {
+                key: np.asarray(vector, dtype=np.float32)
+                for key, vector in zip(todo, vectors)
+            }
+            with self._lock:
+                for key, vector in fresh.items():
+                    self._remember(key, vector)
+                db = self._connection()
+                if db is not None:
+                    try:
+                        db.executemany(
+                            "INSERT OR REPLACE INTO embedding_cache (key, vector) VALUES (?, ?)",
+                            [(key, vector.tobytes()) for key, vector in fresh.items()],
+                        )
+                        db.commit()
+                    except sqlite3.Error:
+                        logger.exception("Не удалось записать эмбеддинги в дисковый кэш")
+                self._stats["misses"] += len(fresh)
+                # Повторы внутри одного вызова посчитаны один раз
+                self._stats["deduplicated"] += sum(1 for k in keys if k in fresh) - len(fresh)
+            found.update(fresh)
+
+        return [found[key] for key in keys]
+
+    def stats(self) -> dict[str, Any]:
+        return {**self._stats, "memory_items": len(self._memory)}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -2,14 +2,21 @@
 Модуль для управления эпизодической памятью агента
 Используем ChromaDB для хранения и поиска воспоминаний
 Создает автоматическую суммаризацию старых воспоминаний при превышении лимита
+Операции с коллекцией выполняются в пуле потоков сервиса памяти (memory_service),
+новые воспоминания пишутся пачками через буфер записи (memory_buffer)
 """
 
-import chromadb
-from chromadb.config import Settings
 import uuid
+from collections import deque
 from datetime import datetime
-import asyncio
 import logging
+from backend.agents.memory_archive import memory_archive
+from backend.agents.memory_buffer import memory_buffer
+from backend.agents.memory_service import memory_service
+from backend.agents.memory_store import memory_stores
+from backend.agents.memory_sync import memory_sync
+from backend.agents.summarizer import summarizer
+from backend.config import settings
 from backend.llm.client import LLMClient
 from backend.llm.prompts import SUMMARIZE_SYSTEM, SUMMARIZE_PROMPT_TEMPLATE
 
@@ -18,28 +25,45 @@ logger = logging.getLogger(__name__)
 
 class Memory:
 
-    def __init__(self, agent_id, persist_directory="./data/chroma", summarization_limit=50):
+    def __init__(self, agent_id, persist_directory=None, summarization_limit=None):
         """
         agent_id: айди агента
-        persist_directory: папка для хранения данных ChromaDB
+        persist_directory: папка для хранения данных ChromaDB (по умолчанию settings.chroma_abs_dir)
         summarization_limit: после скольких воспоминаний запускать суммирование
+            (по умолчанию settings.memory_warm_limit)
         """
-        self.client = chromadb.PersistentClient(
-            path=persist_directory,
-            settings=Settings(
-                anonymized_telemetry=False,
-            ),
-        )
         self.collection_name = f"agent_{agent_id}"
-        # Используем get_or_create вместо delete+create чтобы сохранять данные между перезапусками
-        self.collection = self.client.get_or_create_collection(
-            name=self.collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
+        # Клиент ChromaDB общий для всех агентов — коллекцию выдаёт реестр
+        self.collection = memory_stores.get_collection(agent_id, persist_directory)
+        self.embedding_function = memory_stores.embedding_function
         self.agent_id = agent_id
-        self.summarization_limit = summarization_limit
+        self.summarization_limit = summarization_limit or settings.memory_warm_limit
+        # Токены LLM, потраченные последней суммаризацией (для метрик планировщика)
+        self.last_summary_tokens = 0
         # Инициализируем счётчик реальным количеством записей
         self._count = self.collection.count()
+        # Кольцевой буфер последних воспоминаний: (id, timestamp, текст), от старых к новым
+        self._recent = deque(maxlen=settings.memory_recent_buffer)
+        self._rebuild_recent()
+
+
+
+    def _rebuild_recent(self):
+        """
+        Заполняет буфер последних воспоминаний из ChromaDB (один раз при старте)
+        """
+        self._recent.clear()
+        if self._count == 0:
+            return
+        all_data = self.collection.get(include=["documents", "metadatas"])
+        if not all_data['metadatas']:
+            return
+        items = sorted(
+            zip(all_data['ids'], all_data['documents'], all_data['metadatas']),
+            key=lambda x: x[2].get('timestamp', '')
+        )
+        for memory_id, doc, meta in items[-self._recent.maxlen:]:
+            self._recent.append((memory_id, meta.get('timestamp', ''), doc))
 
 
 
@@ -55,27 +79,33 @@ class Memory:
             "type": "episodic"
         })
         memory_id = str(uuid.uuid4())
-        self.collection.add(
-            documents=[text],
-            metadatas=[metadata],
-            ids=[memory_id]
-        )
+        # В ChromaDB запись попадёт пачкой при сбросе буфера
+        memory_buffer.enqueue(self, memory_id, text, metadata)
+        # Копия в таблицу memories — пачкой, в фоне
+        memory_sync.record_add(self.agent_id, memory_id, text, metadata["timestamp"])
         self._count += 1
-        asyncio.create_task(self._check_and_summarize())
+        self._recent.append((memory_id, metadata["timestamp"], text))
+        # Суммаризация — фоновой задачей планировщика (одна на агента, с задержкой)
+        summarizer.request(self)
 
 
 
     async def _check_and_summarize(self):
         """
         Проверяет, нужно ли выполнить суммаризацию, и если да — запускает её.
+        Возвращает True, если суммаризация была выполнена.
         """
         if self._count <= self.summarization_limit:
-            return
-
-        # все данные коллекции
-        all_data = self.collection.get()
+            return False
+
+        # все данные коллекции (включая ещё не записанные из буфера);
+        # если часть не записалась — отложить, иначе сводка пропустит их
+        if not await memory_buffer.flush():
+            logger.warning("Суммаризация агента %s отложена: буфер памяти не записан", self.agent_id)
+            return False
+        all_data = await memory_service.run("get", self.collection.get)
         if not all_data['metadatas']:
-            return
+            return False
 
         # старые первые
         items = sorted(
@@ -83,20 +113,34 @@ class Memory:
             key=lambda x: x[2].get('timestamp', '')
         )
 
-        # Оставляем последние 10 
-        keep_count = 10
+        # Оставляем последние memory_warm_keep сырых воспоминаний
+        keep_count = settings.memory_warm_keep
         to_summarize = items[:-keep_count] if len(items) > keep_count else []
         if not to_summarize:
-            return
+            return False
 
         ids_to_remove = [item[0] for item in to_summarize]
         texts_to_summarize = [item[1] for item in to_summarize]
 
-        # вызов LLM для суммаризации
+        # вызов LLM для суммаризации; без сводки ничего не удаляем — повторим позже
         summary = await self._summarize_texts(texts_to_summarize)
+        if summary is None:
+            return False
+        summary_id = str(uuid.uuid4())
+
+        # Сырые воспоминания уходят в холодный архив, а не удаляются бесследно
+        try:
+            await memory_archive.archive(
+                self.agent_id,
+                [(item[0], item[1], item[2]) for item in to_summarize],
+                summary_id=summary_id,
+            )
+        except Exception:
+            logger.exception("Не удалось архивировать память агента %s", self.agent_id)
+            return False
 
         # Удаляем старые
-        self.collection.delete(ids=ids_to_remove)
+        await memory_service.run("delete", self.collection.delete, ids=ids_to_remove)
 
         # Добавляем суммаризированное воспоминание
         summary_metadata = {
@@ -105,8 +149,9 @@ class Memory:
             "type": "summary",
             "summarized_ids": ",".join(ids_to_remove) 
         }
-        summary_id = str(uuid.uuid4())
-        self.collection.add(
+        await memory_service.run(
+            "add",
+            self.collection.add,
             documents=[summary],
             metadatas=[summary_metadata],
             ids=[summary_id]
@@ -114,11 +159,23 @@ class Memory:
         #  счётчик
         self._count = self._count - len(ids_to_remove) + 1
 
+        # Буфер: убираем суммаризированные, сводка — самая свежая запись
+        removed = set(ids_to_remove)
+        kept = [item for item in self._recent if item[0] not in removed]
+        self._recent.clear()
+        self._recent.extend(kept)
+        self._recent.append((summary_id, summary_metadata["timestamp"], summary))
+        memory_sync.record_summary(
+            self.agent_id, summary_id, summary, summary_metadata["timestamp"], ids_to_remove
+        )
+        return True
+
 
 
     async def _summarize_texts(self, texts):
         """
         список текстов в LLM -возвращает краткую суммаризацию
+        None — LLM недоступен (заглушка вместо сводки стёрла бы воспоминания)
         """
         if not texts:
             return "Нет событий."
@@ -128,17 +185,22 @@ class Memory:
 
         try:
             llm = LLMClient()
-            summary = await llm.generate(prompt, system_prompt=SUMMARIZE_SYSTEM)
+            summary = await llm.generate(prompt, system_prompt=SUMMARIZE_SYSTEM, call_type="summary")
+            self.last_summary_tokens = llm.last_usage_tokens
             return summary
         except Exception:
             logger.exception("Ошибка суммаризации памяти агента %s", self.agent_id)
-            return "Произошло несколько событий."
+            return None
 
 
 
-    def search_similar(self, query_text, n_results=5):
+    async def search_similar(self, query_text, n_results=5):
         """Находит похожие воспоминания по смыслу"""
-        results = self.collection.query(
+        if not await memory_buffer.flush():
+            logger.warning("Поиск по памяти агента %s без части новых воспоминаний", self.agent_id)
+        results = await memory_service.run(
+            "query",
+            self.collection.query,
             query_texts=[query_text],
             n_results=n_results
         )
@@ -146,16 +208,18 @@ class Memory:
 
 
 
+    def tier_stats(self):
+        """Размеры горячего (RAM) и тёплого (векторный индекс) уровней памяти"""
+        return {"hot": len(self._recent), "warm": self._count}
+
+
+
     def get_recent(self, n=5):
-        """Вернет последние n воспоминаний"""
-        all_data = self.collection.get()
-        if not all_data['metadatas']:
-            return []
-        # от новых к старым
-        sorted_items = sorted(
-            zip(all_data['documents'], all_data['metadatas']),
-            key=lambda x: x[1].get('timestamp', ''),
-            reverse=True
-        )
-        return [doc for doc, _ in sorted_items[:n]]
+        """
+        Вернет последние n воспоминаний (от новых к старым)
+        Только из кольцевого буфера: n больше settings.memory_recent_buffer обрезается —
+        синхронное чтение коллекции блокировало бы event loop и не видело бы
+        воспоминаний, ещё ждущих записи в memory_buffer
+        """
+        return [doc for _, _, doc in list(self._recent)[::-1][:n]]
 
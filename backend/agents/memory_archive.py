@@ -0,0 +1,148 @@
+"""
+Холодный уровень памяти агентов.
+Уровни:
+  горячий — кольцевой буфер последних воспоминаний в RAM (Memory._recent)
+  тёплый  — векторный индекс (ChromaDB / NumPy), до memory_warm_limit записей
+  холодный — таблица memory_archive в SQLite: сырые воспоминания, которые
+             суммаризация заменила сводкой; сжаты zlib, индекс (agent_id, timestamp)
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import zlib
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from backend.config import settings
+from backend.db.database import async_session
+from backend.db.models import MemoryArchiveModel
+
+logger = logging.getLogger(__name__)
+
+
+def _pack(text: str, metadata: dict[str, Any]) -> tuple[bytes, int]:
+    """Сжатая запись и размер до сжатия."""
+    raw = json.dumps({"text": text, "metadata": metadata}, ensure_ascii=False).encode("utf-8")
+    return zlib.compress(raw, 6), len(raw)
+
+
+def _unpack(payload: bytes) -> dict[str, Any]:
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+def _parse_timestamp(value: str | None) -> datetime:
+    try:
+        return datetime.fromisoformat(value) if value else datetime.now()
+    except ValueError:
+        return datetime.now()
+
+
+class MemoryArchive:
+    """Запись и чтение холодного архива воспоминаний."""
+
+    def __init__(self, session_factory=async_session) -> None:
+        self._session_factory = session_factory
+        self._stats = {"archived": 0, "pruned": 0, "raw_bytes": 0, "compressed_bytes": 0}
+
+    async def archive(
+        self,
+        agent_id: int,
+        items: list[tuple[str, str, dict[str, Any]]],
+        summary_id: str | None = None,
+    ) -> None:
+        """
+        Сохранить воспоминания (id, текст, метаданные) одной транзакцией.
+        Повтор с теми же id (суммаризация упала после архивации) не дублирует строки —
+        у уже архивных меняется только summary_id на последнюю сводку.
+        """
+        if not items:
+            return
+        rows = []
+        for memory_id, text, metadata in items:
+            payload, raw_size = _pack(text, metadata)
+            self._stats["raw_bytes"] += raw_size
+            self._stats["compressed_bytes"] += len(payload)
+            rows.append({
+                "agent_id": agent_id,
+                "memory_id": memory_id,
+                "summary_id": summary_id,
+                "timestamp": _parse_timestamp(metadata.get("timestamp")),
+                "payload": payload,
+            })
+
+        stmt = insert(MemoryArchiveModel)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["memory_id"], set_={"summary_id": stmt.excluded.summary_id}
+        )
+        async with self._session_factory() as session:
+            await session.execute(stmt, rows)
+            limit = settings.memory_archive_max_per_agent
+            if limit > 0:
+                # Хранить только limit самых свежих записей агента
+                keep = (
+                    select(MemoryArchiveModel.id)
+                    .where(MemoryArchiveModel.agent_id == agent_id)
+                    .order_by(MemoryArchiveModel.timestamp.desc())
+                    .limit(limit)
+                )
+                result = await session.execute(
+                    delete(MemoryArchiveModel).where(
+                        MemoryArchiveModel.agent_id == agent_id,
+                        MemoryArchiveModel.id.not_in(keep),
+                    )
+                )
+                self._stats["pruned"] += result.rowcount or 0
+            await session.commit()
+        self._stats["archived"] += len(rows)
+
+    async def lookup(
+        self,
+        agent_id: int,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        limit: int = 50,
+    ) -> list[dict[str, Any]]:
+        """Архивные воспоминания агента за период (от новых к старым)."""
+        query = select(MemoryArchiveModel).where(MemoryArchiveModel.agent_id == agent_id)
+        if since is not None:
+            query = query.where(MemoryArchiveModel.timestamp >= since)
+        if until is not None:
+            query = query.where(MemoryArchiveModel.timestamp < until)
+        query = query.order_by(MemoryArchiveModel.timestamp.desc()).limit(limit)
+
+        async with self._session_factory() as session:
+            rows = (await session.execute(query)).scalars().all()
+        result = []
+        for row in rows:
+            data = _unpack(row.payload)
+            result.append({
+                "memory_id": row.memory_id,
+                "summary_id": row.summary_id,
+                "timestamp": row.timestamp.isoformat(),
+                "content": data["text"],
+                "metadata": data["metadata"],
+            })
+        return result
+
+    async def count(self, agent_id: int) -> int:
+        async with self._session_factory() as session:
+            return (await session.execute(
+                select(func.count(MemoryArchiveModel.id))
+                .where(MemoryArchiveModel.agent_id == agent_id)
+            )).scalar() or 0
+
+    def stats(self) -> dict[str, Any]:
+        raw = self._stats["raw_bytes"]
+        return {
+            **self._stats,
+            "compression_ratio": round(self._stats["compressed_bytes"] / raw, 3) if raw else 0.0,
+        }
+
+
+# Глобальный экземпляр
+memory_archive = MemoryArchive()
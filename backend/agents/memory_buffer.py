@@ -0,0 +1,185 @@
+"""
+Буфер записи воспоминаний.
+Memory.add_memory кладёт запись сюда, а в ChromaDB она уходит пачкой:
+в конце тика, при накоплении memory_flush_size записей или через
+memory_flush_interval секунд после первой незаписанной.
+Эмбеддинги всей пачки считаются одним вызовом, затем — один add на коллекцию агента.
+
+Read-your-writes: get_recent обслуживается кольцевым буфером Memory,
+поиск и суммаризация перед чтением вызывают flush() — он возвращает False,
+если часть записей записать не удалось (они ждут повтора).
+Повторяются только записи, чья пачка эмбеддинга или add упали; после
+_MAX_ATTEMPTS неудач запись отбрасывается.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, NamedTuple
+
+from backend.agents.memory_service import memory_service
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз пытаться записать воспоминание, прежде чем отбросить
+_MAX_ATTEMPTS = 3
+
+
+class PendingMemory(NamedTuple):
+    memory: Any  # backend.agents.memory.Memory
+    memory_id: str
+    text: str
+    metadata: dict[str, Any]
+
+
+def _write_batch(entries: list[PendingMemory]) -> list[PendingMemory]:
+    """
+    Записать пачку (выполняется в потоке сервиса памяти).
+    Возвращает записи, которые записать не удалось: ошибка эмбеддинга или add
+    одной коллекции не мешает остальным.
+    """
+    failed: set[int] = set()
+    # Один вызов эмбеддинга на функцию (в приложении она одна на всех агентов)
+    embeddings: dict[int, Any] = {}
+    by_function: dict[int, tuple[Any, list[int]]] = {}
+    for i, entry in enumerate(entries):
+        fn = entry.memory.embedding_function
+        by_function.setdefault(id(fn), (fn, []))[1].append(i)
+    for fn, indexes in by_function.values():
+        try:
+            vectors = fn([entries[i].text for i in indexes])
+        except Exception:
+            logger.exception("Не удалось посчитать эмбеддинги (%d шт.)", len(indexes))
+            failed.update(indexes)
+            continue
+        for i, vector in zip(indexes, vectors):
+            embeddings[i] = vector
+
+    by_collection: dict[int, tuple[Any, list[int]]] = {}
+    for i, entry in enumerate(entries):
+        if i in failed:
+            continue
+        collection = entry.memory.collection
+        by_collection.setdefault(id(collection), (collection, []))[1].append(i)
+    for collection, indexes in by_collection.values():
+        try:
+            collection.add(
+                ids=[entries[i].memory_id for i in indexes],
+                documents=[entries[i].text for i in indexes],
+                metadatas=[entries[i].metadata for i in indexes],
+                embeddings=[embeddings[i] for i in indexes],
+            )
+        except Exception:
+            logger.exception("Не удалось записать воспоминания в коллекцию (%d шт.)", len(indexes))
+            failed.update(indexes)
+    return [entry for i, entry in enumerate(entries) if i in failed]
+
+
+class MemoryWriteBuffer:
+    """Накопитель записей в память всех агентов."""
+
+    def __init__(self, flush_size: int, flush_interval: float) -> None:
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self._pending: list[PendingMemory] = []
+        self._writes: set[asyncio.Task] = set()
+        self._timer: asyncio.Task | None = None
+        # memory_id → число неудачных попыток записи
+        self._attempts: dict[str, int] = {}
+        self._stats = {
+            "flushes": 0,
+            "documents_written": 0,
+            "max_batch": 0,
+            "failed_flushes": 0,
+            "dropped": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, memory, memory_id: str, text: str, metadata: dict[str, Any]) -> None:
+        self._pending.append(PendingMemory(memory, memory_id, text, metadata))
+        if len(self._pending) >= self.flush_size:
+            self._start_write()
+        else:
+            self._schedule()
+
+    def _schedule(self) -> None:
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._start_write()
+
+    def _start_write(self) -> None:
+        if not self._pending:
+            return
+        entries, self._pending = self._pending, []
+        task = asyncio.create_task(self._write(entries))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self, entries: list[PendingMemory]) -> bool:
+        """Записать пачку; True — записано всё."""
+        started = time.perf_counter()
+        try:
+            failed = await memory_service.run("flush", _write_batch, entries)
+        except Exception:
+            logger.exception("Не удалось записать пачку воспоминаний (%d шт.)", len(entries))
+            failed = entries
+        written = len(entries) - len(failed)
+        if written:
+            self._stats["flushes"] += 1
+            self._stats["documents_written"] += written
+            self._stats["max_batch"] = max(self._stats["max_batch"], written)
+            self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        failed_ids = {entry.memory_id for entry in failed}
+        for entry in entries:
+            if entry.memory_id not in failed_ids:
+                self._attempts.pop(entry.memory_id, None)
+        if not failed:
+            return True
+
+        self._stats["failed_flushes"] += 1
+        retry = []
+        for entry in failed:
+            attempts = self._attempts.get(entry.memory_id, 0) + 1
+            if attempts >= _MAX_ATTEMPTS:
+                # Постоянная ошибка (например, эмбеддинг не считается) — не повторять вечно
+                self._attempts.pop(entry.memory_id, None)
+                self._stats["dropped"] += 1
+                logger.error("Воспоминание %s отброшено после %d попыток", entry.memory_id, attempts)
+            else:
+                self._attempts[entry.memory_id] = attempts
+                retry.append(entry)
+        if retry:
+            # В начало очереди; повтор — по таймеру, не дожидаясь новых записей
+            self._pending[:0] = retry
+            self._schedule()
+        return False
+
+    async def flush(self) -> bool:
+        """
+        Записать всё накопленное и дождаться текущих записей.
+        False — часть записей не записана: коллекция может не содержать их.
+        """
+        self._start_write()
+        if not self._writes:
+            return True
+        return all(await asyncio.gather(*list(self._writes)))
+
+    def stats(self) -> dict[str, Any]:
+        return {**self._stats, "pending": len(self._pending)}
+
+
+# Глобальный экземпляр
+memory_buffer = MemoryWriteBuffer(
+    flush_size=settings.memory_flush_size,
+    flush_interval=settings.memory_flush_interval,
+)
@@ -0,0 +1,115 @@
+"""
+Сервис памяти: выполняет блокирующие операции ChromaDB (запись, поиск,
+эмбеддинги) в пуле потоков, чтобы не останавливать event loop.
+Очередь ограничена — при переполнении вызывающий ждёт (backpressure).
+Публикует глубину очереди и латентность по типам операций (/api/health).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class MemoryService:
+    """Пул потоков для операций с векторным хранилищем + статистика."""
+
+    def __init__(self, workers: int, queue_size: int) -> None:
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self._executor: ThreadPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._slots_loop: asyncio.AbstractEventLoop | None = None
+        self._queued = 0
+        self._in_flight = 0
+        self._ops: dict[str, dict[str, float]] = {}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Пул потоков; создаётся при первом обращении."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="memory"
+            )
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Семафор привязан к циклу, в котором создан (в тестах циклы разные)
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.queue_size)
+            self._slots_loop = loop
+        return self._slots
+
+    async def run(self, op: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Выполнить fn(*args, **kwargs) в пуле потоков; op — имя операции для статистики."""
+        self._queued += 1
+        try:
+            async with self._get_slots():
+                started = time.perf_counter()
+                self._in_flight += 1
+                try:
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, functools.partial(fn, *args, **kwargs)
+                    )
+                except Exception:
+                    self._record(op, time.perf_counter() - started, error=True)
+                    raise
+                finally:
+                    self._in_flight -= 1
+                self._record(op, time.perf_counter() - started)
+                return result
+        finally:
+            self._queued -= 1
+
+    def _record(self, op: str, seconds: float, error: bool = False) -> None:
+        entry = self._ops.setdefault(
+            op, {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        )
+        entry["count"] += 1
+        entry["errors"] += int(error)
+        entry["total_seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            # Незавершённые операции: ждут места в очереди, потока или выполняются
+            "queue_depth": self._queued,
+            # Принятые в очередь пула потоков (не больше queue_size)
+            "in_flight": self._in_flight,
+            "ops": {
+                op: {
+                    "count": int(e["count"]),
+                    "errors": int(e["errors"]),
+                    "avg_ms": round(e["total_seconds"] / e["count"] * 1000, 3) if e["count"] else 0.0,
+                    "max_ms": round(e["max_seconds"] * 1000, 3),
+                }
+                for op, e in self._ops.items()
+            },
+        }
+
+    def shutdown(self) -> None:
+        """Дождаться текущих операций и остановить потоки (при остановке приложения)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            logger.info("Сервис памяти остановлен")
+
+
+# Глобальный экземпляр
+memory_service = MemoryService(
+    workers=settings.memory_workers,
+    queue_size=settings.memory_queue_size,
+)
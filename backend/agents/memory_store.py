@@ -0,0 +1,123 @@
+"""
+Реестр хранилищ памяти агентов.
+Один chromadb.PersistentClient на директорию хранения (вместо клиента на агента),
+коллекции агентов создаются по первому запросу и переиспользуются.
+Функция эмбеддингов тоже общая — буфер записи считает эмбеддинги пачкой,
+а кэш эмбеддингов (embedding_cache.py) не пересчитывает одинаковые тексты.
+При MEMORY_BACKEND=numpy вместо коллекций ChromaDB выдаются NumpyVectorStore.
+Закрывается при остановке приложения (lifespan в main.py).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Any
+
+import chromadb
+import chromadb.utils.embedding_functions
+from chromadb.config import Settings
+
+from backend.agents.embedding_cache import CachedEmbeddingFunction
+from backend.agents.vector_store import NumpyVectorStore
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStoreRegistry:
+    """Владеет клиентами ChromaDB и коллекциями агентов."""
+
+    def __init__(self, embedding_cache_path: str | None = None) -> None:
+        """embedding_cache_path: SQLite-файл кэша эмбеддингов (None — только память)."""
+        self.embedding_cache_path = embedding_cache_path
+        self._clients: dict[str, Any] = {}
+        self._collections: dict[tuple[str, str], Any] = {}
+        self._embedding_function = None
+        # Коллекции могут запрашиваться и из потоков-исполнителей
+        self._lock = threading.RLock()
+
+    def get_client(self, persist_directory: str | None = None):
+        """Общий клиент для директории (по умолчанию settings.chroma_abs_dir)."""
+        path = persist_directory or settings.chroma_abs_dir
+        with self._lock:
+            client = self._clients.get(path)
+            if client is None:
+                client = chromadb.PersistentClient(
+                    path=path,
+                    settings=Settings(
+                        anonymized_telemetry=False,
+                    ),
+                )
+                self._clients[path] = client
+                logger.info("ChromaDB клиент открыт: %s", path)
+            return client
+
+    @property
+    def embedding_function(self):
+        """Общая кэширующая функция эмбеддингов (модель загружается при первом вызове)."""
+        with self._lock:
+            if self._embedding_function is None:
+                self._embedding_function = CachedEmbeddingFunction(
+                    chromadb.utils.embedding_functions.DefaultEmbeddingFunction(),
+                    memory_items=settings.embedding_cache_memory_items,
+                    path=self.embedding_cache_path,
+                )
+            return self._embedding_function
+
+    def get_collection(self, agent_id, persist_directory: str | None = None):
+        """Коллекция воспоминаний агента; создаётся при первом обращении."""
+        path = persist_directory or settings.chroma_abs_dir
+        name = f"agent_{agent_id}"
+        with self._lock:
+            collection = self._collections.get((path, name))
+            if collection is None:
+                if settings.memory_backend == "numpy":
+                    collection = NumpyVectorStore(
+                        os.path.join(path, "numpy", name),
+                        embedding_function=self.embedding_function,
+                    )
+                else:
+                    # get_or_create — данные сохраняются между перезапусками
+                    collection = self.get_client(path).get_or_create_collection(
+                        name=name,
+                        metadata={"hnsw:space": "cosine"},
+                        embedding_function=self.embedding_function,
+                    )
+                self._collections[(path, name)] = collection
+            return collection
+
+    def stats(self) -> dict[str, Any]:
+        stats: dict[str, Any] = {
+            "backend": settings.memory_backend,
+            "clients": len(self._clients),
+            "collections": len(self._collections),
+        }
+        if self._embedding_function is not None:
+            stats["embedding_cache"] = self._embedding_function.stats()
+        return stats
+
+    def close(self) -> None:
+        """Забыть клиенты и коллекции ChromaDB."""
+        with self._lock:
+            # Публичного close() у chromadb нет. Записи в его SQLite фиксируются при
+            # каждой операции, поэтому останавливать System не нужно: достаточно
+            # убрать его из общего кэша chromadb и отпустить ссылки — файлы индекса
+            # закроются сборщиком мусора, а новый клиент по тому же пути создаст
+            # свежий System, а не переиспользует этот
+            if self._clients:
+                try:
+                    next(iter(self._clients.values())).clear_system_cache()
+                except Exception:
+                    logger.exception("Ошибка при сбросе кэша ChromaDB")
+                logger.info("ChromaDB клиенты закрыты (%d)", len(self._clients))
+            self._clients.clear()
+            self._collections.clear()
+            if self._embedding_function is not None:
+                self._embedding_function.close()
+                self._embedding_function = None
+
+
+# Глобальный экземпляр
+memory_stores = MemoryStoreRegistry(embedding_cache_path=settings.embedding_cache_abs_path)
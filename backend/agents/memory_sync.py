@@ -0,0 +1,183 @@
+"""
+Write-behind синхронизация памяти агентов с таблицей memories.
+Memory сообщает о новых воспоминаниях и сводках, а в SQLite они уходят
+пачками, одной транзакцией на сброс: по таймеру, по размеру и в конце тика.
+id воспоминания в векторном хранилище записывается в memories.uid,
+поэтому инспектор агента (GET /api/agents/{id}) читает только SQL.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+
+from backend.config import settings
+from backend.db.database import async_session
+from backend.db.models import MemoryModel
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз пытаться записать операцию, прежде чем отбросить её
+_MAX_ATTEMPTS = 3
+
+
+def _parse_timestamp(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.now()
+
+
+class MemorySyncQueue:
+    """Очередь изменений памяти для таблицы memories."""
+
+    def __init__(self, batch_size: int, interval: float, session_factory=async_session) -> None:
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self._session_factory = session_factory
+        # ("insert", row) / ("delete", uid) — в порядке поступления
+        self._ops: list[tuple[str, Any]] = []
+        self._writes: set[asyncio.Task] = set()
+        self._timer: asyncio.Task | None = None
+        self._lock: asyncio.Lock | None = None
+        # Неудачные попытки по операциям: ("insert" | "delete", uid) → число
+        self._attempts: dict[tuple[str, str], int] = {}
+        self._stats = {
+            "batches": 0,
+            "inserted": 0,
+            "deleted": 0,
+            "failed_batches": 0,
+            "dropped": 0,
+        }
+
+    @property
+    def pending(self) -> int:
+        return len(self._ops)
+
+    def record_add(self, agent_id: int, uid: str, content: str, timestamp: str) -> None:
+        """Новое воспоминание агента."""
+        self._push(("insert", {
+            "agent_id": agent_id,
+            "uid": uid,
+            "content": content,
+            "summary": None,
+            "timestamp": _parse_timestamp(timestamp),
+            "is_key": False,
+        }))
+
+    def record_summary(
+        self, agent_id: int, uid: str, summary: str, timestamp: str, replaced_uids: list[str]
+    ) -> None:
+        """Сводка заменила воспоминания replaced_uids (они остаются в memory_archive)."""
+        if not settings.memory_sync_enabled:
+            return
+        # Сводка — ключевое воспоминание: в ней сжата история агента
+        self._push(("insert", {
+            "agent_id": agent_id,
+            "uid": uid,
+            "content": summary,
+            "summary": summary,
+            "timestamp": _parse_timestamp(timestamp),
+            "is_key": True,
+        }))
+        for replaced in replaced_uids:
+            self._push(("delete", replaced))
+
+    def _push(self, op: tuple[str, Any]) -> None:
+        if not settings.memory_sync_enabled:
+            return
+        self._ops.append(op)
+        if len(self._ops) >= self.batch_size:
+            self._start_write()
+        else:
+            self._schedule()
+
+    def _schedule(self) -> None:
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.interval)
+        self._start_write()
+
+    def _start_write(self) -> None:
+        if not self._ops:
+            return
+        task = asyncio.create_task(self._write())
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    @staticmethod
+    def _op_key(op: tuple[str, Any]) -> tuple[str, str]:
+        kind, payload = op
+        return kind, payload["uid"] if kind == "insert" else payload
+
+    async def _write(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Пачку забирает из очереди тот, кто держит блокировку, а неудачная пачка
+        # возвращается в начало очереди — удаление не обгонит свою вставку
+        async with self._lock:
+            ops, self._ops = self._ops, []
+            if not ops:
+                return
+            rows = [payload for kind, payload in ops if kind == "insert"]
+            uids = [payload for kind, payload in ops if kind == "delete"]
+            try:
+                async with self._session_factory() as session:
+                    if rows:
+                        # Повтор пачки после сбоя не дублирует строки
+                        await session.execute(
+                            insert(MemoryModel).on_conflict_do_nothing(index_elements=["uid"]),
+                            rows,
+                        )
+                    if uids:
+                        await session.execute(
+                            delete(MemoryModel).where(MemoryModel.uid.in_(uids))
+                        )
+                    await session.commit()
+            except Exception:
+                logger.exception("Синхронизация памяти: ошибка записи (%d операций)", len(ops))
+                self._stats["failed_batches"] += 1
+                retry = []
+                for op in ops:
+                    key = self._op_key(op)
+                    attempts = self._attempts.get(key, 0) + 1
+                    if attempts >= _MAX_ATTEMPTS:
+                        self._attempts.pop(key, None)
+                        self._stats["dropped"] += 1
+                        logger.error("Синхронизация памяти: %s %s отброшено после %d попыток", *key, attempts)
+                    else:
+                        self._attempts[key] = attempts
+                        retry.append(op)
+                if retry:
+                    # Перед более поздними операциями; повтор — по таймеру
+                    self._ops[:0] = retry
+                    self._schedule()
+                return
+            for op in ops:
+                self._attempts.pop(self._op_key(op), None)
+            self._stats["batches"] += 1
+            self._stats["inserted"] += len(rows)
+            self._stats["deleted"] += len(uids)
+
+    async def flush(self) -> None:
+        """Записать накопленное и дождаться текущих записей."""
+        self._start_write()
+        if self._writes:
+            await asyncio.gather(*list(self._writes))
+
+    def stats(self) -> dict[str, Any]:
+        return {**self._stats, "pending": len(self._ops)}
+
+
+# Глобальный экземпляр
+memory_sync = MemorySyncQueue(
+    batch_size=settings.memory_sync_batch_size,
+    interval=settings.memory_sync_interval,
+)
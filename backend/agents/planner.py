@@ -2,10 +2,23 @@
 Планировщик действий агента
 Принимает решение, какое действие совершить, на основе личности, настроения, воспоминаний и отношений
 Использует LLM для генерации действия в формате JSON
+Пакетный режим: один LLM-запрос на группу агентов (decide_actions_batch)
 """
 
+import json
+import logging
+
 from backend.llm.client import LLMClient
-from backend.llm.prompts import agent_system_prompt, ACTION_PROMPT_TEMPLATE
+from backend.llm.prompts import (
+    agent_system_prompt,
+    ACTION_PROMPT_TEMPLATE,
+    BATCH_ACTION_SYSTEM,
+    BATCH_AGENT_BLOCK_TEMPLATE,
+    BATCH_ACTION_PROMPT_TEMPLATE,
+    MOOD_STYLE,
+)
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -23,10 +36,11 @@ class Planner:
 
 
 
-    async def decide_action(self, mood_label, recent_memories, other_agents_names, relations):
+    async def decide_action(self, mood_label, recent_memories, other_agents_names, relations, on_delta=None):
         """
         Возвращает действие в виде словаря:
         {"type": "message", "target": "Алиса", "content": "Привет!"}
+        on_delta — колбэк для фрагментов ответа LLM (потоковый режим)
 
         """
         system_prompt = self._get_system_prompt(mood_label)
@@ -36,10 +50,11 @@ class Planner:
             relations=relations,
             other_agents=", ".join(other_agents_names),
         )
-        response = await self.llm.generate(prompt, system_prompt=system_prompt)
+        response = await self.llm.generate(
+            prompt, system_prompt=system_prompt, call_type="action", on_delta=on_delta
+        )
 
         # извлечь JSON из ответа
-        import json
         try:
             start = response.find('{')
             end = response.rfind('}') + 1
@@ -61,3 +76,63 @@ class Planner:
             "content": f"Привет, я {self.agent_name}. У меня {mood_label} настроение. Отношения: {relations}"
         }
 
+
+
+def validate_action(entry, other_agents_names):
+    """
+    Проверить действие из пакетного ответа: type == "message",
+    target из списка доступных агентов, непустой content.
+    Возвращает действие в формате {"type","target","content"} или None.
+    """
+    if not isinstance(entry, dict) or entry.get("type") != "message":
+        return None
+    target = entry.get("target")
+    content = entry.get("content")
+    if target not in other_agents_names or not isinstance(content, str) or not content.strip():
+        return None
+    return {"type": "message", "target": target, "content": content}
+
+
+
+async def decide_actions_batch(requests):
+    """
+    Решить действия сразу для группы агентов одним LLM-запросом.
+    requests: список (agent, context), где context — результат Agent.build_decision_context
+    Возвращает список действий в том же порядке; None — ответ для агента
+    не распознан, нужен индивидуальный вызов decide_action.
+    """
+    blocks = []
+    for agent, context in requests:
+        mood_label = context["mood_label"]
+        blocks.append(BATCH_AGENT_BLOCK_TEMPLATE.format(
+            name=agent.name,
+            personality=agent.personality,
+            mood_label=mood_label,
+            mood_style=MOOD_STYLE.get(mood_label, MOOD_STYLE["нейтральное"]),
+            recent_memories=context["recent_memories"],
+            relations=context["relations"],
+            other_agents=", ".join(context["other_agents_names"]),
+        ))
+    prompt = BATCH_ACTION_PROMPT_TEMPLATE.format(agent_blocks="\n".join(blocks))
+
+    entries_by_name = {}
+    try:
+        response = await LLMClient().generate(prompt, system_prompt=BATCH_ACTION_SYSTEM, call_type="action")
+        start = response.find('[')
+        end = response.rfind(']') + 1
+        if start != -1 and end != 0:
+            entries = json.loads(response[start:end])
+            if isinstance(entries, list):
+                for entry in entries:
+                    if isinstance(entry, dict) and isinstance(entry.get("agent"), str):
+                        entries_by_name.setdefault(entry["agent"], entry)
+    except Exception:
+        logger.exception("Ошибка пакетного решения для %d агентов", len(requests))
+
+    actions = []
+    for agent, context in requests:
+        action = validate_action(entries_by_name.get(agent.name), context["other_agents_names"])
+        if action is not None:
+            agent.adopt_action(action)
+        actions.append(action)
+    return actions
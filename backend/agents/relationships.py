@@ -5,9 +5,11 @@
 
 
 class Relationships:
-    def __init__(self, agent_id):
+    def __init__(self, agent_id, on_change=None):
         self.agent_id = agent_id
         self.affinities = {}
+        # Наблюдатель on_change(agent_id, other_agent_id, new_value) — зовётся при каждом изменении
+        self.on_change = on_change
 
 
     def get_affinity(self, other_agent_id):
@@ -29,6 +31,8 @@ class Relationships:
         elif new_value < -100:
             new_value = -100
         self.affinities[other_agent_id] = new_value
+        if self.on_change is not None and new_value != current:
+            self.on_change(self.agent_id, other_agent_id, new_value)
         return new_value
 
     def get_all_affinities(self):
@@ -0,0 +1,130 @@
+"""
+Фоновый планировщик суммаризации памяти агентов.
+- single-flight: на агента не больше одной задачи (ожидающей или выполняющейся)
+- debounce: задача стартует через memory_summary_debounce секунд после первого
+  запроса, всплеск добавлений схлопывается в одну суммаризацию
+- общий лимит одновременных суммаризаций; LLM-вызов идёт с call_type="summary"
+  (низший приоритет в лимитере — планировщики агентов обслуживаются первыми)
+- метрики: задержка от запроса до старта, длительность, потраченные токены
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SummarizationScheduler:
+    """Планировщик задач Memory._check_and_summarize."""
+
+    def __init__(self, max_concurrency: int, debounce: float) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.debounce = debounce
+        self._tasks: dict[Any, asyncio.Task] = {}
+        self._rerun: set[Any] = set()
+        self._slots: asyncio.Semaphore | None = None
+        self._slots_loop: asyncio.AbstractEventLoop | None = None
+        self._running = 0
+        self._stats = {
+            "requested": 0,
+            "coalesced": 0,
+            "runs": 0,
+            "skipped": 0,
+            "failed": 0,
+            "tokens_spent": 0,
+            "lag_seconds_total": 0.0,
+            "lag_seconds_max": 0.0,
+            "duration_seconds_total": 0.0,
+        }
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._slots_loop = loop
+        return self._slots
+
+    def request(self, memory) -> None:
+        """Запросить суммаризацию, если память агента превысила лимит."""
+        if memory._count <= memory.summarization_limit:
+            return
+        key = memory.collection_name
+        self._stats["requested"] += 1
+        task = self._tasks.get(key)
+        if task is not None and not task.done():
+            # Уже запланирована или выполняется — после неё проверим ещё раз
+            self._stats["coalesced"] += 1
+            self._rerun.add(key)
+            return
+        self._tasks[key] = asyncio.create_task(self._run(key, memory, time.monotonic()))
+
+    async def _run(self, key, memory, requested_at: float) -> None:
+        try:
+            await asyncio.sleep(self.debounce)
+            async with self._get_slots():
+                self._rerun.discard(key)
+                lag = time.monotonic() - requested_at
+                started = time.monotonic()
+                self._running += 1
+                try:
+                    summarized = await memory._check_and_summarize()
+                except Exception:
+                    self._stats["failed"] += 1
+                    logger.exception("Ошибка суммаризации памяти %s", key)
+                    return
+                finally:
+                    self._running -= 1
+                if not summarized:
+                    self._stats["skipped"] += 1
+                    return
+                self._stats["runs"] += 1
+                self._stats["tokens_spent"] += memory.last_summary_tokens
+                self._stats["lag_seconds_total"] += lag
+                self._stats["lag_seconds_max"] = max(self._stats["lag_seconds_max"], lag)
+                self._stats["duration_seconds_total"] += time.monotonic() - started
+        finally:
+            if self._tasks.get(key) is asyncio.current_task():
+                del self._tasks[key]
+            if key in self._rerun:
+                self._rerun.discard(key)
+                self.request(memory)
+
+    def stats(self) -> dict[str, Any]:
+        runs = self._stats["runs"]
+        return {
+            "requested": self._stats["requested"],
+            "coalesced": self._stats["coalesced"],
+            "runs": runs,
+            "skipped": self._stats["skipped"],
+            "failed": self._stats["failed"],
+            "tokens_spent": self._stats["tokens_spent"],
+            "lag_avg_seconds": round(self._stats["lag_seconds_total"] / runs, 3) if runs else 0.0,
+            "lag_max_seconds": round(self._stats["lag_seconds_max"], 3),
+            "duration_avg_seconds": (
+                round(self._stats["duration_seconds_total"] / runs, 3) if runs else 0.0
+            ),
+            "scheduled": sum(1 for t in self._tasks.values() if not t.done()),
+            "running": self._running,
+        }
+
+    async def aclose(self) -> None:
+        """Отменить запланированные задачи (при остановке приложения)."""
+        self._rerun.clear()
+        tasks = [t for t in self._tasks.values() if not t.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+# Глобальный экземпляр
+summarizer = SummarizationScheduler(
+    max_concurrency=settings.memory_summary_max_concurrency,
+    debounce=settings.memory_summary_debounce,
+)
@@ -0,0 +1,276 @@
+"""
+Встроенное векторное хранилище на NumPy (MEMORY_BACKEND=numpy).
+Альтернатива ChromaDB для небольших и средних миров: без HNSW и SQLite,
+поиск — векторизованный косинус по всей матрице агента.
+
+На диске у агента два файла:
+  vectors.f32  — матрица эмбеддингов float32 (нормированных), только дописывается,
+                 читается через np.memmap
+  log.jsonl    — журнал операций: {"op": "add", ...} / {"op": "delete", ...}
+Удаление помечает строки мёртвыми; когда их доля превышает
+memory_numpy_compact_ratio, файлы переписываются без них (компакция).
+Компакция пишет новое поколение файлов (vectors.N.f32, log.N.jsonl) и переключается
+на него одной атомарной заменой файла CURRENT — сбой посередине оставляет
+согласованной либо старую, либо новую пару.
+
+add пропускает id, которые уже есть (как ChromaDB): повтор пачки после сбоя безопасен.
+
+Интерфейс повторяет используемую Memory часть коллекции ChromaDB:
+count / add / get / delete / query.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Компакция не запускается, пока мёртвых строк меньше
+_MIN_DEAD_FOR_COMPACTION = 64
+
+
+class NumpyVectorStore:
+    """Коллекция воспоминаний одного агента."""
+
+    def __init__(self, directory: str, embedding_function, compact_ratio: float | None = None) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.embedding_function = embedding_function
+        self.compact_ratio = (
+            settings.memory_numpy_compact_ratio if compact_ratio is None else compact_ratio
+        )
+        self._current_path = self.directory / "CURRENT"
+        self._generation = self._read_generation()
+        self._vectors_path, self._log_path = self._paths(self._generation)
+        self._lock = threading.RLock()
+
+        self._dim: int | None = None
+        # Строка матрицы → запись; None — удалена
+        self._rows: list[dict[str, Any] | None] = []
+        self._row_by_id: dict[str, int] = {}
+        self._matrix: np.ndarray | None = None  # memmap, перечитывается после записи
+        self._load()
+
+    # ── Загрузка / запись ─────────────────────────────────────────────
+
+    def _paths(self, generation: int) -> tuple[Path, Path]:
+        if generation == 0:
+            return self.directory / "vectors.f32", self.directory / "log.jsonl"
+        return (
+            self.directory / f"vectors.{generation}.f32",
+            self.directory / f"log.{generation}.jsonl",
+        )
+
+    def _read_generation(self) -> int:
+        try:
+            return int(self._current_path.read_text().strip())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _remove_stale_generations(self) -> None:
+        """Удалить файлы других поколений (остатки прерванной или старой компакции)."""
+        current = set(self._paths(self._generation))
+        for pattern in ("vectors*.f32", "log*.jsonl", "CURRENT.tmp"):
+            for path in self.directory.glob(pattern):
+                if path not in current:
+                    try:
+                        path.unlink()
+                    except OSError:
+                        logger.warning("Не удалось удалить %s", path)
+
+    def _load(self) -> None:
+        self._remove_stale_generations()
+        if self._log_path.exists():
+            with open(self._log_path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Оборванная последняя строка после сбоя
+                        logger.warning("Пропущена повреждённая запись журнала %s", self._log_path)
+                        continue
+                    if record["op"] == "add":
+                        self._dim = record["dim"]
+                        self._row_by_id[record["id"]] = len(self._rows)
+                        self._rows.append(
+                            {"id": record["id"], "document": record["document"], "metadata": record["metadata"]}
+                        )
+                    elif record["op"] == "delete":
+                        for memory_id in record["ids"]:
+                            row = self._row_by_id.pop(memory_id, None)
+                            if row is not None:
+                                self._rows[row] = None
+
+        # Векторы пишутся раньше журнала — отрезать хвост без записи в журнале
+        if self._dim is not None and self._vectors_path.exists():
+            expected = len(self._rows) * self._dim * 4
+            if self._vectors_path.stat().st_size > expected:
+                with open(self._vectors_path, "r+b") as f:
+                    f.truncate(expected)
+
+    def _append_log(self, records: list[dict[str, Any]]) -> None:
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _matrix_view(self) -> np.ndarray | None:
+        if self._dim is None or not self._rows:
+            return None
+        if self._matrix is None or self._matrix.shape[0] != len(self._rows):
+            self._matrix = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(len(self._rows), self._dim)
+            )
+        return self._matrix
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    # ── API коллекции ─────────────────────────────────────────────────
+
+    def count(self) -> int:
+        return len(self._row_by_id)
+
+    def add(self, ids, documents, metadatas=None, embeddings=None) -> None:
+        if embeddings is None:
+            embeddings = self.embedding_function(list(documents))
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        if metadatas is None:
+            metadatas = [{} for _ in ids]
+
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(
+                    f"Размерность эмбеддинга {vectors.shape[1]} не совпадает с {self._dim}"
+                )
+            if len(set(ids)) != len(ids):
+                raise ValueError(f"Повторяющиеся id воспоминаний в пачке: {ids}")
+            # Уже записанные id пропускаем — повтор частично записанной пачки безопасен
+            new = [k for k, memory_id in enumerate(ids) if memory_id not in self._row_by_id]
+            if not new:
+                return
+            if len(new) != len(ids):
+                vectors = vectors[new]
+                ids = [ids[k] for k in new]
+                documents = [documents[k] for k in new]
+                metadatas = [metadatas[k] for k in new]
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            records = []
+            for memory_id, document, metadata in zip(ids, documents, metadatas):
+                self._row_by_id[memory_id] = len(self._rows)
+                self._rows.append({"id": memory_id, "document": document, "metadata": metadata})
+                records.append({
+                    "op": "add", "id": memory_id, "document": document,
+                    "metadata": metadata, "dim": self._dim,
+                })
+            self._append_log(records)
+
+    def get(self, ids=None, include=None) -> dict[str, list]:
+        with self._lock:
+            if ids is None:
+                rows = [r for r in self._rows if r is not None]
+            else:
+                rows = [self._rows[self._row_by_id[i]] for i in ids if i in self._row_by_id]
+            return {
+                "ids": [r["id"] for r in rows],
+                "documents": [r["document"] for r in rows],
+                "metadatas": [r["metadata"] for r in rows],
+            }
+
+    def delete(self, ids) -> None:
+        with self._lock:
+            removed = []
+            for memory_id in ids:
+                row = self._row_by_id.pop(memory_id, None)
+                if row is not None:
+                    self._rows[row] = None
+                    removed.append(memory_id)
+            if removed:
+                self._append_log([{"op": "delete", "ids": removed}])
+            dead = len(self._rows) - len(self._row_by_id)
+            if dead >= _MIN_DEAD_FOR_COMPACTION and dead > len(self._rows) * self.compact_ratio:
+                self.compact()
+
+    def query(self, query_texts, n_results=10) -> dict[str, list]:
+        queries = self._normalize(
+            np.asarray(self.embedding_function(list(query_texts)), dtype=np.float32)
+        )
+        with self._lock:
+            matrix = self._matrix_view()
+            result: dict[str, list] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            if matrix is None or not self._row_by_id:
+                for _ in query_texts:
+                    for key in result:
+                        result[key].append([])
+                return result
+
+            alive = np.fromiter((r is not None for r in self._rows), dtype=bool, count=len(self._rows))
+            # Векторы нормированы — косинусная близость = скалярное произведение
+            scores = queries @ matrix.T
+            scores[:, ~alive] = -np.inf
+            k = min(n_results, len(self._row_by_id))
+            for row_scores in scores:
+                top = np.argpartition(-row_scores, k - 1)[:k]
+                top = top[np.argsort(-row_scores[top])]
+                rows = [self._rows[i] for i in top]
+                result["ids"].append([r["id"] for r in rows])
+                result["documents"].append([r["document"] for r in rows])
+                result["metadatas"].append([r["metadata"] for r in rows])
+                # Косинусное расстояние, как у ChromaDB с hnsw:space=cosine
+                result["distances"].append([float(1.0 - row_scores[i]) for i in top])
+            return result
+
+    def compact(self) -> None:
+        """Переписать матрицу и журнал без удалённых строк."""
+        with self._lock:
+            matrix = self._matrix_view()
+            keep = [i for i, r in enumerate(self._rows) if r is not None]
+            generation = self._generation + 1
+            vectors_new, log_new = self._paths(generation)
+
+            with open(vectors_new, "wb") as f:
+                if matrix is not None and keep:
+                    f.write(np.ascontiguousarray(matrix[keep]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            rows = [self._rows[i] for i in keep]
+            with open(log_new, "w", encoding="utf-8") as f:
+                for r in rows:
+                    f.write(json.dumps({
+                        "op": "add", "id": r["id"], "document": r["document"],
+                        "metadata": r["metadata"], "dim": self._dim,
+                    }, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+            # Переключение поколения — одна атомарная замена
+            current_tmp = self._current_path.with_suffix(".tmp")
+            current_tmp.write_text(str(generation))
+            os.replace(current_tmp, self._current_path)
+
+            self._matrix = None  # отпустить memmap до удаления старых файлов
+            self._generation = generation
+            self._vectors_path, self._log_path = vectors_new, log_new
+            self._remove_stale_generations()
+            self._rows = rows
+            self._row_by_id = {r["id"]: i for i, r in enumerate(rows)}
+            logger.debug("Компакция %s: осталось %d строк", self.directory, len(rows))
+
+    def stats(self) -> dict[str, int]:
+        return {"rows": len(self._rows), "alive": len(self._row_by_id)}
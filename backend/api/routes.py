@@ -3,23 +3,29 @@ REST API маршруты для «Виртуального мира».
 Эндпоинты:
   GET    /api/agents             — список всех агентов
   GET    /api/agents/{id}        — один агент (с памятью, целями)
+  GET    /api/agents/{id}/memory/archive — холодный архив памяти + размеры уровней
   POST   /api/agents             — создать нового агента
   PATCH  /api/agents/{id}/mood   — изменить настроение
   GET    /api/relationships      — все отношения
-  GET    /api/events             — лента событий
+  GET    /api/events             — лента событий (фильтры, курсоры before_id / after_id)
+  GET    /api/events/export      — выгрузка событий в NDJSON (потоком)
   POST   /api/events             — создать событие / сообщение
 """
 
 from __future__ import annotations
 
+import json
 import logging
-from typing import Any
+from datetime import datetime
+from typing import Any, AsyncIterator
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import select, func, update
+from sqlalchemy import or_, select, func, update
 
-from backend.db.database import async_session
+from backend.db.database import async_session, pool_stats, read_session
+from backend.db.directory import agent_directory
 from backend.db.models import (
     AgentModel,
     EventModel,
@@ -27,7 +33,12 @@ from backend.db.models import (
     MemoryModel,
     RelationshipModel,
 )
-from backend.simulation.world import inject_event_to_agents, inject_message_to_agent
+from backend.simulation.relations import changed_relations, relation_edge, relation_update
+from backend.simulation.world import (
+    inject_event_to_agents,
+    inject_message_to_agent,
+    runtime_affinity,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -38,15 +49,6 @@ router = APIRouter(prefix="/api")
 VALID_MOODS = {"счастлив", "грустный", "злой", "нейтральный", "напуган"}
 VALID_REL_TYPES = {"друзья", "напряжение", "забота", "уважение", "нейтральные"}
 
-MOOD_IMPACT = {
-    "счастлив": 10,
-    "нейтральный": 0,
-    "грустный": -8,
-    "злой": -16,
-    "напуган": -10,
-}
-
-
 # ── Pydantic-схемы ───────────────────────────────────────────────────
 
 class MoodPatch(BaseModel):
@@ -75,22 +77,51 @@ class AgentCreate(BaseModel):
 
 # ── Хелперы ──────────────────────────────────────────────────────────
 
-def _mood_adjusted_strength(
-    base: int, from_mood: str, to_mood: str, rel_type: str
-) -> int:
-    """Корректировка отображаемой силы связи с учётом настроений."""
-    from_impact = MOOD_IMPACT.get(from_mood, 0)
-    to_impact = MOOD_IMPACT.get(to_mood, 0)
-    avg = round((from_impact + to_impact) / 2)
-    direction = -1 if rel_type == "напряжение" else 1
-    return max(0, min(100, base + direction * avg))
+def _event_filters(
+    actor_id: int | None = None,
+    target_id: int | None = None,
+    agent_id: int | None = Query(None, description="Актор или цель события"),
+    relation_type: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> list[Any]:
+    """Условия WHERE для ленты событий (каждое покрыто индексом events)."""
+    filters: list[Any] = []
+    if actor_id is not None:
+        filters.append(EventModel.actor_id == actor_id)
+    if target_id is not None:
+        filters.append(EventModel.target_id == target_id)
+    if agent_id is not None:
+        filters.append(or_(EventModel.actor_id == agent_id, EventModel.target_id == agent_id))
+    if relation_type is not None:
+        filters.append(EventModel.relation_type == relation_type)
+    if since is not None:
+        filters.append(EventModel.created_at >= since)
+    if until is not None:
+        filters.append(EventModel.created_at < until)
+    return filters
+
+
+def _event_dict(e: EventModel) -> dict[str, Any]:
+    return {
+        "id": e.id,
+        "content": e.content,
+        "created_at": e.created_at.isoformat() if e.created_at else None,
+        "actor_id": e.actor_id,
+        "target_id": e.target_id,
+        "actor_name": agent_directory.name(e.actor_id),
+        "target_name": agent_directory.name(e.target_id),
+        "mood_after": e.mood_after,
+        "relation_type": e.relation_type,
+        "relation_delta": e.relation_delta,
+    }
 
 
 # ── Эндпоинты: Агенты ───────────────────────────────────────────────
 
 @router.get("/agents")
 async def get_agents() -> list[dict[str, Any]]:
-    async with async_session() as session:
+    async with read_session() as session:
         result = await session.execute(
             select(AgentModel).order_by(AgentModel.id)
         )
@@ -112,7 +143,7 @@ async def get_agents() -> list[dict[str, Any]]:
 
 @router.get("/agents/{agent_id}")
 async def get_agent(agent_id: int) -> dict[str, Any]:
-    async with async_session() as session:
+    async with read_session() as session:
         agent = await session.get(AgentModel, agent_id)
         if not agent:
             raise HTTPException(status_code=404, detail="Агент не найден")
@@ -125,7 +156,13 @@ async def get_agent(agent_id: int) -> dict[str, Any]:
             .limit(10)
         )
         memories = [
-            {"id": m.id, "content": m.content, "is_key": m.is_key, "timestamp": m.timestamp.isoformat()}
+            {
+                "id": m.id,
+                "uid": m.uid,
+                "content": m.content,
+                "is_key": m.is_key,
+                "timestamp": m.timestamp.isoformat(),
+            }
             for m in mem_result.scalars().all()
         ]
 
@@ -155,6 +192,24 @@ async def get_agent(agent_id: int) -> dict[str, Any]:
         }
 
 
+@router.get("/agents/{agent_id}/memory/archive")
+async def get_memory_archive(
+    agent_id: int,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = Query(50, ge=1, le=500),
+) -> dict[str, Any]:
+    from backend.agents.memory_archive import memory_archive
+    from backend.simulation.world import get_runtime_agent
+
+    agent = get_runtime_agent(agent_id)
+    tiers = agent.memory.tier_stats() if agent else {"hot": 0, "warm": 0}
+    return {
+        "tiers": {**tiers, "cold": await memory_archive.count(agent_id)},
+        "memories": await memory_archive.lookup(agent_id, since=since, until=until, limit=limit),
+    }
+
+
 @router.post("/agents", status_code=201)
 async def create_agent(body: AgentCreate) -> dict[str, Any]:
     async with async_session() as session:
@@ -192,76 +247,106 @@ async def patch_mood(agent_id: int, body: MoodPatch) -> dict[str, Any]:
         agent = await session.get(AgentModel, agent_id)
         if not agent:
             raise HTTPException(status_code=404, detail="Агент не найден")
+        # От настроения зависит display_strength связей агента
+        mood_changed = [agent.id] if agent.mood != mood else []
         agent.mood = mood
+        changed = await changed_relations(session, mood_changed=mood_changed)
         await session.commit()
-        return {"id": agent.id, "name": agent.name, "mood": agent.mood}
+
+    from backend.api.websocket import manager
+    for rel in changed:
+        await manager.broadcast(relation_update(rel))
+    return {"id": agent.id, "name": agent.name, "mood": agent.mood}
 
 
 # ── Эндпоинты: Отношения ────────────────────────────────────────────
 
 @router.get("/relationships")
 async def get_relationships() -> list[dict[str, Any]]:
-    async with async_session() as session:
+    async with read_session() as session:
         result = await session.execute(
             select(RelationshipModel).order_by(RelationshipModel.id)
         )
         rels = result.scalars().all()
 
-        # Подгрузить имена и настроения агентов
-        agent_result = await session.execute(select(AgentModel))
-        agents_map = {a.id: a for a in agent_result.scalars().all()}
-
-        out: list[dict[str, Any]] = []
-        for r in rels:
-            a_from = agents_map.get(r.agent_from_id)
-            a_to = agents_map.get(r.agent_to_id)
-            display = _mood_adjusted_strength(
-                r.strength,
-                a_from.mood if a_from else "нейтральный",
-                a_to.mood if a_to else "нейтральный",
-                r.relation_type,
-            )
-            out.append(
-                {
-                    "id": r.id,
-                    "agent_from_id": r.agent_from_id,
-                    "agent_to_id": r.agent_to_id,
-                    "relation_type": r.relation_type,
-                    "strength": r.strength,
-                    "display_strength": display,
-                    "from_name": a_from.name if a_from else None,
-                    "to_name": a_to.name if a_to else None,
-                }
-            )
-        return out
+    # Имена и настроения — из справочника агентов, симпатия — из runtime-агентов
+    return [
+        {**relation_edge(r), "affinity": runtime_affinity(r.agent_from_id, r.agent_to_id)}
+        for r in rels
+    ]
 
 
 # ── Эндпоинты: События ──────────────────────────────────────────────
 
-@router.get("/events")
-async def get_events(limit: int = Query(20, ge=1, le=100)) -> list[dict[str, Any]]:
-    async with async_session() as session:
-        result = await session.execute(
-            select(EventModel).order_by(EventModel.id.desc()).limit(limit)
-        )
-        events = result.scalars().all()
+# Сколько строк выгрузка читает за один запрос к БД
+EXPORT_CHUNK_SIZE = 500
 
-        agent_result = await session.execute(select(AgentModel))
-        agents_map = {a.id: a for a in agent_result.scalars().all()}
 
-        return [
-            {
-                "id": e.id,
-                "content": e.content,
-                "created_at": e.created_at.isoformat() if e.created_at else None,
-                "actor_name": agents_map[e.actor_id].name if e.actor_id and e.actor_id in agents_map else None,
-                "target_name": agents_map[e.target_id].name if e.target_id and e.target_id in agents_map else None,
-                "mood_after": e.mood_after,
-                "relation_type": e.relation_type,
-                "relation_delta": e.relation_delta,
-            }
-            for e in events
-        ]
+@router.get("/events")
+async def get_events(
+    limit: int = Query(20, ge=1, le=100),
+    before_id: int | None = Query(None, description="События старше этого id (следующая страница)"),
+    after_id: int | None = Query(None, description="События новее этого id"),
+    filters: list[Any] = Depends(_event_filters),
+) -> list[dict[str, Any]]:
+    """
+    Лента событий, новые первыми. Постраничный обход — по курсору:
+    before_id = id последнего события предыдущей страницы.
+    """
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Укажите только before_id или after_id")
+
+    query = select(EventModel).where(*filters)
+    if after_id is not None:
+        # Ближайшие limit событий после курсора, затем в общем порядке (новые первыми)
+        query = query.where(EventModel.id > after_id).order_by(EventModel.id.asc())
+    else:
+        if before_id is not None:
+            query = query.where(EventModel.id < before_id)
+        query = query.order_by(EventModel.id.desc())
+
+    async with read_session() as session:
+        events = (await session.execute(query.limit(limit))).scalars().all()
+    if after_id is not None:
+        events = list(reversed(events))
+    return [_event_dict(e) for e in events]
+
+
+@router.get("/events/export")
+async def export_events(
+    after_id: int = Query(0, ge=0, description="Начать после этого id"),
+    limit: int | None = Query(None, ge=1, description="Максимум событий (по умолчанию — все)"),
+    filters: list[Any] = Depends(_event_filters),
+) -> StreamingResponse:
+    """
+    Вся история событий в NDJSON, от старых к новым. Читается порциями по
+    EXPORT_CHUNK_SIZE с курсором по id: память не зависит от размера выгрузки,
+    соединение из пула не держится, пока клиент читает поток.
+    """
+
+    async def lines() -> AsyncIterator[bytes]:
+        cursor, left = after_id, limit
+        while left is None or left > 0:
+            size = EXPORT_CHUNK_SIZE if left is None else min(left, EXPORT_CHUNK_SIZE)
+            async with read_session() as session:
+                chunk = (await session.execute(
+                    select(EventModel)
+                    .where(EventModel.id > cursor, *filters)
+                    .order_by(EventModel.id.asc())
+                    .limit(size)
+                )).scalars().all()
+            if not chunk:
+                return
+            yield "".join(
+                json.dumps(_event_dict(e), ensure_ascii=False) + "\n" for e in chunk
+            ).encode("utf-8")
+            cursor = chunk[-1].id
+            if left is not None:
+                left -= len(chunk)
+            if len(chunk) < size:
+                return
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 @router.post("/events", status_code=201)
@@ -289,14 +374,21 @@ async def create_event(body: EventCreate) -> dict[str, Any]:
         )
         session.add(event_obj)
 
+        # Что поменялось в графе: пары с новой силой, агенты с новым настроением
+        pairs: list[tuple[int, int]] = []
+        mood_changed: list[int] = []
+
         # Обновить настроение актора
         if body.actorId and mood_after:
             actor = await session.get(AgentModel, body.actorId)
             if actor:
+                if actor.mood != mood_after:
+                    mood_changed.append(actor.id)
                 actor.mood = mood_after
 
         # Обновить силу отношений
         if body.actorId and body.targetId and body.relationDelta != 0:
+            pairs.append((body.actorId, body.targetId))
             rel_result = await session.execute(
                 select(RelationshipModel).where(
                     RelationshipModel.agent_from_id == body.actorId,
@@ -318,24 +410,29 @@ async def create_event(body: EventCreate) -> dict[str, Any]:
                     )
                 )
 
+        changed = await changed_relations(session, pairs, mood_changed)
         await session.commit()
         await session.refresh(event_obj)
 
         # Подготовить ответ
-        agent_result = await session.execute(select(AgentModel))
-        agents_map = {a.id: a for a in agent_result.scalars().all()}
-
         result_data = {
             "id": event_obj.id,
             "content": event_obj.content,
             "created_at": event_obj.created_at.isoformat() if event_obj.created_at else None,
-            "actor_name": agents_map[event_obj.actor_id].name if event_obj.actor_id and event_obj.actor_id in agents_map else None,
-            "target_name": agents_map[event_obj.target_id].name if event_obj.target_id and event_obj.target_id in agents_map else None,
+            "actor_id": event_obj.actor_id,
+            "target_id": event_obj.target_id,
+            "actor_name": agent_directory.name(event_obj.actor_id),
+            "target_name": agent_directory.name(event_obj.target_id),
             "mood_after": event_obj.mood_after,
             "relation_type": event_obj.relation_type,
             "relation_delta": event_obj.relation_delta,
         }
 
+    # Изменившиеся рёбра графа — клиентам, без перечитывания всех отношений
+    from backend.api.websocket import manager
+    for rel in changed:
+        await manager.broadcast(relation_update(rel))
+
     # Внедрить событие в runtime-агентов
     await inject_event_to_agents(content, actor_id=body.actorId)
 
@@ -381,6 +478,8 @@ async def send_user_message(agent_id: int, body: UserMessage) -> dict[str, Any]:
             "id": event_obj.id,
             "content": event_obj.content,
             "created_at": event_obj.created_at.isoformat() if event_obj.created_at else None,
+            "actor_id": None,
+            "target_id": agent_id,
             "actor_name": "Пользователь",
             "target_name": agent.name,
         },
@@ -397,8 +496,8 @@ class SpeedPatch(BaseModel):
 
 @router.get("/simulation/speed")
 async def get_simulation_speed() -> dict[str, Any]:
-    from backend.simulation.world import get_speed, is_running
-    return {"speed": get_speed(), "running": is_running()}
+    from backend.simulation.world import get_speed, get_tick_stats, is_running
+    return {"speed": get_speed(), "running": is_running(), "last_tick": get_tick_stats()}
 
 
 @router.patch("/simulation/speed")
@@ -410,9 +509,30 @@ async def set_simulation_speed(body: SpeedPatch) -> dict[str, Any]:
 
 @router.get("/health")
 async def health() -> dict[str, Any]:
+    from backend.agents.memory_archive import memory_archive
+    from backend.agents.memory_buffer import memory_buffer
+    from backend.agents.memory_service import memory_service
+    from backend.agents.memory_store import memory_stores
+    from backend.agents.memory_sync import memory_sync
+    from backend.agents.summarizer import summarizer
+    from backend.simulation.world import get_memory_tier_stats
     from backend.api.websocket import manager
+    from backend.llm.cache import llm_cache
+    from backend.llm.pool import llm_pool
+    from backend.llm.ratelimit import llm_limiter
     return {
         "ok": True,
         "service": "virtual-world-backend",
         "ws_clients": manager.active_count,
+        "ws": manager.stats(),
+        "llm_pool": llm_pool.stats(),
+        "llm_limiter": llm_limiter.stats(),
+        "llm_cache": llm_cache.stats(),
+        "memory": memory_service.stats(),
+        "memory_buffer": memory_buffer.stats(),
+        "memory_stores": memory_stores.stats(),
+        "memory_sync": memory_sync.stats(),
+        "summarizer": summarizer.stats(),
+        "memory_tiers": {**get_memory_tier_stats(), "archive": memory_archive.stats()},
+        "db": {**pool_stats(), "agent_directory": agent_directory.stats()},
     }
@@ -3,66 +3,590 @@ WebSocket-менеджер для стрима событий в реально
 Клиенты подключаются к /ws и получают JSON-сообщения:
   {"type": "event",        "data": {...}}
   {"type": "mood_update",  "data": {"agent_id": 1, "mood": "...", "mood_value": 20}}
-  {"type": "relation_update", "data": {...}}
+  {"type": "relation_update", "data": {"agent_from_id": 1, "agent_to_id": 2, ...}}  — одно ребро графа
+  {"type": "message_stream",  "data": {"stream_id": "...", "agent_id": 1, "target_name": "...", "delta": "...", "done": false}}
+  {"type": "ping",         "data": {"ts": 123.4}}  — клиент отвечает {"type": "pong", "data": {"ts": 123.4}}
+  {"type": "tick_batch",   "data": {"messages": [...]}, "seq": 42}  — только клиентам с batch=true
+  {"type": "hello",        "data": {"epoch": "...", "seq": 41}}  — первым после подключения
+
+Каждое разосланное сообщение несёт "seq" — сквозной номер рассылки внутри эпохи
+(эпоха меняется при перезапуске сервера); рамка tick_batch — номер последнего
+сообщения в ней. Исключение — message_stream: фрагменты генерации живут, пока агент
+«печатает», и без seq не попадают в буфер докачки (готовое сообщение придёт
+событием event). Последние ws_replay_size сообщений хранятся в кольцевом буфере:
+клиент, переподключаясь с /ws?last_seq=41&epoch=..., получает только пропущенные
+сообщения — одной рамкой tick_batch (даже без batch в подписке), а если они уже вытеснены из буфера (или эпоха другая) —
+{"type": "resync_required", "data": {"epoch": "...", "seq": 57}} и перечитывает
+состояние через REST.
+
+Подписки (от клиента; по умолчанию клиент получает всё):
+  {"type": "subscribe",   "data": {"types": ["event"], "agent_ids": [1, 2], "focus": 3, "batch": true}}
+  {"type": "unsubscribe", "data": {"types": ["mood_update"], "agent_ids": [2], "focus": true}}
+  types / agent_ids в subscribe заменяют фильтр (null — без фильтра), отсутствующие
+  ключи не меняются; focus — агент, открытый в инспекторе: его сообщения приходят
+  при любом agent_ids. Сообщения без агентов (пользовательские события) фильтруются
+  только по типу. batch — вместо отдельных сообщений получать одну рамку
+  tick_batch за тик (или за окно ws_batch_window вне тика); из нескольких
+  mood_update одного агента (relation_update одного ребра) в рамке остаётся последний.
+  Ответ сервера — {"type": "subscribed", "data": <текущий фильтр>}.
+
+broadcast не ждёт сокетов: менеджер по индексу тип → клиенты и агент → клиенты
+выбирает получателей, сериализует сообщение один раз (если получатели есть)
+и кладёт в ограниченную очередь каждого получателя, отправляет задача клиента.
+Медленный клиент теряет сообщения (или отключается) по settings.ws_slow_policy,
+но не задерживает симуляцию.
 """
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import time
+import uuid
+from collections import deque
 from typing import Any
 
 from fastapi import WebSocket, WebSocketDisconnect
 
+from backend.config import settings
+
 logger = logging.getLogger(__name__)
 
+SLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Типы сообщений, на которые можно подписаться
+MESSAGE_TYPES = ("event", "mood_update", "relation_update", "message_stream")
+
+# Промежуточные сообщения: без seq и без буфера докачки
+_TRANSIENT_TYPES = ("message_stream",)
+
+# Поля data, в которых сообщения упоминают агентов
+_AGENT_FIELDS = ("agent_id", "actor_id", "target_id", "agent_from_id", "agent_to_id")
+
+# Сколько последних задержек рассылки хранить для перцентилей
+_LATENCY_SAMPLES = 1000
+
+
+def _message_agents(message: dict[str, Any]) -> set[int]:
+    data = message.get("data") or {}
+    return {data[field] for field in _AGENT_FIELDS if data.get(field) is not None}
+
+
+def _int_set(values: Any) -> set[int]:
+    return {int(v) for v in values if isinstance(v, int) or (isinstance(v, str) and v.isdigit())}
+
+
+class Subscription:
+    """Фильтр клиента: типы сообщений, агенты и агент в фокусе инспектора."""
+
+    def __init__(self) -> None:
+        self.types: set[str] | None = None
+        self.agent_ids: set[int] | None = None
+        self.focus: int | None = None
+        self.batch = False
+
+    def subscribe(self, data: dict[str, Any]) -> None:
+        if "types" in data:
+            types = data["types"]
+            self.types = None if types is None else {t for t in types if t in MESSAGE_TYPES}
+        if "agent_ids" in data:
+            agent_ids = data["agent_ids"]
+            self.agent_ids = None if agent_ids is None else _int_set(agent_ids)
+        if "focus" in data:
+            focus = data["focus"]
+            self.focus = focus if isinstance(focus, int) and not isinstance(focus, bool) else None
+        if "batch" in data:
+            self.batch = bool(data["batch"])
+
+    def unsubscribe(self, data: dict[str, Any]) -> None:
+        if data.get("types"):
+            current = set(MESSAGE_TYPES) if self.types is None else self.types
+            self.types = current - set(data["types"])
+        # «Все агенты» без списка — исключать не из чего, фильтр не меняется
+        if data.get("agent_ids") and self.agent_ids is not None:
+            self.agent_ids -= _int_set(data["agent_ids"])
+        if data.get("focus"):
+            self.focus = None
+
+    def agent_keys(self) -> set[int] | None:
+        """Агенты для индекса (None — все агенты)."""
+        if self.agent_ids is None:
+            return None
+        return self.agent_ids | ({self.focus} if self.focus is not None else set())
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "types": sorted(self.types) if self.types is not None else None,
+            "agent_ids": sorted(self.agent_ids) if self.agent_ids is not None else None,
+            "focus": self.focus,
+            "batch": self.batch,
+        }
+
+
+def _coalesce_key(message: dict[str, Any]) -> tuple | None:
+    """Ключ, по которому новое сообщение заменяет неотправленное старое."""
+    data = message.get("data") or {}
+    if message.get("type") == "mood_update":
+        return ("mood_update", data.get("agent_id"))
+    if message.get("type") == "relation_update":
+        # Ребро целиком и одна симпатия runtime-агента друг друга не заменяют
+        return ("relation_update", data.get("agent_from_id"), data.get("agent_to_id"), "id" in data)
+    return None
+
+
+def _collapse(messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Оставить последнее сообщение для каждого ключа _coalesce_key (на его месте)."""
+    seen: set[tuple] = set()
+    kept = []
+    for message in reversed(messages):
+        key = _coalesce_key(message)
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(message)
+    kept.reverse()
+    return kept
+
+
+class _Outgoing:
+    __slots__ = ("key", "payload", "enqueued_at")
+
+    def __init__(self, key: tuple | None, payload: str) -> None:
+        self.key = key
+        self.payload = payload
+        self.enqueued_at = time.perf_counter()
+
+
+class ClientConnection:
+    """Подключённый клиент: своя очередь отправки и задача-отправитель."""
+
+    def __init__(self, ws: WebSocket, manager: ConnectionManager) -> None:
+        self.ws = ws
+        self._manager = manager
+        self.subscription = Subscription()
+        self._queue: deque[_Outgoing] = deque()
+        self._keyed: dict[tuple, _Outgoing] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.closed = False
+        self.last_seen = time.monotonic()
+        self._last_ping = time.monotonic()
+        self.rtt_ms: float | None = None
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    def enqueue(self, key: tuple | None, payload: str) -> None:
+        """Поставить сообщение в очередь, не дожидаясь сокета."""
+        if self.closed:
+            return
+        manager = self._manager
+        if manager.policy == "coalesce" and key is not None and key in self._keyed:
+            # Свежее состояние заменяет устаревшее: старое убираем, новое — в хвост,
+            # чтобы сообщения уходили по возрастанию seq
+            self._queue.remove(self._keyed.pop(key))
+            self.coalesced += 1
+        if len(self._queue) >= manager.queue_size:
+            if manager.policy == "disconnect":
+                manager.stats_counters["slow_disconnects"] += 1
+                logger.warning("WS клиент не успевает (очередь %d) — отключаем", len(self._queue))
+                self.close(code=1013)
+                return
+            oldest = self._queue.popleft()
+            if oldest.key is not None and self._keyed.get(oldest.key) is oldest:
+                del self._keyed[oldest.key]
+            self.dropped += 1
+        entry = _Outgoing(key, payload)
+        self._queue.append(entry)
+        if key is not None:
+            self._keyed[key] = entry
+        self._wakeup.set()
+
+    def touch(self) -> None:
+        """Клиент что-то прислал — он жив."""
+        self.last_seen = time.monotonic()
+
+    def on_pong(self, data: dict[str, Any]) -> None:
+        sent_at = data.get("ts")
+        if isinstance(sent_at, (int, float)):
+            self.rtt_ms = round((time.monotonic() - sent_at) * 1000, 2)
+
+    def close(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._wakeup.set()
+        self._manager._remove(self)
+        asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int) -> None:
+        try:
+            await self.ws.close(code=code)
+        except Exception:
+            pass
+
+    async def _send(self, payload: str) -> None:
+        await asyncio.wait_for(self.ws.send_text(payload), timeout=self._manager.send_timeout)
+
+    async def _run(self) -> None:
+        manager = self._manager
+        try:
+            while not self.closed:
+                if not self._queue:
+                    self._wakeup.clear()
+                    wait = max(0.0, manager.ping_interval - (time.monotonic() - self._last_ping))
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                if self.closed:
+                    return
+
+                now = time.monotonic()
+                if now - self.last_seen > manager.idle_timeout:
+                    manager.stats_counters["idle_disconnects"] += 1
+                    logger.info("WS клиент молчит %.0f с — отключаем", now - self.last_seen)
+                    self.close(code=1001)
+                    return
+                if now - self._last_ping >= manager.ping_interval:
+                    self._last_ping = now
+                    await self._send(json.dumps({"type": "ping", "data": {"ts": now}}))
+
+                if self._queue:
+                    entry = self._queue.popleft()
+                    if entry.key is not None and self._keyed.get(entry.key) is entry:
+                        del self._keyed[entry.key]
+                    await self._send(entry.payload)
+                    self.sent += 1
+                    manager._record_latency(time.perf_counter() - entry.enqueued_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Сокет закрыт или отправка не уложилась в ws_send_timeout
+            if not self.closed:
+                manager.stats_counters["send_failures"] += 1
+                self.close(code=1011)
+
+    async def stop(self) -> None:
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
 
 class ConnectionManager:
     """Управляет активными WebSocket-подключениями и рассылает обновления."""
 
-    def __init__(self) -> None:
-        self._connections: list[WebSocket] = []
+    def __init__(
+        self,
+        queue_size: int = 256,
+        policy: str = "drop_oldest",
+        ping_interval: float = 20.0,
+        idle_timeout: float = 60.0,
+        send_timeout: float = 10.0,
+        batch_window: float = 0.05,
+        replay_size: int = 1024,
+    ) -> None:
+        if policy not in SLOW_POLICIES:
+            logger.warning("Неизвестная политика WS %r — используем drop_oldest", policy)
+            policy = "drop_oldest"
+        self.queue_size = max(1, queue_size)
+        self.policy = policy
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.send_timeout = send_timeout
+        self.batch_window = batch_window
+        # Номера рассылок и буфер последних сообщений для докачки при реконнекте
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self._replay: deque[dict[str, Any]] = deque(maxlen=max(1, replay_size))
+        # Сообщения для batch-клиентов до ближайшего flush_batch: (сообщение, получатели)
+        self._pending: list[tuple[dict[str, Any], set[ClientConnection]]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._clients: dict[WebSocket, ClientConnection] = {}
+        # Индекс подписок: тип → клиенты, агент → клиенты; *_all — без фильтра
+        self._types_all: set[ClientConnection] = set()
+        self._by_type: dict[str, set[ClientConnection]] = {}
+        self._agents_all: set[ClientConnection] = set()
+        self._by_agent: dict[int, set[ClientConnection]] = {}
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self.stats_counters = {
+            "broadcasts": 0,
+            "slow_disconnects": 0,
+            "idle_disconnects": 0,
+            "send_failures": 0,
+            "skipped": 0,
+            "batches": 0,
+            "batched_messages": 0,
+            "collapsed": 0,
+            "replayed": 0,
+            "resyncs": 0,
+        }
 
-    async def connect(self, ws: WebSocket) -> None:
+    async def connect(
+        self, ws: WebSocket, last_seq: int | None = None, epoch: str | None = None
+    ) -> ClientConnection:
+        """
+        Принять подключение. С last_seq — дослать пропущенные сообщения из буфера
+        (до регистрации клиента и без await, чтобы новые рассылки шли после них).
+        """
         await ws.accept()
-        self._connections.append(ws)
-        logger.info("WS клиент подключён (%d всего)", len(self._connections))
+        client = ClientConnection(ws, self)
+        client.enqueue(None, self._control("hello"))
+        if last_seq is not None:
+            self._resume(client, last_seq, epoch)
+        self._clients[ws] = client
+        self._index(client)
+        client.start()
+        logger.info("WS клиент подключён (%d всего)", len(self._clients))
+        return client
+
+    def _control(self, message_type: str) -> str:
+        return json.dumps({"type": message_type, "data": {"epoch": self.epoch, "seq": self.seq}})
+
+    def _resume(self, client: ClientConnection, last_seq: int, epoch: str | None) -> None:
+        """
+        Поставить в очередь клиента сообщения после last_seq одной рамкой tick_batch
+        (клиент применяет её целиком) или resync_required.
+        """
+        missing = self.seq - last_seq
+        # Буфер хранит подряд идущие номера, заканчивающиеся self.seq
+        if epoch != self.epoch or not 0 <= missing <= len(self._replay):
+            self.stats_counters["resyncs"] += 1
+            logger.info("WS клиент отстал (last_seq=%d, seq=%d) — resync", last_seq, self.seq)
+            client.enqueue(None, self._control("resync_required"))
+            return
+        if not missing:
+            return
+        messages = _collapse(list(self._replay)[len(self._replay) - missing:])
+        client.enqueue(None, json.dumps(
+            {"type": "tick_batch", "data": {"messages": messages}, "seq": self.seq},
+            ensure_ascii=False,
+        ))
+        self.stats_counters["replayed"] += missing
 
     def disconnect(self, ws: WebSocket) -> None:
-        if ws in self._connections:
-            self._connections.remove(ws)
-        logger.info("WS клиент отключён (%d осталось)", len(self._connections))
+        client = self._clients.get(ws)
+        if client is not None:
+            client.close()
+        logger.info("WS клиент отключён (%d осталось)", len(self._clients))
+
+    def _remove(self, client: ClientConnection) -> None:
+        if self._clients.get(client.ws) is client:
+            del self._clients[client.ws]
+            self._unindex(client)
+
+    def _index(self, client: ClientConnection) -> None:
+        sub = client.subscription
+        if sub.types is None:
+            self._types_all.add(client)
+        else:
+            for message_type in sub.types:
+                self._by_type.setdefault(message_type, set()).add(client)
+        agent_keys = sub.agent_keys()
+        if agent_keys is None:
+            self._agents_all.add(client)
+        else:
+            for agent_id in agent_keys:
+                self._by_agent.setdefault(agent_id, set()).add(client)
+
+    def _unindex(self, client: ClientConnection) -> None:
+        self._types_all.discard(client)
+        self._agents_all.discard(client)
+        for index in (self._by_type, self._by_agent):
+            for key in [k for k, clients in index.items() if client in clients]:
+                index[key].discard(client)
+                if not index[key]:
+                    del index[key]
+
+    def update_subscription(self, client: ClientConnection, kind: str, data: dict[str, Any]) -> None:
+        """Изменить фильтр клиента (subscribe / unsubscribe) и подтвердить его."""
+        self._unindex(client)
+        if kind == "subscribe":
+            client.subscription.subscribe(data)
+        else:
+            client.subscription.unsubscribe(data)
+        if self._clients.get(client.ws) is client:
+            self._index(client)
+        client.enqueue(None, json.dumps(
+            {"type": "subscribed", "data": client.subscription.as_dict()}, ensure_ascii=False
+        ))
+
+    def _recipients(self, message: dict[str, Any]) -> set[ClientConnection]:
+        recipients = self._types_all | self._by_type.get(message.get("type"), set())
+        agents = _message_agents(message)
+        if not agents or not recipients:
+            return recipients
+        interested = set(self._agents_all)
+        for agent_id in agents:
+            interested |= self._by_agent.get(agent_id, set())
+        return recipients & interested
 
     async def broadcast(self, message: dict[str, Any]) -> None:
-        """Отправить JSON-сообщение всем подключённым клиентам."""
+        """Поставить JSON-сообщение в очередь подписанных клиентов (сокеты не ждём)."""
+        self.stats_counters["broadcasts"] += 1
+        if message.get("type") not in _TRANSIENT_TYPES:
+            self.seq += 1
+            message = {**message, "seq": self.seq}
+            self._replay.append(message)
+        if not self._clients:
+            return
+        recipients = self._recipients(message)
+        self.stats_counters["skipped"] += len(self._clients) - len(recipients)
+        if not recipients:
+            return
+        batched = {c for c in recipients if c.subscription.batch}
+        if batched:
+            self._pending.append((message, batched))
+            if self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(
+                    self.batch_window, self.flush_batch
+                )
+            if len(batched) == len(recipients):
+                return
         payload = json.dumps(message, ensure_ascii=False)
-        dead: list[WebSocket] = []
-        for ws in self._connections:
-            try:
-                await ws.send_text(payload)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            self.disconnect(ws)
+        key = _coalesce_key(message)
+        for client in recipients - batched:
+            client.enqueue(key, payload)
+
+    def flush_batch(self) -> None:
+        """
+        Отправить накопленное batch-клиентам одной рамкой tick_batch.
+        Клиенты с одинаковым набором сообщений (одинаковым фильтром) получают
+        одну и ту же сериализованную рамку.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        groups: dict[tuple[int, ...], list[ClientConnection]] = {}
+        clients = set().union(*(recipients for _, recipients in pending))
+        for client in clients:
+            indices = tuple(i for i, (_, recipients) in enumerate(pending) if client in recipients)
+            groups.setdefault(indices, []).append(client)
+
+        for indices, group in groups.items():
+            messages = [pending[i][0] for i in indices]
+            collapsed = _collapse(messages)
+            frame: dict[str, Any] = {"type": "tick_batch", "data": {"messages": collapsed}}
+            seqs = [m["seq"] for m in messages if "seq" in m]
+            if seqs:
+                frame["seq"] = seqs[-1]
+            payload = json.dumps(frame, ensure_ascii=False)
+            for client in group:
+                client.enqueue(None, payload)
+            self.stats_counters["batches"] += 1
+            self.stats_counters["batched_messages"] += len(collapsed)
+            self.stats_counters["collapsed"] += len(messages) - len(collapsed)
+
+    def _record_latency(self, seconds: float) -> None:
+        self._latencies.append(seconds)
 
     @property
     def active_count(self) -> int:
-        return len(self._connections)
+        return len(self._clients)
+
+    def stats(self) -> dict[str, Any]:
+        """Очереди, потери и задержка рассылки (от broadcast до отправки в сокет)."""
+        latencies = sorted(self._latencies)
+        clients = list(self._clients.values())
+        rtts = [c.rtt_ms for c in clients if c.rtt_ms is not None]
+        return {
+            **self.stats_counters,
+            "policy": self.policy,
+            "epoch": self.epoch,
+            "seq": self.seq,
+            "replay_buffered": len(self._replay),
+            "clients": len(clients),
+            "filtered_clients": sum(
+                1 for c in clients
+                if c.subscription.types is not None or c.subscription.agent_ids is not None
+            ),
+            "queued": sum(c.queued for c in clients),
+            "max_queued": max((c.queued for c in clients), default=0),
+            "sent": sum(c.sent for c in clients),
+            "dropped": sum(c.dropped for c in clients),
+            "coalesced": sum(c.coalesced for c in clients),
+            "latency_ms": {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+                "p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else 0.0,
+                "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            },
+            "ping_rtt_ms": round(sum(rtts) / len(rtts), 2) if rtts else None,
+        }
+
+    async def aclose(self) -> None:
+        """Остановить задачи отправки (при остановке приложения)."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._pending.clear()
+        for client in list(self._clients.values()):
+            await client.stop()
+        self._clients.clear()
+        self._types_all.clear()
+        self._by_type.clear()
+        self._agents_all.clear()
+        self._by_agent.clear()
 
 
 # Глобальный экземпляр
-manager = ConnectionManager()
+manager = ConnectionManager(
+    queue_size=settings.ws_queue_size,
+    policy=settings.ws_slow_policy,
+    ping_interval=settings.ws_ping_interval,
+    idle_timeout=settings.ws_idle_timeout,
+    send_timeout=settings.ws_send_timeout,
+    batch_window=settings.ws_batch_window,
+    replay_size=settings.ws_replay_size,
+)
+
+
+def _query_int(value: str | None) -> int | None:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
 
 
 async def websocket_endpoint(ws: WebSocket) -> None:
-    """Обработчик WS-подключения: держим соединение открытым."""
-    await manager.connect(ws)
+    """Обработчик WS-подключения: читает входящие (pong / keep-alive)."""
+    params = ws.query_params
+    client = await manager.connect(
+        ws, last_seq=_query_int(params.get("last_seq")), epoch=params.get("epoch")
+    )
     try:
         while True:
-            # Ожидаем любое сообщение от клиента (ping / keep-alive)
             data = await ws.receive_text()
-            # Можно обрабатывать входящие команды от клиента, пока просто игнорируем
-            logger.debug("WS получено от клиента: %s", data[:100])
+            client.touch()
+            try:
+                message = json.loads(data)
+            except ValueError:
+                logger.debug("WS получено от клиента: %s", data[:100])
+                continue
+            if not isinstance(message, dict):
+                continue
+            kind = message.get("type")
+            payload = message.get("data") or {}
+            if kind == "pong":
+                client.on_pong(payload)
+            elif kind in ("subscribe", "unsubscribe") and isinstance(payload, dict):
+                manager.update_subscription(client, kind, payload)
     except WebSocketDisconnect:
         manager.disconnect(ws)
     except Exception:
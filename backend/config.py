@@ -4,6 +4,8 @@
 """
 
 from pathlib import Path
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -24,15 +26,103 @@ class Settings(BaseSettings):
     llm_api_key: str = ""
     llm_base_url: str = "https://api.deepseek.com/v1"
     llm_model: str = "deepseek-chat"
+    # Потоковая генерация сообщений агентов (SSE → WS message_stream)
+    llm_streaming: bool = False
+    # Пул HTTP-соединений (общий для всех LLM-вызовов)
+    llm_http2: bool = False  # требует пакет h2
+    llm_max_connections: int = 20
+    llm_max_keepalive_connections: int = 10
+    llm_keepalive_expiry: float = 30.0
+    # Глобальные лимиты LLM-вызовов (0 — без ограничения)
+    llm_requests_per_second: float = 5.0
+    llm_tokens_per_minute: int = 0
+    llm_max_concurrency: int = 8
+    # Кэш ответов LLM (пустой путь — только память)
+    llm_cache_enabled: bool = True
+    llm_cache_path: str = "./data/llm_cache.db"
+    llm_cache_memory_items: int = 2048
+    # TTL по типам вызовов, секунды (0 — не кэшировать)
+    llm_cache_ttl_action: int = 120
+    llm_cache_ttl_summary: int = 86400
+    llm_cache_ttl_profile: int = 3600
+    llm_cache_ttl_default: int = 600
+    # Не кэшировать вызовы с temperature > 0: сэмплированные ответы (решения агентов)
+    # не должны повторяться из кэша, в т.ч. после перезапуска. false — кэшировать по TTL
+    llm_cache_skip_nonzero_temperature: bool = True
 
     # --- Database ---
     db_path: str = "./data/world.db"
+    # PRAGMA соединений SQLite: журнал ("wal" / "delete"), синхронизация,
+    # mmap (байты), кэш страниц (КиБ), ожидание блокировки (мс), временные таблицы
+    db_journal_mode: str = "wal"
+    db_synchronous: str = "normal"
+    db_mmap_size: int = 268435456
+    db_cache_size_kb: int = 65536
+    db_busy_timeout_ms: int = 5000
+    db_temp_store: str = "memory"
+    # Одно соединение на запись (симуляция) и пул read-only соединений для API
+    db_read_pool_size: int = 4
 
     # --- ChromaDB ---
     chroma_persist_dir: str = "./data/chroma"
+    # Хранилище памяти агентов: "chroma" или "numpy" (встроенное, в той же директории)
+    memory_backend: str = "chroma"
+    # numpy: компакция, когда удалённых строк больше этой доли
+    memory_numpy_compact_ratio: float = 0.5
+    # Сколько последних воспоминаний агента держать в памяти процесса (get_recent — не больше)
+    memory_recent_buffer: int = 32
+    # Уровни памяти: тёплый (векторный индекс) — суммаризация при превышении
+    # memory_warm_limit, после неё остаётся memory_warm_keep сырых воспоминаний;
+    # холодный (SQLite-архив) — не больше N записей на агента (0 — без ограничения)
+    memory_warm_limit: int = 50
+    memory_warm_keep: int = 10
+    memory_archive_max_per_agent: int = 0
+    # Write-behind копия воспоминаний в таблицу memories (для инспектора агента)
+    memory_sync_enabled: bool = True
+    memory_sync_batch_size: int = 200
+    memory_sync_interval: float = 1.0
+    # Пул потоков для операций ChromaDB/эмбеддингов и лимит их очереди
+    memory_workers: int = 2
+    memory_queue_size: int = 256
+    # Буфер записи: сброс в ChromaDB в конце тика, по размеру или по таймеру (секунды)
+    memory_flush_size: int = 64
+    memory_flush_interval: float = 2.0
+    # Фоновая суммаризация памяти: лимит одновременных задач и задержка (секунды)
+    memory_summary_max_concurrency: int = 2
+    memory_summary_debounce: float = 5.0
+    # Кэш эмбеддингов по хэшу текста (пустой путь — только память)
+    embedding_cache_memory_items: int = 10000
+    embedding_cache_path: str = "./data/embedding_cache.db"
+
+    # --- WebSocket ---
+    # Очередь отправки на клиента и политика для медленных клиентов:
+    # "drop_oldest" — выбросить самое старое, "coalesce" — заменить устаревшие
+    # mood_update того же агента и relation_update того же ребра
+    # (при переполнении — выбросить самое старое),
+    # "disconnect" — отключить клиента
+    ws_queue_size: int = 256
+    ws_slow_policy: str = "drop_oldest"
+    # Ping каждые N секунд; клиент, молчащий дольше ws_idle_timeout, отключается
+    ws_ping_interval: float = 20.0
+    ws_idle_timeout: float = 60.0
+    # Максимум ожидания одной отправки в сокет (секунды), затем отключение
+    ws_send_timeout: float = 10.0
+    # Клиентам с batch=true: сообщения вне тика собираются в tick_batch за это окно (секунды)
+    ws_batch_window: float = 0.05
+    # Последние N сообщений хранятся для докачки при переподключении (/ws?last_seq=)
+    ws_replay_size: int = 1024
 
     # --- Simulation ---
     simulation_tick_seconds: int = 10
+    # Все записи тика (сообщения, события, отношения, настроение) — одной транзакцией
+    simulation_tick_transaction: bool = True
+    # "concurrent" — агенты решают параллельно, "sequential" — строго по очереди
+    simulation_tick_mode: Literal["concurrent", "sequential"] = "concurrent"
+    # Максимум одновременных решений агентов в concurrent-режиме
+    simulation_max_concurrency: int = 8
+    # Сколько агентов решают в одном LLM-запросе (1 — отдельный запрос на агента).
+    # Работает в concurrent-режиме
+    simulation_batch_size: int = 1
 
     @property
     def db_url(self) -> str:
@@ -40,6 +130,20 @@ class Settings(BaseSettings):
         db_abs = (BASE_DIR / self.db_path).resolve()
         return f"sqlite+aiosqlite:///{db_abs}"
 
+    @property
+    def llm_cache_abs_path(self) -> str | None:
+        """Абсолютный путь к дисковому кэшу LLM (None — кэш только в памяти)."""
+        if not self.llm_cache_path:
+            return None
+        return str((BASE_DIR / self.llm_cache_path).resolve())
+
+    @property
+    def embedding_cache_abs_path(self) -> str | None:
+        """Абсолютный путь к дисковому кэшу эмбеддингов (None — кэш только в памяти)."""
+        if not self.embedding_cache_path:
+            return None
+        return str((BASE_DIR / self.embedding_cache_path).resolve())
+
     @property
     def chroma_abs_dir(self) -> str:
         """Абсолютный путь к директории ChromaDB."""
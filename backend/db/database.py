@@ -1,7 +1,9 @@
 """
 Асинхронное подключение к SQLite через SQLAlchemy + aiosqlite.
 - Создание таблиц
-- Фабрика сессий
+- Фабрики сессий: async_session (единственное соединение на запись)
+  и read_session (пул read-only соединений для GET-эндпоинтов)
+- PRAGMA соединений (WAL, synchronous, mmap, cache, busy_timeout, temp_store)
 - Начальные данные (seed)
 """
 
@@ -11,12 +13,16 @@ import logging
 from datetime import datetime, timedelta
 from pathlib import Path
 
-from sqlalchemy import event, select, func
+from sqlalchemy import event, select, func, text
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from backend.config import settings
 from backend.db.models import (
@@ -32,25 +38,86 @@ logger = logging.getLogger(__name__)
 
 # ─── Engine & Session ────────────────────────────────────────────────
 
-engine = create_async_engine(
-    settings.db_url,
-    echo=False,
-    connect_args={"check_same_thread": False},
-)
+def sqlite_pragmas(read_only: bool = False) -> list[str]:
+    """PRAGMA, которые выполняются на каждом новом соединении."""
+    pragmas = [
+        # foreign keys в SQLite включаются на каждое соединение
+        "PRAGMA foreign_keys=ON",
+        f"PRAGMA busy_timeout={settings.db_busy_timeout_ms}",
+        f"PRAGMA synchronous={settings.db_synchronous}",
+        f"PRAGMA cache_size=-{settings.db_cache_size_kb}",
+        f"PRAGMA mmap_size={settings.db_mmap_size}",
+        f"PRAGMA temp_store={settings.db_temp_store}",
+    ]
+    if read_only:
+        # Пул API не может писать: случайная запись упадёт, а не встанет в очередь к писателю
+        pragmas.append("PRAGMA query_only=ON")
+    else:
+        # Режим журнала хранится в файле БД — достаточно выставить его писателю
+        pragmas.insert(1, f"PRAGMA journal_mode={settings.db_journal_mode}")
+    return pragmas
+
+
+def make_engine(db_url: str, *, read_only: bool = False, pool_size: int = 1) -> AsyncEngine:
+    """Движок SQLite с настроенными PRAGMA и пулом из pool_size соединений."""
+    new_engine = create_async_engine(
+        db_url,
+        echo=False,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        connect_args={"check_same_thread": False},
+    )
+    pragmas = sqlite_pragmas(read_only)
+
+    @event.listens_for(new_engine.sync_engine, "connect")
+    def _set_sqlite_pragma(dbapi_conn, _connection_record):
+        cursor = dbapi_conn.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return new_engine
+
+
+# Писатель один: транзакции симуляции и API встают в очередь пула,
+# а не спорят за блокировку файла внутри SQLite
+engine = make_engine(settings.db_url)
+# В WAL читатели не блокируют писателя и не ждут его
+read_engine = make_engine(settings.db_url, read_only=True, pool_size=settings.db_read_pool_size)
+
+class WorldSession(Session):
+    """Сессия БД мира: на её события подписан справочник агентов (backend.db.directory)."""
+
 
 async_session = async_sessionmaker(
     engine,
     class_=AsyncSession,
+    sync_session_class=WorldSession,
     expire_on_commit=False,
 )
 
+read_session = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    sync_session_class=WorldSession,
+    expire_on_commit=False,
+)
+
+
+def pool_stats() -> dict[str, str]:
+    """Состояние пулов соединений (для /api/health)."""
+    return {
+        "journal_mode": settings.db_journal_mode,
+        "writer": engine.pool.status(),
+        "readers": read_engine.pool.status(),
+    }
 
-# Включаем foreign keys для SQLite (обязательно для каждого соединения)
-@event.listens_for(engine.sync_engine, "connect")
-def _set_sqlite_pragma(dbapi_conn, _connection_record):
-    cursor = dbapi_conn.cursor()
-    cursor.execute("PRAGMA foreign_keys=ON")
-    cursor.close()
+
+async def dispose_engines() -> None:
+    """Закрыть соединения обоих пулов (при остановке приложения)."""
+    await read_engine.dispose()
+    await engine.dispose()
 
 
 # ─── Инициализация БД ───────────────────────────────────────────────
@@ -63,6 +130,7 @@ async def init_db() -> None:
 
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await _upgrade_schema(conn)
 
     # Проверяем, есть ли уже данные
     async with async_session() as session:
@@ -72,6 +140,43 @@ async def init_db() -> None:
             logger.info("База данных заполнена начальными данными (seed)")
 
 
+async def _upgrade_schema(conn) -> None:
+    """
+    Довести схему существующей БД до текущих моделей.
+    create_all создаёт только отсутствующие таблицы — новые колонки и индексы
+    в старых таблицах добавляются здесь. Каждый шаг идемпотентен.
+    """
+    columns = {
+        row[1] for row in (await conn.execute(text("PRAGMA table_info(memories)"))).fetchall()
+    }
+    if "uid" not in columns:
+        await conn.execute(text("ALTER TABLE memories ADD COLUMN uid VARCHAR(36)"))
+        logger.info("Схема БД: добавлена колонка memories.uid")
+
+    objects = (await conn.execute(text(
+        "SELECT type, name FROM sqlite_master WHERE type IN ('table', 'index')"
+    ))).fetchall()
+    tables = {name for kind, name in objects if kind == "table"}
+    existing = {name for kind, name in objects if kind == "index"}
+    if "relationships" in tables and "ux_relationships_pair" not in existing:
+        # Перед уникальным индексом оставить по одному отношению на пару — самое позднее
+        result = await conn.execute(text(
+            "DELETE FROM relationships WHERE id NOT IN ("
+            "SELECT MAX(id) FROM relationships GROUP BY agent_from_id, agent_to_id)"
+        ))
+        if result.rowcount:
+            logger.info("Схема БД: удалено %d дублирующих отношений", result.rowcount)
+
+    # Индексы из __table_args__ моделей, которых ещё нет в старой БД
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        for index in table.indexes:
+            if index.name not in existing:
+                await conn.execute(CreateIndex(index, if_not_exists=True))
+                logger.info("Схема БД: создан индекс %s", index.name)
+
+
 # ─── Seed-данные ─────────────────────────────────────────────────────
 
 async def _seed_data(session: AsyncSession) -> None:
@@ -0,0 +1,96 @@
+"""
+Справочник агентов в памяти процесса: id → имя, настроение, аватар.
+Загружается при старте; дальше следит за AgentModel в сессиях WorldSession:
+изменения, попавшие во flush, копятся в session.info и применяются
+только после commit (rollback их отбрасывает). Запись событий и лента
+разрешают имена за O(1) вместо select(AgentModel) на каждый вызов.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, NamedTuple
+
+from sqlalchemy import event, select
+
+from backend.db.database import WorldSession, async_session
+from backend.db.models import AgentModel
+
+logger = logging.getLogger(__name__)
+
+_STAGED_KEY = "agent_directory"
+
+
+class AgentEntry(NamedTuple):
+    id: int
+    name: str
+    mood: str
+    mood_value: int
+    avatar_emoji: str
+
+
+def _entry(agent: AgentModel) -> AgentEntry:
+    return AgentEntry(agent.id, agent.name, agent.mood, agent.mood_value, agent.avatar_emoji)
+
+
+class AgentDirectory:
+    """Кэш строк agents, согласованный с закоммиченными транзакциями."""
+
+    def __init__(self) -> None:
+        self._agents: dict[int, AgentEntry] = {}
+        self.loaded = False
+
+    async def load(self, session_factory=async_session) -> None:
+        """Прочитать всех агентов (при старте приложения)."""
+        async with session_factory() as session:
+            rows = (await session.execute(select(AgentModel))).scalars().all()
+        self._agents = {row.id: _entry(row) for row in rows}
+        self.loaded = True
+        logger.info("Справочник агентов: %d записей", len(self._agents))
+
+    def get(self, agent_id: int | None) -> AgentEntry | None:
+        return self._agents.get(agent_id) if agent_id else None
+
+    def name(self, agent_id: int | None) -> str | None:
+        entry = self.get(agent_id)
+        return entry.name if entry else None
+
+    def names(self) -> dict[int, str]:
+        return {agent_id: entry.name for agent_id, entry in self._agents.items()}
+
+    def apply(self, changes: dict[int, AgentEntry | None]) -> None:
+        """Применить закоммиченные изменения (None — агент удалён)."""
+        for agent_id, entry in changes.items():
+            if entry is None:
+                self._agents.pop(agent_id, None)
+            else:
+                self._agents[agent_id] = entry
+
+    def stats(self) -> dict[str, Any]:
+        return {"loaded": self.loaded, "agents": len(self._agents)}
+
+
+# Глобальный экземпляр
+agent_directory = AgentDirectory()
+
+
+@event.listens_for(WorldSession, "after_flush")
+def _stage_agents(session, _flush_context) -> None:
+    for obj in session.new | session.dirty:
+        if isinstance(obj, AgentModel):
+            session.info.setdefault(_STAGED_KEY, {})[obj.id] = _entry(obj)
+    for obj in session.deleted:
+        if isinstance(obj, AgentModel):
+            session.info.setdefault(_STAGED_KEY, {})[obj.id] = None
+
+
+@event.listens_for(WorldSession, "after_commit")
+def _apply_agents(session) -> None:
+    staged = session.info.pop(_STAGED_KEY, None)
+    if staged:
+        agent_directory.apply(staged)
+
+
+@event.listens_for(WorldSession, "after_rollback")
+def _discard_agents(session) -> None:
+    session.info.pop(_STAGED_KEY, None)
@@ -1,6 +1,6 @@
 """
 SQLAlchemy ORM-модели для «Виртуального мира».
-Таблицы: agents, relationships, events, memories, goals, messages.
+Таблицы: agents, relationships, events, memories, memory_archive, goals, messages.
 """
 
 from __future__ import annotations
@@ -12,7 +12,9 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Text,
     func,
@@ -76,6 +78,10 @@ class RelationshipModel(Base):
     """Направленное отношение agent_from → agent_to."""
 
     __tablename__ = "relationships"
+    __table_args__ = (
+        # Одно отношение на направленную пару; по ней ищут record_event и create_event
+        Index("ux_relationships_pair", "agent_from_id", "agent_to_id", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     agent_from_id: Mapped[int] = mapped_column(
@@ -110,6 +116,14 @@ class EventModel(Base):
     """Событие в мире (сообщение, действие, изменение настроения и т.д.)."""
 
     __tablename__ = "events"
+    __table_args__ = (
+        # Лента событий агента (новые первыми) и SET NULL при удалении агента
+        Index("ix_events_actor", "actor_id", "id"),
+        Index("ix_events_target", "target_id", "id"),
+        # Фильтры ленты GET /api/events: тип связи и период
+        Index("ix_events_relation", "relation_type", "id"),
+        Index("ix_events_created", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
@@ -141,6 +155,12 @@ class MemoryModel(Base):
     """Эпизод из памяти агента (параллельно хранится в ChromaDB для поиска)."""
 
     __tablename__ = "memories"
+    __table_args__ = (
+        # Уникальный индекс, а не UNIQUE колонки: его можно добавить в старую БД
+        Index("ux_memories_uid", "uid", unique=True),
+        # Последние воспоминания агента в инспекторе (get_agent)
+        Index("ix_memories_agent_ts", "agent_id", "timestamp"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     agent_id: Mapped[int] = mapped_column(
@@ -152,6 +172,8 @@ class MemoryModel(Base):
     )
     is_key: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     summary: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # id воспоминания в векторном хранилище (общий для обоих хранилищ; у seed-данных пуст)
+    uid: Mapped[str | None] = mapped_column(String(36), nullable=True)
 
     agent: Mapped[AgentModel] = relationship(back_populates="memories")
 
@@ -159,10 +181,37 @@ class MemoryModel(Base):
         return f"<Memory id={self.id} agent={self.agent_id} key={self.is_key}>"
 
 
+class MemoryArchiveModel(Base):
+    """Холодный уровень памяти: сырые воспоминания, заменённые сводкой (сжаты zlib)."""
+
+    __tablename__ = "memory_archive"
+    __table_args__ = (
+        Index("ix_memory_archive_agent_ts", "agent_id", "timestamp"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    agent_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("agents.id", ondelete="CASCADE"), nullable=False
+    )
+    memory_id: Mapped[str] = mapped_column(String(36), unique=True, nullable=False)
+    # Сводка, которая заменила воспоминание в векторном индексе
+    summary_id: Mapped[str | None] = mapped_column(String(36), nullable=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # zlib(JSON {"text": ..., "metadata": ...})
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<MemoryArchive id={self.id} agent={self.agent_id} memory={self.memory_id}>"
+
+
 class GoalModel(Base):
     """Цель агента."""
 
     __tablename__ = "goals"
+    __table_args__ = (
+        # Активные цели агента, новые первыми (get_agent)
+        Index("ix_goals_agent_status", "agent_id", "status", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     agent_id: Mapped[int] = mapped_column(
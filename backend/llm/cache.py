@@ -0,0 +1,164 @@
+"""
+Кэш ответов LLM перед LLMClient.generate.
+Ключ — (модель, системный промпт, промпт, температура).
+Два уровня: LRU в памяти и SQLite на диске; TTL задаётся по типу вызова.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import aiosqlite
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _ttl_for(call_type: str) -> int:
+    """TTL (секунды) для типа вызова; 0 — не кэшировать."""
+    return {
+        "action": settings.llm_cache_ttl_action,
+        "summary": settings.llm_cache_ttl_summary,
+        "profile": settings.llm_cache_ttl_profile,
+    }.get(call_type, settings.llm_cache_ttl_default)
+
+
+class LLMResponseCache:
+    """Двухуровневый кэш: LRU-словарь в памяти + таблица SQLite (путь None — только память)."""
+
+    def __init__(self, path: str | None, memory_items: int) -> None:
+        self.path = path
+        self.memory_items = memory_items
+        self._memory: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._db: aiosqlite.Connection | None = None
+        self._db_lock = asyncio.Lock()
+        self._stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "writes": 0, "bypassed": 0}
+
+    @staticmethod
+    def make_key(
+        model: str, system_prompt: str | None, prompt: str, temperature: float
+    ) -> str:
+        raw = json.dumps(
+            [model, system_prompt or "", prompt, round(temperature, 3)], ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def should_cache(self, call_type: str, temperature: float) -> bool:
+        """Можно ли кэшировать вызов с такими параметрами."""
+        if not settings.llm_cache_enabled or _ttl_for(call_type) <= 0:
+            return False
+        if temperature > 0 and settings.llm_cache_skip_nonzero_temperature:
+            self._stats["bypassed"] += 1
+            return False
+        return True
+
+    async def _connection(self) -> aiosqlite.Connection | None:
+        if self.path is None:
+            return None
+        async with self._db_lock:
+            if self._db is None:
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                self._db = await aiosqlite.connect(self.path)
+                await self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    " key TEXT PRIMARY KEY,"
+                    " call_type TEXT NOT NULL,"
+                    " value TEXT NOT NULL,"
+                    " created_at REAL NOT NULL)"
+                )
+                await self._db.commit()
+                await self._purge_expired(self._db)
+        return self._db
+
+    async def _purge_expired(self, db: aiosqlite.Connection) -> None:
+        now = time.time()
+        for call_type in ("action", "summary", "profile"):
+            await db.execute(
+                "DELETE FROM llm_cache WHERE call_type = ? AND created_at < ?",
+                (call_type, now - _ttl_for(call_type)),
+            )
+        await db.execute(
+            "DELETE FROM llm_cache WHERE call_type NOT IN ('action', 'summary', 'profile')"
+            " AND created_at < ?",
+            (now - settings.llm_cache_ttl_default,),
+        )
+        await db.commit()
+
+    def _remember(self, key: str, value: str, created_at: float) -> None:
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str, call_type: str) -> str | None:
+        """Вернуть закэшированный ответ или None (с учётом TTL типа вызова)."""
+        deadline = time.time() - _ttl_for(call_type)
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, created_at = entry
+            if created_at >= deadline:
+                self._memory.move_to_end(key)
+                self._stats["hits_memory"] += 1
+                return value
+            del self._memory[key]
+
+        db = await self._connection()
+        if db is not None:
+            async with db.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row is not None and row[1] >= deadline:
+                self._remember(key, row[0], row[1])
+                self._stats["hits_disk"] += 1
+                return row[0]
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str, call_type: str) -> None:
+        created_at = time.time()
+        self._remember(key, value, created_at)
+        self._stats["writes"] += 1
+
+        db = await self._connection()
+        if db is not None:
+            try:
+                await db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, call_type, value, created_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, call_type, value, created_at),
+                )
+                await db.commit()
+            except aiosqlite.Error:
+                logger.exception("Не удалось записать ответ LLM в дисковый кэш")
+
+    def stats(self) -> dict[str, Any]:
+        hits = self._stats["hits_memory"] + self._stats["hits_disk"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_items": len(self._memory),
+        }
+
+    async def aclose(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+# Глобальный экземпляр
+llm_cache = LLMResponseCache(
+    path=settings.llm_cache_abs_path,
+    memory_items=settings.llm_cache_memory_items,
+)
@@ -2,24 +2,31 @@
 Абстрактный LLM-клиент с поддержкой retry / backoff / логирования.
 Провайдер: DeepSeek-совместимый API (OpenAI-формат).
 Конфигурация берётся из backend.config.settings.
+Все запросы идут через общий пул соединений (backend.llm.pool)
+и глобальный ограничитель частоты (backend.llm.ratelimit);
+повторяющиеся промпты обслуживаются кэшем (backend.llm.cache).
 """
 
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
-from typing import Any
+from typing import Any, Awaitable, Callable
 
 import httpx
 
 from backend.config import settings
+from backend.llm.cache import llm_cache
+from backend.llm.pool import llm_pool
+from backend.llm.ratelimit import backoff_delay, estimate_tokens, llm_limiter, parse_duration
 
 logger = logging.getLogger(__name__)
 
 # Настройки retry
 _MAX_RETRIES = 3
 _BACKOFF_BASE = 2.0  # секунды
-_TIMEOUT = 45.0  # секунды на запрос
+_BACKOFF_MAX = 30.0  # потолок одной паузы, секунды
 
 
 class LLMClient:
@@ -36,16 +43,25 @@ class LLMClient:
             raise ValueError("LLM_API_KEY не задан в .env")
         self.base_url = (base_url or settings.llm_base_url).rstrip("/")
         self.model = model or settings.llm_model
+        # Токены последнего успешного вызова (usage.total_tokens или оценка; 0 — из кэша)
+        self.last_usage_tokens = 0
 
     async def generate(
         self,
         prompt: str,
         system_prompt: str | None = None,
         temperature: float = 0.7,
+        call_type: str = "default",
+        on_delta: Callable[[str], Awaitable[None]] | None = None,
     ) -> str:
         """
         Отправить запрос к LLM и вернуть текст ответа.
         Автоматически повторяет при сбоях (до _MAX_RETRIES раз).
+        call_type — "action" / "summary" / "profile": определяет приоритет в лимитере
+        и TTL в кэше ответов.
+        on_delta — если задан, ответ запрашивается потоком (SSE) и каждый фрагмент
+        текста передаётся в колбэк по мере поступления. Повтор возможен только
+        до первого фрагмента.
         """
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -63,34 +79,62 @@ class LLMClient:
             "temperature": temperature,
         }
 
+        cache_key: str | None = None
+        if llm_cache.should_cache(call_type, temperature):
+            cache_key = llm_cache.make_key(self.model, system_prompt, prompt, temperature)
+            cached = await llm_cache.get(cache_key, call_type)
+            if cached is not None:
+                logger.debug("LLM ответ из кэша (тип=%s)", call_type)
+                if on_delta is not None:
+                    await on_delta(cached)
+                self.last_usage_tokens = 0
+                return cached
+
+        delivered = False
+
+        async def forward(delta: str) -> None:
+            nonlocal delivered
+            delivered = True
+            await on_delta(delta)
+
+        estimated_tokens = estimate_tokens(system_prompt, prompt)
         last_error: Exception | None = None
 
         for attempt in range(1, _MAX_RETRIES + 1):
+            if attempt > 1:
+                llm_limiter.on_retry()
             try:
-                async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-                    response = await client.post(
+                async with llm_limiter.slot(call_type, estimated_tokens):
+                    response, data = await self._send(
                         f"{self.base_url}/chat/completions",
-                        headers=headers,
-                        json=payload,
+                        headers,
+                        payload,
+                        forward if on_delta is not None else None,
                     )
+                llm_limiter.update_from_headers(response.headers)
 
                 if response.status_code == 429:
-                    # Rate limit — ждём дольше
-                    wait = _BACKOFF_BASE * attempt * 2
+                    # Rate limit — общая пауза для всех вызовов: Retry-After или джиттерный backoff
+                    llm_limiter.on_rate_limited()
+                    last_error = RuntimeError("LLM rate limit (429)")
+                    retry_after = parse_duration(response.headers.get("retry-after"))
+                    wait = retry_after or backoff_delay(attempt + 1, _BACKOFF_BASE, _BACKOFF_MAX)
+                    llm_limiter.pause(wait)
                     logger.warning(
-                        "LLM rate limit (429), попытка %d/%d, ждём %.1fs",
+                        "LLM rate limit (429), попытка %d/%d, пауза %.1fs",
                         attempt, _MAX_RETRIES, wait,
                     )
-                    await asyncio.sleep(wait)
                     continue
 
                 if response.status_code >= 500:
-                    wait = _BACKOFF_BASE * attempt
+                    last_error = RuntimeError(f"LLM серверная ошибка ({response.status_code})")
+                    wait = backoff_delay(attempt, _BACKOFF_BASE, _BACKOFF_MAX)
                     logger.warning(
                         "LLM серверная ошибка (%d), попытка %d/%d, ждём %.1fs",
                         response.status_code, attempt, _MAX_RETRIES, wait,
                     )
-                    await asyncio.sleep(wait)
+                    if attempt < _MAX_RETRIES:
+                        await asyncio.sleep(wait)
                     continue
 
                 if response.status_code != 200:
@@ -99,27 +143,97 @@ class LLMClient:
                         f"LLM API ошибка (статус {response.status_code}): {error_text}"
                     )
 
-                data = response.json()
+                if data is None:
+                    data = response.json()
                 if "error" in data:
                     raise RuntimeError(f"LLM API error: {data['error']}")
 
+                usage = data.get("usage") or {}
+                llm_limiter.record_usage(estimated_tokens, usage.get("total_tokens"))
+                self.last_usage_tokens = usage.get("total_tokens") or estimated_tokens
+
                 content = data["choices"][0]["message"]["content"]
                 logger.debug(
                     "LLM ответ получен (модель=%s, длина=%d)", self.model, len(content)
                 )
+                if cache_key is not None:
+                    await llm_cache.set(cache_key, content, call_type)
                 return content
 
-            except (httpx.ConnectError, httpx.ReadTimeout, httpx.WriteTimeout) as exc:
+            except (
+                httpx.ConnectError,
+                httpx.ReadTimeout,
+                httpx.WriteTimeout,
+                httpx.PoolTimeout,
+                httpx.RemoteProtocolError,  # keep-alive соединение закрыто сервером
+            ) as exc:
+                if delivered:
+                    # Часть ответа уже отдана потребителю — повтор её продублирует
+                    raise RuntimeError(f"LLM: стрим прерван: {exc}") from exc
                 last_error = exc
-                wait = _BACKOFF_BASE * attempt
+                wait = backoff_delay(attempt, _BACKOFF_BASE, _BACKOFF_MAX)
                 logger.warning(
                     "LLM сетевая ошибка: %s, попытка %d/%d, ждём %.1fs",
                     exc, attempt, _MAX_RETRIES, wait,
                 )
-                await asyncio.sleep(wait)
+                if attempt < _MAX_RETRIES:
+                    await asyncio.sleep(wait)
 
         raise RuntimeError(
             f"LLM: все {_MAX_RETRIES} попытки исчерпаны. Последняя ошибка: {last_error}"
         )
 
-
+    async def _send(
+        self,
+        url: str,
+        headers: dict[str, str],
+        payload: dict[str, Any],
+        on_delta: Callable[[str], Awaitable[None]] | None,
+    ) -> tuple[httpx.Response, dict[str, Any] | None]:
+        """
+        Выполнить один HTTP-запрос. В потоковом режиме тело ответа собирается
+        из SSE-чанков и возвращается в формате обычного (не потокового) ответа.
+        """
+        if on_delta is None:
+            return await llm_pool.post(url, headers=headers, json=payload), None
+
+        stream_payload = {**payload, "stream": True}
+        async with llm_pool.stream(url, headers=headers, json=stream_payload) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return response, None
+            return response, await self._read_sse(response, on_delta)
+
+    @staticmethod
+    async def _read_sse(
+        response: httpx.Response, on_delta: Callable[[str], Awaitable[None]]
+    ) -> dict[str, Any]:
+        """Прочитать SSE-стрим chat/completions: data: {...} ... data: [DONE]."""
+        parts: list[str] = []
+        usage: dict[str, Any] | None = None
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            raw = line[5:].strip()
+            if raw == "[DONE]":
+                break
+            try:
+                chunk = json.loads(raw)
+            except ValueError:
+                # Keep-alive или битая строка — не повод обрывать стрим
+                logger.debug("SSE: пропущена строка %r", raw[:100])
+                continue
+            if not isinstance(chunk, dict):
+                continue
+            if "error" in chunk:
+                return {"error": chunk["error"]}
+            usage = chunk.get("usage") or usage
+            for choice in chunk.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    await on_delta(delta)
+        return {
+            "choices": [{"message": {"content": "".join(parts)}}],
+            "usage": usage,
+        }
@@ -0,0 +1,143 @@
+"""
+Общий пул HTTP-соединений для всех LLM-вызовов.
+Один httpx.AsyncClient на процесс: keep-alive, опционально HTTP/2,
+настраиваемые лимиты пула. Закрывается из lifespan в main.py.
+"""
+
+from __future__ import annotations
+
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+import httpx
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+_TIMEOUT = 45.0  # секунды на запрос
+
+
+class LLMConnectionPool:
+    """Ленивый общий httpx.AsyncClient + счётчики использования соединений."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport | None = None) -> None:
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._requests_total = 0
+        self._connections_opened = 0
+        self._in_flight = 0
+        # Запросы, уже получившие соединение (начали отправку заголовков)
+        self._sending = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Общий клиент; создаётся при первом обращении."""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    def _create_client(self) -> httpx.AsyncClient:
+        http2 = settings.llm_http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("LLM_HTTP2 включён, но пакет h2 не установлен — используем HTTP/1.1")
+                http2 = False
+
+        limits = httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry,
+        )
+        logger.info(
+            "LLM пул соединений: max=%d, keep-alive=%d, http2=%s",
+            settings.llm_max_connections, settings.llm_max_keepalive_connections, http2,
+        )
+        return httpx.AsyncClient(
+            timeout=_TIMEOUT,
+            limits=limits,
+            http2=http2,
+            transport=self._transport,
+        )
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        """POST через общий клиент с учётом статистики пула."""
+        trace, started = self._request_trace()
+        self._in_flight += 1
+        try:
+            response = await self.client.post(url, extensions={"trace": trace}, **kwargs)
+        finally:
+            self._in_flight -= 1
+            self._sending -= bool(started)
+        self._requests_total += 1
+        return response
+
+    @asynccontextmanager
+    async def stream(self, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """Потоковый POST (SSE) через общий клиент."""
+        trace, started = self._request_trace()
+        self._in_flight += 1
+        try:
+            async with self.client.stream(
+                "POST", url, extensions={"trace": trace}, **kwargs
+            ) as response:
+                yield response
+        finally:
+            self._in_flight -= 1
+            self._sending -= bool(started)
+        self._requests_total += 1
+
+    def _request_trace(self) -> tuple[Any, list[bool]]:
+        """
+        Trace-колбэк httpcore для одного запроса и флаг «соединение получено».
+        Запрос в полёте без флага ждёт свободного соединения в пуле.
+        """
+        started: list[bool] = []
+
+        async def trace(event_name: str, info: dict[str, Any]) -> None:
+            # httpcore сообщает о каждом новом TCP-подключении
+            if event_name == "connection.connect_tcp.complete":
+                self._connections_opened += 1
+            elif event_name.endswith("send_request_headers.started") and not started:
+                started.append(True)
+                self._sending += 1
+
+        return trace, started
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Статистика пула: открытые / переиспользованные / ожидающие соединения.
+        Счётчики запросов ведутся здесь; connections_open / connections_idle —
+        best-effort чтение пула httpcore через внутренние атрибуты httpx
+        (None, если их нет — например, после обновления библиотеки).
+        """
+        open_connections = idle_connections = None
+        try:
+            connections = self._client._transport._pool.connections  # type: ignore[union-attr]
+            open_connections = len(connections)
+            idle_connections = sum(1 for c in connections if c.is_idle())
+        except Exception:
+            pass
+        return {
+            "requests": self._requests_total,
+            "in_flight": self._in_flight,
+            "connections_opened": self._connections_opened,
+            "connections_reused": max(0, self._requests_total - self._connections_opened),
+            "connections_open": open_connections,
+            "connections_idle": idle_connections,
+            "waiting": max(0, self._in_flight - self._sending),
+        }
+
+    async def aclose(self) -> None:
+        """Закрыть все соединения (вызывается при остановке приложения)."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("LLM пул соединений закрыт")
+        self._client = None
+
+
+# Глобальный экземпляр
+llm_pool = LLMConnectionPool()
@@ -62,6 +62,42 @@ ACTION_PROMPT_TEMPLATE = """\
 """
 
 
+# ── Пакетное решение действий нескольких агентов ─────────────────────
+
+BATCH_ACTION_SYSTEM = (
+    "Ты режиссёр виртуального мира и управляешь сразу несколькими персонажами. "
+    "Для каждого персонажа реши, что он скажет, строго в рамках его характера, "
+    "настроения и отношений. Персонажи не знают о решениях друг друга в этом ходе."
+)
+
+BATCH_AGENT_BLOCK_TEMPLATE = """### {name}
+Характер: {personality}
+Настроение: {mood_label}.{mood_style}
+Последние воспоминания (от новых к старым):
+{recent_memories}
+Отношения (от -100 враждебность до +100 дружба): {relations}
+Может обратиться к: {other_agents}
+"""
+
+BATCH_ACTION_PROMPT_TEMPLATE = """Персонажи в этом ходе:
+
+{agent_blocks}
+Правила для каждого персонажа:
+- Реагируй на последние события и сообщения, адресованные ему.
+- НЕ повторяй дословно его прошлые сообщения.
+- "target" выбирай только из его списка «Может обратиться к».
+- Сообщение короткое, 1-2 предложения.
+
+Ответ дай строго в виде JSON-массива, по одному объекту на каждого персонажа:
+  "agent" — имя персонажа
+  "type" — "message"
+  "target" — имя адресата
+  "content" — текст сообщения
+
+Пример: [{{"agent": "Мо", "type": "message", "target": "Алиса", "content": "Привет, как дела?"}}]
+"""
+
+
 # ── Промпт для суммаризации памяти ───────────────────────────────────
 
 SUMMARIZE_SYSTEM = (
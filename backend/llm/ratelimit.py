@@ -0,0 +1,253 @@
+"""
+Глобальный ограничитель частоты LLM-запросов.
+- token bucket по запросам в секунду и токенам в минуту
+- семафор одновременных запросов с приоритетами (планировщик важнее суммаризации)
+- общая пауза по Retry-After / x-ratelimit-* заголовкам провайдера
+- джиттерный экспоненциальный backoff
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Mapping
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты типов вызовов: меньше — важнее
+CALL_PRIORITY: dict[str, int] = {
+    "action": 0,
+    "profile": 1,
+    "default": 1,
+    "summary": 2,
+}
+
+# Запас токенов на ответ модели при оценке стоимости запроса
+_RESPONSE_TOKENS_ESTIMATE = 256
+
+
+def estimate_tokens(*texts: str | None) -> int:
+    """Грубая оценка числа токенов (≈3 символа на токен для кириллицы)."""
+    chars = sum(len(t) for t in texts if t)
+    return chars // 3 + 1 + _RESPONSE_TOKENS_ESTIMATE
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Экспоненциальный backoff с полным джиттером: U(0, min(cap, base·2^(attempt-1)))."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+
+def parse_duration(value: str | None) -> float | None:
+    """
+    Разобрать длительность из заголовка провайдера в секунды.
+    Поддерживаются числа ("2", "0.5"), OpenAI-формат ("1m30s", "250ms")
+    и HTTP-дата (для Retry-After).
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+        return sum(float(n) * scale[u] for n, u in parts)
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Классический token bucket. rate <= 0 — без ограничений."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Сколько секунд ждать, пока в ведре наберётся amount (0 — можно сразу)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            return 0.0
+        return (amount - self._tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        if self.rate > 0:
+            self._refill()
+            self._tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Скорректировать баланс после получения фактического расхода (может уйти в минус)."""
+        if self.rate > 0:
+            self._tokens = min(self.capacity, self._tokens - delta)
+
+
+class PrioritySemaphore:
+    """Семафор, выдающий освободившиеся слоты ожидающим в порядке приоритета."""
+
+    def __init__(self, value: int) -> None:
+        self._value = value
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._counter = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for *_, fut in self._waiters if not fut.done())
+
+    async def acquire(self, priority: int) -> None:
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Слот уже был выдан — вернуть его следующему
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            *_, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._value += 1
+
+
+class LLMRateLimiter:
+    """Процессный governor для всех LLM-вызовов (планировщики, суммаризация, генерация профилей)."""
+
+    def __init__(
+        self,
+        requests_per_second: float,
+        tokens_per_minute: float,
+        max_concurrency: int,
+    ) -> None:
+        rps = max(0.0, requests_per_second)
+        tpm = max(0.0, tokens_per_minute)
+        self._requests = TokenBucket(rate=rps, capacity=max(1.0, rps))
+        self._tokens = TokenBucket(rate=tpm / 60.0, capacity=tpm)
+        self._semaphore = PrioritySemaphore(max(1, max_concurrency))
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._stats = {
+            "granted": 0,
+            "rate_limited": 0,
+            "retries": 0,
+            "throttle_wait_seconds": 0.0,
+            "tokens_used": 0,
+        }
+
+    @asynccontextmanager
+    async def slot(self, call_type: str = "default", tokens: int = 0) -> AsyncIterator[None]:
+        """Дождаться своей очереди (по приоритету, бюджету запросов и токенов)."""
+        priority = CALL_PRIORITY.get(call_type, CALL_PRIORITY["default"])
+        started = time.monotonic()
+        await self._semaphore.acquire(priority)
+        try:
+            while True:
+                wait = max(
+                    self._paused_until - time.monotonic(),
+                    self._requests.wait_time(1),
+                    self._tokens.wait_time(tokens),
+                )
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self._requests.consume(1)
+            self._tokens.consume(tokens)
+            self._stats["granted"] += 1
+            self._stats["throttle_wait_seconds"] += time.monotonic() - started
+            self._in_flight += 1
+            try:
+                yield
+            finally:
+                self._in_flight -= 1
+        finally:
+            self._semaphore.release()
+
+    def pause(self, seconds: float) -> None:
+        """Приостановить все новые запросы на seconds (общий cooldown после 429)."""
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            logger.warning("LLM лимитер: пауза %.1fs для всех вызовов", seconds)
+
+    def on_rate_limited(self) -> None:
+        self._stats["rate_limited"] += 1
+
+    def on_retry(self) -> None:
+        self._stats["retries"] += 1
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Учесть Retry-After и x-ratelimit-* заголовки провайдера."""
+        retry_after = parse_duration(headers.get("retry-after"))
+        if retry_after:
+            self.pause(retry_after)
+
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            try:
+                exhausted = float(remaining) <= 0
+            except ValueError:
+                continue
+            if exhausted:
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset:
+                    self.pause(reset)
+
+    def record_usage(self, estimated: int, actual: int | None) -> None:
+        """Сверить оценку токенов с фактическим расходом из ответа (usage.total_tokens)."""
+        if actual is None:
+            actual = estimated
+        self._tokens.adjust(actual - estimated)
+        self._stats["tokens_used"] += actual
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self._stats,
+            "throttle_wait_seconds": round(self._stats["throttle_wait_seconds"], 3),
+            "in_flight": self._in_flight,
+            "queued": self._semaphore.queued,
+            "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 3),
+        }
+
+
+# Глобальный экземпляр
+llm_limiter = LLMRateLimiter(
+    requests_per_second=settings.llm_requests_per_second,
+    tokens_per_minute=settings.llm_tokens_per_minute,
+    max_concurrency=settings.llm_max_concurrency,
+)
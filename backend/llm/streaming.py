@@ -0,0 +1,135 @@
+"""
+Инкрементальный разбор JSON-действия из стрима LLM.
+Ответ приходит кусками ('{"type": "mess', 'age", "target": "Ал', ...);
+парсер выделяет значения полей "target" и "content" по мере их поступления,
+не дожидаясь конца ответа.
+"""
+
+from __future__ import annotations
+
+# Состояния автомата
+_SEEK = 0          # вне строк
+_KEY = 1           # внутри строки-кандидата в ключ
+_AFTER_KEY = 2     # строка закрыта, ждём ':'
+_VALUE_START = 3   # после ':', ждём начало значения
+_VALUE = 4         # внутри строкового значения
+
+# Маркер закрывающей кавычки
+_CLOSE = object()
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class ActionStreamParser:
+    """
+    Автомат по символам. feed() возвращает список событий:
+      ("target", "Алиса")        — имя адресата целиком, как только строка закрыта
+      ("content_delta", "При")   — очередной фрагмент текста сообщения
+      ("content", "Привет!")     — текст сообщения целиком
+    """
+
+    STREAMED_KEYS = ("target", "content")
+
+    def __init__(self) -> None:
+        self._state = _SEEK
+        self._buf: list[str] = []
+        self._key = ""
+        self._escape = False
+        self._unicode: str | None = None  # накопитель для \uXXXX
+        self.target: str | None = None
+        self.content: str | None = None
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        events: list[tuple[str, str]] = []
+        delta: list[str] = []
+        for ch in chunk:
+            self._step(ch, events, delta)
+        if delta:
+            events.append(("content_delta", "".join(delta)))
+        # Дельта текущего куска должна идти раньше финального значения
+        events.sort(key=lambda e: e[0] == "content")
+        return events
+
+    def _step(self, ch: str, events: list[tuple[str, str]], delta: list[str]) -> None:
+        state = self._state
+
+        if state == _SEEK:
+            if ch == '"':
+                self._buf = []
+                self._state = _KEY
+            return
+
+        if state in (_KEY, _VALUE):
+            decoded = self._decode(ch)
+            if decoded is None:
+                return
+            if decoded is _CLOSE:
+                text = "".join(self._buf)
+                if state == _KEY:
+                    self._key = text
+                    self._state = _AFTER_KEY
+                else:
+                    self._finish_value(text, events)
+                    self._state = _SEEK
+                return
+            self._buf.append(decoded)
+            if state == _VALUE and self._key == "content" and self.content is None:
+                delta.append(decoded)
+            return
+
+        if state == _AFTER_KEY:
+            if ch.isspace():
+                return
+            if ch == ":":
+                self._state = _VALUE_START
+            else:
+                # Это было строковое значение, а не ключ
+                self._state = _SEEK
+                self._step(ch, events, delta)
+            return
+
+        if state == _VALUE_START:
+            if ch.isspace():
+                return
+            if ch == '"':
+                if self._key not in self.STREAMED_KEYS:
+                    # Значение неинтересного поля — читаем как обычную строку
+                    self._key = ""
+                self._buf = []
+                self._state = _VALUE
+            else:
+                self._state = _SEEK
+                self._step(ch, events, delta)
+
+    def _decode(self, ch: str):
+        """Обработать символ внутри строки с учётом escape-последовательностей."""
+        if self._unicode is not None:
+            self._unicode += ch
+            if len(self._unicode) < 4:
+                return None
+            code, self._unicode = self._unicode, None
+            try:
+                return chr(int(code, 16))
+            except ValueError:
+                return None
+        if self._escape:
+            self._escape = False
+            if ch == "u":
+                self._unicode = ""
+                return None
+            return _ESCAPES.get(ch, ch)
+        if ch == "\\":
+            self._escape = True
+            return None
+        if ch == '"':
+            return _CLOSE
+        return ch
+
+    def _finish_value(self, text: str, events: list[tuple[str, str]]) -> None:
+        if self._key == "target" and self.target is None:
+            self.target = text
+            events.append(("target", text))
+        elif self._key == "content" and self.content is None:
+            self.content = text
+            events.append(("content", text))
+
@@ -14,8 +14,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from backend.api.routes import router as api_router
-from backend.api.websocket import websocket_endpoint
-from backend.db.database import init_db
+from backend.agents.memory_buffer import memory_buffer
+from backend.agents.memory_service import memory_service
+from backend.agents.memory_store import memory_stores
+from backend.agents.memory_sync import memory_sync
+from backend.agents.summarizer import summarizer
+from backend.api.websocket import manager, websocket_endpoint
+from backend.db.database import dispose_engines, init_db
+from backend.db.directory import agent_directory
+from backend.llm.cache import llm_cache
+from backend.llm.pool import llm_pool
 
 # ── Логирование ──────────────────────────────────────────────────────
 
@@ -34,6 +42,7 @@ async def lifespan(app: FastAPI):
     """Выполняется при старте и остановке приложения."""
     logger.info("🚀 Инициализация базы данных...")
     await init_db()
+    await agent_directory.load()
     logger.info("✅ БД готова")
 
     # Запуск фоновой симуляции
@@ -51,6 +60,17 @@ async def lifespan(app: FastAPI):
         await sim_task
     except asyncio.CancelledError:
         pass
+    await manager.aclose()
+    # Сначала отменить суммаризации: с закрытым LLM-клиентом они бы упали посреди работы,
+    # затем дописать память и только потом закрывать LLM-пул и кэш
+    await summarizer.aclose()
+    await memory_buffer.flush()
+    await memory_sync.flush()
+    await llm_pool.aclose()
+    await llm_cache.aclose()
+    memory_service.shutdown()
+    memory_stores.close()
+    await dispose_engines()
     logger.info("🔻 Приложение остановлено")
 
 
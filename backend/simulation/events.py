@@ -11,8 +11,11 @@ from typing import Any
 from sqlalchemy import select
 
 from backend.db.database import async_session
+from backend.db.directory import agent_directory
 from backend.db.models import AgentModel, EventModel, RelationshipModel
 from backend.api.websocket import manager
+from backend.simulation.relations import changed_relations, relation_update
+from backend.simulation.unit_of_work import current_unit_of_work
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +27,28 @@ async def record_event(
     mood_after: str | None = None,
     relation_type: str | None = None,
     relation_delta: int = 0,
+    stream_id: str | None = None,
 ) -> dict[str, Any]:
     """
-    Записать событие в БД и разослать через WebSocket.
+    Записать событие в БД и разослать через WebSocket
+    (вместе с relation_update для изменившихся рёбер графа).
+    stream_id — id потока message_stream, которым это сообщение уже показывалось.
     Возвращает словарь с данными события.
+    Внутри тика событие записывается вместе с остальными изменениями тика
+    (id и created_at в словаре появятся после коммита).
     """
+    uow = current_unit_of_work()
+    if uow is not None:
+        return uow.add_event(
+            content,
+            actor_id=actor_id,
+            target_id=target_id,
+            mood_after=mood_after,
+            relation_type=relation_type,
+            relation_delta=relation_delta,
+            stream_id=stream_id,
+        )
+
     async with async_session() as session:
         event_obj = EventModel(
             content=content,
@@ -39,15 +59,20 @@ async def record_event(
             relation_delta=relation_delta,
         )
         session.add(event_obj)
+        pairs: list[tuple[int, int]] = []
+        mood_changed: list[int] = []
 
         # Обновить настроение актора в БД
         if actor_id and mood_after:
             actor = await session.get(AgentModel, actor_id)
             if actor:
+                if actor.mood != mood_after:
+                    mood_changed.append(actor_id)
                 actor.mood = mood_after
 
         # Обновить силу отношений в БД
         if actor_id and target_id and relation_delta != 0:
+            pairs.append((actor_id, target_id))
             rel_result = await session.execute(
                 select(RelationshipModel).where(
                     RelationshipModel.agent_from_id == actor_id,
@@ -70,28 +95,29 @@ async def record_event(
                     )
                 )
 
+        changed = await changed_relations(session, pairs, mood_changed)
         await session.commit()
         await session.refresh(event_obj)
 
-        # Собрать имена для ответа
-        agents_map: dict[int, str] = {}
-        agent_result = await session.execute(select(AgentModel))
-        for a in agent_result.scalars().all():
-            agents_map[a.id] = a.name
-
         event_data = {
             "id": event_obj.id,
             "content": event_obj.content,
             "created_at": event_obj.created_at.isoformat() if event_obj.created_at else None,
-            "actor_name": agents_map.get(event_obj.actor_id) if event_obj.actor_id else None,
-            "target_name": agents_map.get(event_obj.target_id) if event_obj.target_id else None,
+            "actor_id": event_obj.actor_id,
+            "target_id": event_obj.target_id,
+            "actor_name": agent_directory.name(event_obj.actor_id),
+            "target_name": agent_directory.name(event_obj.target_id),
             "mood_after": event_obj.mood_after,
             "relation_type": event_obj.relation_type,
             "relation_delta": event_obj.relation_delta,
         }
+        if stream_id:
+            event_data["stream_id"] = stream_id
 
     # Уведомить WebSocket-клиентов
     await manager.broadcast({"type": "event", "data": event_data})
+    for rel in changed:
+        await manager.broadcast(relation_update(rel))
     logger.info("Событие #%d: %s", event_obj.id, content[:80])
 
     return event_data
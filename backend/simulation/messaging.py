@@ -9,11 +9,11 @@ from __future__ import annotations
 import logging
 from typing import Any
 
-from sqlalchemy import select
-
 from backend.db.database import async_session
-from backend.db.models import AgentModel, MessageModel
+from backend.db.directory import agent_directory
+from backend.db.models import MessageModel
 from backend.simulation.events import record_event
+from backend.simulation.unit_of_work import current_unit_of_work
 
 logger = logging.getLogger(__name__)
 
@@ -23,26 +23,30 @@ async def deliver_message(
     to_agent_id: int,
     content: str,
     relation_delta: int = 0,
+    stream_id: str | None = None,
 ) -> dict[str, Any]:
     """
     Записать сообщение в таблицу messages и создать событие.
     Возвращает данные события.
     """
-    async with async_session() as session:
-        # Сохранить сообщение
-        msg = MessageModel(
-            from_agent_id=from_agent_id,
-            to_agent_id=to_agent_id,
-            content=content,
-        )
-        session.add(msg)
-        await session.commit()
-
-        # Имена для красивого события
-        from_agent = await session.get(AgentModel, from_agent_id)
-        to_agent = await session.get(AgentModel, to_agent_id)
-        from_name = from_agent.name if from_agent else "?"
-        to_name = to_agent.name if to_agent else "?"
+    uow = current_unit_of_work()
+    if uow is not None:
+        # Внутри тика сообщение записывается вместе с событием одной транзакцией
+        uow.add_message(from_agent_id, to_agent_id, content)
+    else:
+        async with async_session() as session:
+            # Сохранить сообщение
+            msg = MessageModel(
+                from_agent_id=from_agent_id,
+                to_agent_id=to_agent_id,
+                content=content,
+            )
+            session.add(msg)
+            await session.commit()
+
+    # Имена для красивого события
+    from_name = agent_directory.name(from_agent_id) or "?"
+    to_name = agent_directory.name(to_agent_id) or "?"
 
     # Создать событие
     event_content = f"{from_name} → {to_name}: {content}"
@@ -51,6 +55,7 @@ async def deliver_message(
         actor_id=from_agent_id,
         target_id=to_agent_id,
         relation_delta=relation_delta,
+        stream_id=stream_id,
     )
     logger.info("Сообщение %s → %s: %s", from_name, to_name, content[:60])
     return event_data
@@ -0,0 +1,98 @@
+"""
+Рёбра графа отношений для REST и WebSocket.
+Изменившиеся отношения рассылаются по одному сообщению relation_update на ребро —
+с уже посчитанной display_strength, чтобы фронтенд не перечитывал весь граф:
+  {"type": "relation_update", "data": {"id": 3, "agent_from_id": 1, "agent_to_id": 2,
+      "relation_type": "друзья", "strength": 60, "display_strength": 65, ...}}
+Изменение симпатии runtime-агента (Relationships.update_affinity) — только поле affinity:
+  {"type": "relation_update", "data": {"agent_from_id": 1, "agent_to_id": 2, "affinity": 15}}
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+from sqlalchemy import or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db.directory import agent_directory
+from backend.db.models import RelationshipModel
+
+# Влияние настроения на отображаемую силу связи
+MOOD_IMPACT = {
+    "счастлив": 10,
+    "нейтральный": 0,
+    "грустный": -8,
+    "злой": -16,
+    "напуган": -10,
+}
+
+
+def mood_adjusted_strength(base: int, from_mood: str, to_mood: str, rel_type: str) -> int:
+    """Корректировка отображаемой силы связи с учётом настроений."""
+    from_impact = MOOD_IMPACT.get(from_mood, 0)
+    to_impact = MOOD_IMPACT.get(to_mood, 0)
+    avg = round((from_impact + to_impact) / 2)
+    direction = -1 if rel_type == "напряжение" else 1
+    return max(0, min(100, base + direction * avg))
+
+
+def relation_edge(rel: RelationshipModel) -> dict[str, Any]:
+    """Ребро графа: отношение + имена и настроения из справочника агентов."""
+    a_from = agent_directory.get(rel.agent_from_id)
+    a_to = agent_directory.get(rel.agent_to_id)
+    return {
+        "id": rel.id,
+        "agent_from_id": rel.agent_from_id,
+        "agent_to_id": rel.agent_to_id,
+        "relation_type": rel.relation_type,
+        "strength": rel.strength,
+        "display_strength": mood_adjusted_strength(
+            rel.strength,
+            a_from.mood if a_from else "нейтральный",
+            a_to.mood if a_to else "нейтральный",
+            rel.relation_type,
+        ),
+        "from_name": a_from.name if a_from else None,
+        "to_name": a_to.name if a_to else None,
+    }
+
+
+def relation_update(rel: RelationshipModel) -> dict[str, Any]:
+    """WS-сообщение об изменившемся ребре (строить после коммита — настроения уже в справочнике)."""
+    return {"type": "relation_update", "data": relation_edge(rel)}
+
+
+def affinity_update(agent_id: int, other_agent_id: int, affinity: int) -> dict[str, Any]:
+    """WS-сообщение об изменившейся симпатии runtime-агента."""
+    return {
+        "type": "relation_update",
+        "data": {"agent_from_id": agent_id, "agent_to_id": other_agent_id, "affinity": affinity},
+    }
+
+
+async def changed_relations(
+    session: AsyncSession,
+    pairs: Iterable[tuple[int, int]] = (),
+    mood_changed: Iterable[int] = (),
+) -> list[RelationshipModel]:
+    """
+    Отношения, чьё ребро в графе изменилось: пары (from, to) с новой силой или типом
+    и все связи агентов, у которых сменилось настроение (от него зависит display_strength).
+    Вызывать в той же сессии до коммита.
+    """
+    pairs, mood_changed = list(pairs), list(mood_changed)
+    conditions = []
+    if pairs:
+        conditions.append(
+            tuple_(RelationshipModel.agent_from_id, RelationshipModel.agent_to_id).in_(pairs)
+        )
+    if mood_changed:
+        conditions.append(RelationshipModel.agent_from_id.in_(mood_changed))
+        conditions.append(RelationshipModel.agent_to_id.in_(mood_changed))
+    if not conditions:
+        return []
+    result = await session.execute(
+        select(RelationshipModel).where(or_(*conditions)).order_by(RelationshipModel.id)
+    )
+    return list(result.scalars().all())
@@ -0,0 +1,209 @@
+"""
+Единица работы тика симуляции.
+Пока идёт тик, record_event, deliver_message и _sync_mood_to_db не открывают
+собственных сессий: сообщения, события, изменения отношений и настроения
+копятся в памяти и записываются одной транзакцией в конце тика.
+WebSocket-рассылки уходят после коммита — клиенты не видят событий, которых нет в БД;
+за ними — relation_update для рёбер графа, изменившихся за тик.
+"""
+
+from __future__ import annotations
+
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator
+
+from sqlalchemy import select
+
+from backend.db.database import async_session
+from backend.db.directory import agent_directory
+from backend.db.models import AgentModel, EventModel, MessageModel, RelationshipModel
+from backend.api.websocket import manager
+from backend.simulation.relations import changed_relations, relation_update
+
+logger = logging.getLogger(__name__)
+
+_current: ContextVar[TickUnitOfWork | None] = ContextVar("tick_unit_of_work", default=None)
+
+
+def current_unit_of_work() -> TickUnitOfWork | None:
+    """Открытая единица работы текущего тика (None — писать сразу)."""
+    uow = _current.get()
+    # Задачи, созданные во время тика, наследуют контекст — после коммита он недействителен
+    return uow if uow is not None and uow.active else None
+
+
+class TickUnitOfWork:
+    """Изменения мира за один тик."""
+
+    def __init__(self, session_factory=async_session) -> None:
+        self._session_factory = session_factory
+        self.active = True
+        self._messages: list[MessageModel] = []
+        # (ORM-объект, данные для WS — id и created_at заполняются после записи)
+        self._events: list[tuple[EventModel, dict[str, Any]]] = []
+        # (from, to) → изменения силы по порядку: (delta, relation_type)
+        self._relations: dict[tuple[int, int], list[tuple[int, str | None]]] = {}
+        # agent_id → поля AgentModel, последнее значение выигрывает
+        self._agents: dict[int, dict[str, Any]] = {}
+        self._broadcasts: list[dict[str, Any]] = []
+        # Отношения, чьё ребро в графе изменилось (заполняется при коммите)
+        self._changed_relations: list[RelationshipModel] = []
+
+    def add_message(self, from_agent_id: int, to_agent_id: int, content: str) -> None:
+        self._messages.append(MessageModel(
+            from_agent_id=from_agent_id, to_agent_id=to_agent_id, content=content,
+        ))
+
+    def add_event(
+        self,
+        content: str,
+        actor_id: int | None = None,
+        target_id: int | None = None,
+        mood_after: str | None = None,
+        relation_type: str | None = None,
+        relation_delta: int = 0,
+        stream_id: str | None = None,
+    ) -> dict[str, Any]:
+        """То же, что record_event, но запись и рассылка — после коммита тика."""
+        event_obj = EventModel(
+            content=content,
+            actor_id=actor_id,
+            target_id=target_id,
+            mood_after=mood_after,
+            relation_type=relation_type,
+            relation_delta=relation_delta,
+        )
+        event_data: dict[str, Any] = {
+            "id": None,
+            "content": content,
+            "created_at": None,
+            "actor_id": actor_id,
+            "target_id": target_id,
+            "actor_name": agent_directory.name(actor_id),
+            "target_name": agent_directory.name(target_id),
+            "mood_after": mood_after,
+            "relation_type": relation_type,
+            "relation_delta": relation_delta,
+        }
+        if stream_id:
+            event_data["stream_id"] = stream_id
+        self._events.append((event_obj, event_data))
+
+        if actor_id and mood_after:
+            self.update_agent(actor_id, mood=mood_after)
+        if actor_id and target_id and relation_delta != 0:
+            self._relations.setdefault((actor_id, target_id), []).append(
+                (relation_delta, relation_type)
+            )
+        self.broadcast({"type": "event", "data": event_data})
+        return event_data
+
+    def update_agent(self, agent_id: int, **fields: Any) -> None:
+        self._agents.setdefault(agent_id, {}).update(fields)
+
+    def broadcast(self, message: dict[str, Any]) -> None:
+        self._broadcasts.append(message)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "messages": len(self._messages),
+            "events": len(self._events),
+            "relations": len(self._relations),
+            "agents": len(self._agents),
+        }
+
+    async def commit(self) -> None:
+        """Записать всё накопленное одной транзакцией."""
+        self.active = False
+        if not (self._messages or self._events or self._relations or self._agents):
+            return
+        async with self._session_factory() as session:
+            session.add_all(self._messages)
+            session.add_all(event_obj for event_obj, _ in self._events)
+
+            mood_changed: list[int] = []
+            if self._agents:
+                rows = (await session.execute(
+                    select(AgentModel).where(AgentModel.id.in_(self._agents))
+                )).scalars().all()
+                for row in rows:
+                    fields = self._agents[row.id]
+                    if "mood" in fields and fields["mood"] != row.mood:
+                        mood_changed.append(row.id)
+                    for field, value in fields.items():
+                        setattr(row, field, value)
+
+            if self._relations:
+                await self._apply_relations(session)
+
+            await session.flush()
+            self._changed_relations = await changed_relations(
+                session, self._relations, mood_changed
+            )
+            ids = [event_obj.id for event_obj, _ in self._events]
+            created = dict((await session.execute(
+                select(EventModel.id, EventModel.created_at).where(EventModel.id.in_(ids))
+            )).all()) if ids else {}
+            await session.commit()
+
+        for event_obj, event_data in self._events:
+            created_at = created.get(event_obj.id)
+            event_data["id"] = event_obj.id
+            event_data["created_at"] = created_at.isoformat() if created_at else None
+            logger.info("Событие #%d: %s", event_obj.id, event_obj.content[:80])
+
+    async def _apply_relations(self, session) -> None:
+        # Все затронутые отношения — одним запросом; дельты применяются по порядку,
+        # как при отдельных record_event (с ограничением 0…100 на каждом шаге)
+        from_ids = {from_id for from_id, _ in self._relations}
+        rows = (await session.execute(
+            select(RelationshipModel).where(RelationshipModel.agent_from_id.in_(from_ids))
+        )).scalars().all()
+        existing = {(r.agent_from_id, r.agent_to_id): r for r in rows}
+        for (from_id, to_id), deltas in self._relations.items():
+            rel = existing.get((from_id, to_id))
+            for delta, relation_type in deltas:
+                if rel:
+                    rel.strength = max(0, min(100, rel.strength + delta))
+                    if relation_type:
+                        rel.relation_type = relation_type
+                elif relation_type:
+                    rel = RelationshipModel(
+                        agent_from_id=from_id,
+                        agent_to_id=to_id,
+                        relation_type=relation_type,
+                        strength=max(0, min(100, 50 + delta)),
+                    )
+                    session.add(rel)
+
+    async def publish(self) -> None:
+        """Разослать отложенные WS-сообщения (после коммита)."""
+        for message in self._broadcasts:
+            await manager.broadcast(message)
+        for rel in self._changed_relations:
+            await manager.broadcast(relation_update(rel))
+
+
+@asynccontextmanager
+async def tick_unit_of_work(session_factory=async_session) -> AsyncIterator[TickUnitOfWork]:
+    """
+    Открыть единицу работы на время тика. Если тело завершилось исключением,
+    накопленное отбрасывается; ошибка записи логируется, рассылки не уходят.
+    """
+    uow = TickUnitOfWork(session_factory)
+    token = _current.set(uow)
+    try:
+        yield uow
+    except BaseException:
+        uow.active = False
+        raise
+    finally:
+        _current.reset(token)
+    try:
+        await uow.commit()
+    except Exception:
+        logger.exception("Не удалось записать изменения тика: %s", uow.stats())
+        return
+    await uow.publish()
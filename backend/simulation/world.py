@@ -1,23 +1,35 @@
 """
 Мировой цикл симуляции «Виртуального мира».
-Каждый тик все агенты последовательно выполняют:
+Каждый тик все агенты выполняют:
   рефлексия → постановка цели → действие → обновление памяти/настроения.
+Решения принимаются последовательно или параллельно (settings.simulation_tick_mode),
+действия всегда применяются в порядке id агентов.
 """
 
 from __future__ import annotations
 
 import asyncio
 import logging
+import time
+import uuid
+from contextlib import nullcontext
 from typing import Any
 
 from sqlalchemy import select
 
 from backend.agents.agent import Agent
+from backend.agents.memory_buffer import memory_buffer
+from backend.agents.memory_service import memory_service
+from backend.agents.memory_sync import memory_sync
+from backend.agents.planner import decide_actions_batch
 from backend.config import settings
 from backend.db.database import async_session
 from backend.db.models import AgentModel
+from backend.llm.streaming import ActionStreamParser
 from backend.simulation.events import record_event
 from backend.simulation.messaging import deliver_message
+from backend.simulation.relations import affinity_update, changed_relations, relation_update
+from backend.simulation.unit_of_work import current_unit_of_work, tick_unit_of_work
 from backend.api.websocket import manager
 
 logger = logging.getLogger(__name__)
@@ -26,6 +38,7 @@ logger = logging.getLogger(__name__)
 _running = False
 _speed_multiplier: float = 1.0
 _agents_runtime: dict[int, Agent] = {}
+_last_tick_stats: dict[str, Any] = {}
 
 
 def set_speed(multiplier: float) -> None:
@@ -48,18 +61,40 @@ async def _load_agents() -> dict[int, Agent]:
     agents: dict[int, Agent] = {}
     async with async_session() as session:
         result = await session.execute(select(AgentModel).order_by(AgentModel.id))
-        for row in result.scalars().all():
-            agent = Agent(
-                agent_id=row.id,
-                name=row.name,
-                personality=row.description or row.personality_title,
-                initial_mood=row.mood_value,
-            )
-            agents[row.id] = agent
+        rows = result.scalars().all()
+    for row in rows:
+        # Конструктор Agent читает коллекцию ChromaDB — выполняем вне event loop
+        agents[row.id] = await memory_service.run(
+            "load",
+            Agent,
+            agent_id=row.id,
+            name=row.name,
+            personality=row.description or row.personality_title,
+            initial_mood=row.mood_value,
+        )
+        agents[row.id].relationships.on_change = _on_affinity_change
     logger.info("Загружено %d агентов для симуляции", len(agents))
     return agents
 
 
+def runtime_affinity(agent_id: int, other_agent_id: int) -> int | None:
+    """Симпатия runtime-агента к другому (None — агент не загружен или не встречал другого)."""
+    agent = _agents_runtime.get(agent_id)
+    if agent is None:
+        return None
+    return agent.relationships.get_all_affinities().get(other_agent_id)
+
+
+def _on_affinity_change(agent_id: int, other_agent_id: int, affinity: int) -> None:
+    """Наблюдатель Relationships: разослать новую симпатию (внутри тика — после коммита)."""
+    message = affinity_update(agent_id, other_agent_id, affinity)
+    uow = current_unit_of_work()
+    if uow is not None:
+        uow.broadcast(message)
+    else:
+        asyncio.get_running_loop().create_task(manager.broadcast(message))
+
+
 async def _sync_mood_to_db(agent: Agent) -> None:
     """Записать текущее настроение агента обратно в БД."""
     mood_label = agent.emotions.get_mood_label()
@@ -74,23 +109,36 @@ async def _sync_mood_to_db(agent: Agent) -> None:
         "отличное": "счастлив",
     }
     db_mood = label_map.get(mood_label, "нейтральный")
+    message = {
+        "type": "mood_update",
+        "data": {
+            "agent_id": agent.id,
+            "mood": db_mood,
+            "mood_value": mood_value,
+        },
+    }
 
+    uow = current_unit_of_work()
+    if uow is not None:
+        uow.update_agent(agent.id, mood=db_mood, mood_value=mood_value)
+        uow.broadcast(message)
+        return
+
+    changed = []
     async with async_session() as session:
         db_agent = await session.get(AgentModel, agent.id)
         if db_agent:
+            # Новое настроение меняет display_strength связей агента
+            if db_agent.mood != db_mood:
+                changed = await changed_relations(session, mood_changed=[agent.id])
             db_agent.mood = db_mood
             db_agent.mood_value = mood_value
             await session.commit()
 
     # Уведомить WS-клиентов об обновлении настроения
-    await manager.broadcast({
-        "type": "mood_update",
-        "data": {
-            "agent_id": agent.id,
-            "mood": db_mood,
-            "mood_value": mood_value,
-        },
-    })
+    await manager.broadcast(message)
+    for rel in changed:
+        await manager.broadcast(relation_update(rel))
 
 
 async def inject_event_to_agents(event_text: str, actor_id: int | None = None) -> None:
@@ -116,8 +164,190 @@ async def inject_message_to_agent(
         logger.info("Сообщение пользователя внедрено в агента %s", agent.name)
 
 
+class _MessageStream:
+    """
+    Потоковая трансляция сообщения агента: фрагменты ответа LLM разбираются
+    на лету и уходят WS-клиентам как message_stream, пока агент «печатает».
+    Итоговое событие потом записывается обычным путём с тем же stream_id.
+    """
+
+    def __init__(self, agent: Agent) -> None:
+        self.stream_id = uuid.uuid4().hex
+        self.agent = agent
+        self.parser = ActionStreamParser()
+
+    async def on_delta(self, text: str) -> None:
+        for kind, value in self.parser.feed(text):
+            if kind == "target":
+                await self._publish(delta="")
+            elif kind == "content_delta":
+                await self._publish(delta=value)
+
+    async def finish(self, cancelled: bool = False) -> None:
+        await self._publish(delta="", done=True, cancelled=cancelled)
+
+    async def _publish(self, **data: Any) -> None:
+        await manager.broadcast({
+            "type": "message_stream",
+            "data": {
+                "stream_id": self.stream_id,
+                "agent_id": self.agent.id,
+                "actor_name": self.agent.name,
+                "target_name": self.parser.target,
+                **data,
+            },
+        })
+
+
+async def _decide(
+    agent_id: int,
+    agent: Agent,
+    agent_names: dict[int, str],
+    name_to_id: dict[str, int],
+) -> tuple[dict[str, Any], str | None]:
+    """Получить решение агента; при settings.llm_streaming — с трансляцией в WS."""
+    other_names = [n for aid, n in agent_names.items() if aid != agent_id]
+    if not settings.llm_streaming:
+        return await agent.act(other_names, agent_id_map=name_to_id), None
+
+    stream = _MessageStream(agent)
+    try:
+        action = await agent.act(other_names, agent_id_map=name_to_id, on_delta=stream.on_delta)
+    except Exception:
+        await stream.finish(cancelled=True)
+        raise
+    await stream.finish()
+    return action, stream.stream_id
+
+
+async def _apply_action(
+    agent_id: int,
+    agent: Agent,
+    action: dict[str, Any],
+    agent_names: dict[int, str],
+    stream_id: str | None = None,
+) -> None:
+    """Применить решение агента: доставить сообщение / записать событие, синхронизировать настроение."""
+    if action.get("type") == "message":
+        target_name = action.get("target", "")
+        content = action.get("content", "")
+
+        # Найти ID цели
+        target_id = None
+        for aid, name in agent_names.items():
+            if name == target_name:
+                target_id = aid
+                break
+
+        if target_id:
+            await deliver_message(agent_id, target_id, content, stream_id=stream_id)
+
+            # Получатель воспринимает сообщение
+            target_agent = _agents_runtime.get(target_id)
+            if target_agent:
+                await target_agent.perceive(
+                    f"{agent.name} сказал: {content}", event_delta=3, other_agent_id=agent_id
+                )
+        else:
+            # Монолог — запишем как событие
+            await record_event(
+                content=f"{agent.name}: {content}",
+                actor_id=agent_id,
+                stream_id=stream_id,
+            )
+    else:
+        await record_event(
+            content=f"{agent.name} размышляет...",
+            actor_id=agent_id,
+            stream_id=stream_id,
+        )
+
+    # Синхронизировать настроение
+    await _sync_mood_to_db(agent)
+
+
+async def _tick_sequential(
+    agent_names: dict[int, str], name_to_id: dict[str, int]
+) -> None:
+    """Каждый агент по очереди решает и сразу применяет действие."""
+    for agent_id, agent in list(_agents_runtime.items()):
+        try:
+            action, stream_id = await _decide(agent_id, agent, agent_names, name_to_id)
+            await _apply_action(agent_id, agent, action, agent_names, stream_id)
+        except Exception:
+            logger.exception("Ошибка на тике агента %s (id=%d)", agent.name, agent_id)
+
+
+async def _tick_concurrent(
+    agent_names: dict[int, str], name_to_id: dict[str, int]
+) -> None:
+    """
+    Все агенты принимают решения параллельно (не более
+    simulation_max_concurrency LLM-вызовов одновременно), затем действия
+    применяются по порядку id — доставка сообщений и perceive детерминированы.
+    При simulation_batch_size > 1 агенты решают группами по K в одном LLM-запросе.
+    """
+    agents = list(_agents_runtime.items())
+    semaphore = asyncio.Semaphore(max(1, settings.simulation_max_concurrency))
+
+    async def decide(agent_id: int, agent: Agent) -> tuple[dict[str, Any], str | None] | None:
+        async with semaphore:
+            try:
+                return await _decide(agent_id, agent, agent_names, name_to_id)
+            except Exception:
+                logger.exception("Ошибка решения агента %s (id=%d)", agent.name, agent_id)
+                return None
+
+    async def decide_group(
+        group: list[tuple[int, Agent]],
+    ) -> list[tuple[dict[str, Any], str | None] | None]:
+        # Один LLM-запрос на группу; нераспознанные ответы — индивидуальным вызовом
+        async with semaphore:
+            try:
+                requests = [
+                    (agent, agent.build_decision_context(
+                        [n for aid, n in agent_names.items() if aid != agent_id],
+                        agent_id_map=name_to_id,
+                    ))
+                    for agent_id, agent in group
+                ]
+                results = [
+                    (action, None) if action is not None else None
+                    for action in await decide_actions_batch(requests)
+                ]
+            except Exception:
+                logger.exception("Ошибка пакетного решения группы из %d агентов", len(group))
+                results = [None] * len(group)
+        fallbacks = [i for i, decision in enumerate(results) if decision is None]
+        if fallbacks:
+            logger.info("Пакетное решение: %d из %d агентов — индивидуально", len(fallbacks), len(group))
+            retried = await asyncio.gather(*(decide(*group[i]) for i in fallbacks))
+            for i, decision in zip(fallbacks, retried):
+                results[i] = decision
+        return results
+
+    batch_size = settings.simulation_batch_size
+    if batch_size > 1:
+        groups = [agents[i:i + batch_size] for i in range(0, len(agents), batch_size)]
+        grouped = await asyncio.gather(*(decide_group(g) for g in groups))
+        decisions = [d for group_decisions in grouped for d in group_decisions]
+    else:
+        decisions = await asyncio.gather(*(decide(aid, a) for aid, a in agents))
+
+    for (agent_id, agent), decision in zip(agents, decisions):
+        if decision is None:
+            continue
+        action, stream_id = decision
+        try:
+            await _apply_action(agent_id, agent, action, agent_names, stream_id)
+        except Exception:
+            logger.exception("Ошибка на тике агента %s (id=%d)", agent.name, agent_id)
+
+
 async def _tick() -> None:
-    """Один тик симуляции: каждый агент по очереди решает, что делать."""
+    """Один тик симуляции: агенты решают, что делать, и действия применяются к миру."""
+    global _last_tick_stats
+
     if not _agents_runtime:
         return
 
@@ -125,48 +355,61 @@ async def _tick() -> None:
     # Маппинг имя→id для корректного поиска отношений
     name_to_id = {a.name: aid for aid, a in _agents_runtime.items()}
 
-    for agent_id, agent in _agents_runtime.items():
-        try:
-            other_names = [n for aid, n in agent_names.items() if aid != agent_id]
-            action = await agent.act(other_names, agent_id_map=name_to_id)
-
-            if action.get("type") == "message":
-                target_name = action.get("target", "")
-                content = action.get("content", "")
-
-                # Найти ID цели
-                target_id = None
-                for aid, name in agent_names.items():
-                    if name == target_name:
-                        target_id = aid
-                        break
-
-                if target_id:
-                    await deliver_message(agent_id, target_id, content)
-
-                    # Получатель воспринимает сообщение
-                    target_agent = _agents_runtime.get(target_id)
-                    if target_agent:
-                        await target_agent.perceive(
-                            f"{agent.name} сказал: {content}", event_delta=3, other_agent_id=agent_id
-                        )
-                else:
-                    # Монолог — запишем как событие
-                    await record_event(
-                        content=f"{agent.name}: {content}",
-                        actor_id=agent_id,
-                    )
-            else:
-                await record_event(
-                    content=f"{agent.name} размышляет...",
-                    actor_id=agent_id,
-                )
+    mode = settings.simulation_tick_mode
+    started = time.perf_counter()
+    writes: dict[str, int] = {}
+    unit = tick_unit_of_work() if settings.simulation_tick_transaction else nullcontext()
+    async with unit as uow:
+        if mode == "sequential":
+            await _tick_sequential(agent_names, name_to_id)
+        else:
+            await _tick_concurrent(agent_names, name_to_id)
+        if uow is not None:
+            writes = uow.stats()
+    # Всё, что тик разослал, — batch-клиентам одной рамкой, не дожидаясь окна
+    manager.flush_batch()
+    # Воспоминания тика — одной пачкой
+    await memory_buffer.flush()
+    await memory_sync.flush()
+    duration = time.perf_counter() - started
+
+    _last_tick_stats = {
+        "mode": mode,
+        "agents": len(agent_names),
+        "duration_seconds": round(duration, 3),
+        "db_writes": writes,
+    }
+    logger.info("Тик (%s): %d агентов за %.2fs", mode, len(agent_names), duration)
+
+
+def get_memory_tier_stats() -> dict[str, Any]:
+    """Суммарные размеры горячего и тёплого уровней памяти runtime-агентов и их лимиты."""
+    hot = warm = 0
+    for agent in _agents_runtime.values():
+        tiers = agent.memory.tier_stats()
+        hot += tiers["hot"]
+        warm += tiers["warm"]
+    return {
+        "agents": len(_agents_runtime),
+        "hot": hot,
+        "warm": warm,
+        "limits": {
+            "hot_per_agent": settings.memory_recent_buffer,
+            "warm_per_agent": settings.memory_warm_limit,
+            "warm_keep_after_summary": settings.memory_warm_keep,
+            "cold_per_agent": settings.memory_archive_max_per_agent,
+        },
+    }
 
-            # Синхронизировать настроение
-            await _sync_mood_to_db(agent)
 
-        except Exception:
-            logger.exception("Ошибка на тике агента %s (id=%d)", agent.name, agent_id)
+def get_runtime_agent(agent_id: int) -> Agent | None:
+    """Runtime-объект агента (None, если симуляция его не загрузила)."""
+    return _agents_runtime.get(agent_id)
+
+
+def get_tick_stats() -> dict[str, Any]:
+    """Статистика последнего тика: режим, число агентов, длительность."""
+    return dict(_last_tick_stats)
 
 
 async def start_simulation() -> None:
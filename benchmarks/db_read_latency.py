@@ -0,0 +1,124 @@
+"""
+Бенчмарк: задержка чтения API, пока симуляция пишет в SQLite на максимальной скорости.
+Писатель без пауз повторяет записи тика (record_event + _sync_mood_to_db), читатели
+параллельно выполняют запросы GET /api/events и GET /api/agents. Сравниваются:
+  baseline — одно соединение на всё, rollback-журнал, только foreign_keys (как было)
+  tuned    — WAL + PRAGMA из настроек, один писатель и пул read-only соединений
+
+Запуск: python -m benchmarks.db_read_latency [--seconds 5] [--readers 4]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from backend.db.database import make_engine
+from backend.db.models import AgentModel, Base, EventModel
+
+_AGENTS = 20
+
+
+def _baseline(url: str):
+    engine = create_async_engine(url, echo=False, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragma(dbapi_conn, _connection_record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    return engine, engine
+
+
+def _tuned(url: str, readers: int):
+    return make_engine(url), make_engine(url, read_only=True, pool_size=readers)
+
+
+async def _writer(factory, stop: asyncio.Event) -> int:
+    ticks = 0
+    while not stop.is_set():
+        for agent_id in range(1, _AGENTS + 1):
+            async with factory() as session:
+                session.add(EventModel(
+                    content=f"агент {agent_id}: тик {ticks}",
+                    actor_id=agent_id,
+                    target_id=agent_id % _AGENTS + 1,
+                ))
+                await session.commit()
+            async with factory() as session:
+                await session.execute(
+                    text("UPDATE agents SET mood_value = :v WHERE id = :id"),
+                    {"v": ticks % 100, "id": agent_id},
+                )
+                await session.commit()
+        ticks += 1
+        await asyncio.sleep(0)
+    return ticks
+
+
+async def _reader(factory, stop: asyncio.Event, samples: list[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        async with factory() as session:
+            await session.execute(select(EventModel).order_by(EventModel.id.desc()).limit(50))
+            (await session.execute(select(AgentModel))).scalars().all()
+        samples.append((time.perf_counter() - started) * 1000)
+
+
+async def _run(name: str, write_engine, read_engine, seconds: float, readers: int) -> None:
+    async with write_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(AgentModel.__table__.insert(), [
+            {"name": f"agent-{i}", "mood": "нейтральный", "personality_type": "INFP",
+             "personality_title": "", "avatar_emoji": "🐾", "mood_value": 0}
+            for i in range(1, _AGENTS + 1)
+        ])
+
+    write_factory = async_sessionmaker(write_engine, class_=AsyncSession, expire_on_commit=False)
+    read_factory = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+    stop = asyncio.Event()
+    samples: list[float] = []
+    writer = asyncio.create_task(_writer(write_factory, stop))
+    reader_tasks = [asyncio.create_task(_reader(read_factory, stop, samples)) for _ in range(readers)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    ticks = await writer
+    await asyncio.gather(*reader_tasks)
+
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95)] if samples else 0.0
+    p99 = samples[int(len(samples) * 0.99)] if samples else 0.0
+    print(
+        f"{name:>8}: тиков записи {ticks / seconds:.1f}/с, чтений {len(samples) / seconds:.0f}/с, "
+        f"задержка p50 {statistics.median(samples):.2f} мс, p95 {p95:.2f} мс, p99 {p99:.2f} мс"
+    )
+
+    await read_engine.dispose()
+    await write_engine.dispose()
+
+
+async def main_async(seconds: float, readers: int) -> None:
+    with tempfile.TemporaryDirectory() as path:
+        base_url = f"sqlite+aiosqlite:///{path}/baseline.db"
+        await _run("baseline", *_baseline(base_url), seconds, readers)
+        tuned_url = f"sqlite+aiosqlite:///{path}/tuned.db"
+        await _run("tuned", *_tuned(tuned_url, readers), seconds, readers)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.seconds, args.readers))
+
+
+if __name__ == "__main__":
+    main()
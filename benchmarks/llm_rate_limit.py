@@ -0,0 +1,93 @@
+"""
+Бенчмарк: пропускная способность LLM-клиента против провайдера, который
+активно отвечает 429 при превышении своего лимита запросов.
+
+Запуск: python -m benchmarks.llm_rate_limit [--calls 200] [--provider-rps 20]
+Сеть не используется — провайдер эмулируется httpx.MockTransport.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from backend.llm import client as client_module
+from backend.llm.cache import LLMResponseCache
+from backend.llm.client import LLMClient
+from backend.llm.pool import LLMConnectionPool
+from backend.llm.ratelimit import LLMRateLimiter, TokenBucket
+
+
+def _provider(rps: float, latency: float) -> httpx.MockTransport:
+    """Эмулятор провайдера: token bucket на rps, сверх лимита — 429 + Retry-After."""
+    bucket = TokenBucket(rate=rps, capacity=max(1.0, rps))
+    stats = {"ok": 0, "429": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        if bucket.wait_time(1) > 0:
+            stats["429"] += 1
+            return httpx.Response(429, headers={"retry-after": "1"})
+        bucket.consume(1)
+        stats["ok"] += 1
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "{}"}}],
+            "usage": {"total_tokens": 300},
+        })
+
+    transport = httpx.MockTransport(handler)
+    transport.stats = stats
+    return transport
+
+
+async def _run(calls: int, limiter: LLMRateLimiter, provider_rps: float, latency: float) -> dict:
+    transport = _provider(provider_rps, latency)
+    client_module.llm_pool = LLMConnectionPool(transport=transport)
+    client_module.llm_limiter = limiter
+    client_module.llm_cache = LLMResponseCache(path=None, memory_items=0)
+    llm = LLMClient(api_key="bench", base_url="http://provider.test")
+
+    async def one(i: int) -> bool:
+        call_type = "action" if i % 2 else "summary"
+        try:
+            await llm.generate(f"запрос {i}", call_type=call_type)
+            return True
+        except RuntimeError:
+            return False
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(calls)))
+    elapsed = time.perf_counter() - started
+    await client_module.llm_pool.aclose()
+    ok = sum(results)
+    return {
+        "succeeded": ok,
+        "failed": calls - ok,
+        "provider_429": transport.stats["429"],
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(ok / elapsed, 2),
+        "limiter": limiter.stats(),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--provider-rps", type=float, default=20.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    scenarios = {
+        "без лимита": LLMRateLimiter(0, 0, max_concurrency=args.calls),
+        "лимитер = лимит провайдера": LLMRateLimiter(args.provider_rps, 0, max_concurrency=16),
+    }
+    for name, limiter in scenarios.items():
+        result = await _run(args.calls, limiter, args.provider_rps, args.latency)
+        print(f"{name}: {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Бенчмарк: хранилища памяти агента — ChromaDB против встроенного NumPy (MEMORY_BACKEND).
+Замеряет пакетную запись (как буфер записи за тик) и поиск похожих (search_similar)
+в зависимости от числа воспоминаний. Эмбеддинги псевдослучайные — модель не загружается,
+сравнивается только накладной расход хранилищ.
+
+Запуск: python -m benchmarks.memory_backends [--sizes 1000 10000] [--queries 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.config import Settings
+
+from backend.agents.vector_store import NumpyVectorStore
+
+_DIM = 384  # размерность all-MiniLM-L6-v2
+_BATCH = 64
+
+
+class _HashEmbedding(EmbeddingFunction[Documents]):
+    """Псевдослучайный, но детерминированный вектор по тексту."""
+
+    def __call__(self, input: Documents) -> Embeddings:
+        vectors = []
+        for text in input:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+            vectors.append(np.random.default_rng(seed).random(_DIM, dtype=np.float32))
+        return vectors
+
+
+def _stores(path: str, embed: _HashEmbedding) -> dict:
+    client = chromadb.PersistentClient(path=f"{path}/chroma", settings=Settings(anonymized_telemetry=False))
+    return {
+        "chroma": client.get_or_create_collection(
+            name="agent_bench", metadata={"hnsw:space": "cosine"}, embedding_function=embed
+        ),
+        "numpy": NumpyVectorStore(f"{path}/numpy/agent_bench", embedding_function=embed),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    embed = _HashEmbedding()
+    for size in args.sizes:
+        texts = [f"воспоминание {i}" for i in range(size)]
+        embeddings = embed(texts)
+        with tempfile.TemporaryDirectory() as path:
+            for name, store in _stores(path, embed).items():
+                started = time.perf_counter()
+                for offset in range(0, size, _BATCH):
+                    store.add(
+                        ids=[str(i) for i in range(offset, min(size, offset + _BATCH))],
+                        documents=texts[offset:offset + _BATCH],
+                        metadatas=[{"type": "episodic"}] * len(texts[offset:offset + _BATCH]),
+                        embeddings=embeddings[offset:offset + _BATCH],
+                    )
+                add_ms = (time.perf_counter() - started) / size * 1000
+
+                started = time.perf_counter()
+                for q in range(args.queries):
+                    store.query(query_texts=[f"запрос {q}"], n_results=5)
+                query_ms = (time.perf_counter() - started) / args.queries * 1000
+
+                print(
+                    f"{size:>6} воспоминаний, {name:>6}: запись {add_ms:.3f} мс/шт, "
+                    f"поиск {query_ms:.2f} мс"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Бенчмарк: латентность Memory.get_recent в зависимости от размера коллекции.
+Сравнивает полный скан коллекции (collection.get + сортировка) с кольцевым буфером.
+Эмбеддинги передаются готовыми — модель эмбеддингов не загружается.
+
+Запуск: python -m benchmarks.memory_recent [--sizes 100 1000 10000] [--repeat 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from backend.agents.memory import Memory
+from backend.agents.memory_store import MemoryStoreRegistry
+from backend.agents import memory as memory_module
+
+_DIM = 384  # размерность all-MiniLM-L6-v2
+
+
+def _fill(collection, size: int) -> None:
+    start = datetime(2026, 1, 1)
+    for offset in range(0, size, 1000):
+        chunk = range(offset, min(size, offset + 1000))
+        collection.add(
+            ids=[f"m{i}" for i in chunk],
+            documents=[f"событие {i}" for i in chunk],
+            metadatas=[{"timestamp": (start + timedelta(seconds=i)).isoformat()} for i in chunk],
+            embeddings=[[random.random() for _ in range(_DIM)] for _ in chunk],
+        )
+
+
+def _full_scan(collection, n: int) -> list[str]:
+    """Прежняя реализация get_recent."""
+    all_data = collection.get()
+    items = sorted(
+        zip(all_data["documents"], all_data["metadatas"]),
+        key=lambda x: x[1].get("timestamp", ""),
+        reverse=True,
+    )
+    return [doc for doc, _ in items[:n]]
+
+
+def _time_ms(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        registry = MemoryStoreRegistry()
+        memory_module.memory_stores = registry
+        for agent_id, size in enumerate(args.sizes):
+            _fill(registry.get_collection(agent_id, path), size)
+
+            started = time.perf_counter()
+            memory = Memory(agent_id, persist_directory=path)
+            rebuild_ms = (time.perf_counter() - started) * 1000
+
+            assert memory.get_recent(7) == _full_scan(memory.collection, 7)
+            scan_ms = _time_ms(lambda: _full_scan(memory.collection, 7), args.repeat)
+            buffer_ms = _time_ms(lambda: memory.get_recent(7), args.repeat)
+            print(
+                f"{size:>6} воспоминаний: скан {scan_ms:.3f} мс, буфер {buffer_ms:.4f} мс, "
+                f"старт (перестройка буфера) {rebuild_ms:.1f} мс"
+            )
+        registry.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Бенчмарк: время старта и пиковая память (RSS) при создании памяти для N агентов.
+Сравнивает старую схему (PersistentClient на каждого агента) с общим
+реестром MemoryStoreRegistry. Каждый замер — в отдельном процессе.
+
+Запуск: python -m benchmarks.memory_startup [--agents 10 100 1000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _per_agent_clients(n: int, path: str) -> None:
+    import chromadb
+    from chromadb.config import Settings
+
+    for agent_id in range(n):
+        client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+        client.get_or_create_collection(name=f"agent_{agent_id}", metadata={"hnsw:space": "cosine"})
+
+
+def _registry(n: int, path: str) -> None:
+    from backend.agents.memory_store import MemoryStoreRegistry
+
+    registry = MemoryStoreRegistry()
+    for agent_id in range(n):
+        registry.get_collection(agent_id, path)
+    registry.close()
+
+
+_MODES = {"per_agent": _per_agent_clients, "registry": _registry}
+
+
+def _worker(mode: str, n: int, path: str) -> None:
+    # Импорт chromadb не входит в замер
+    import chromadb  # noqa: F401
+    import backend.agents.memory_store  # noqa: F401
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    _MODES[mode](n, path)
+    elapsed = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в Linux — килобайты
+    print(json.dumps({
+        "seconds": round(elapsed, 3),
+        "peak_rss_mb": round(rss_after / 1024, 1),
+        "rss_growth_mb": round((rss_after - rss_before) / 1024, 1),
+    }))
+
+
+def _measure(mode: str, n: int) -> dict:
+    with tempfile.TemporaryDirectory() as path:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.memory_startup", "--worker", mode, str(n), path],
+            capture_output=True, text=True, check=True,
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--agents", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--worker", nargs=3, metavar=("MODE", "N", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        mode, n, path = args.worker
+        _worker(mode, int(n), path)
+        return
+
+    for n in args.agents:
+        for mode in _MODES:
+            print(f"{n:>5} агентов, {mode}: {_measure(mode, n)}")
+
+
+if __name__ == "__main__":
+    main()
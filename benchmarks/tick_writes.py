@@ -0,0 +1,84 @@
+"""
+Бенчмарк: записи в SQLite за тик — отдельные транзакции против единицы работы тика.
+Каждый агент за тик отправляет сообщение (deliver_message → record_event)
+и синхронизирует настроение (_sync_mood_to_db), как в world._apply_action.
+LLM не вызывается — замеряется только запись в БД.
+
+Запуск: python -m benchmarks.tick_writes [--agents 20] [--ticks 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import tempfile
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from backend.db.database import make_engine
+from backend.db.models import AgentModel, Base
+from backend.simulation import events, messaging, world
+from backend.simulation.unit_of_work import tick_unit_of_work
+
+
+def _agent(agent_id: int, tick: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=agent_id,
+        emotions=SimpleNamespace(
+            get_mood_label=lambda: "хорошее" if tick % 2 else "плохое",
+            get_mood_value=lambda: tick % 100,
+        ),
+    )
+
+
+async def _run(name: str, path: str, agents: int, ticks: int, batched: bool) -> None:
+    engine = make_engine(f"sqlite+aiosqlite:///{path}/{name}.db")
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with factory() as session:
+        session.add_all(AgentModel(id=i, name=f"agent-{i}") for i in range(1, agents + 1))
+        await session.commit()
+
+    commits = []
+    event.listen(engine.sync_engine, "commit", lambda conn: commits.append(1))
+    for module in (events, messaging, world):
+        module.async_session = factory
+
+    started = time.perf_counter()
+    for tick in range(ticks):
+        async with tick_unit_of_work(factory) if batched else nullcontext():
+            for agent_id in range(1, agents + 1):
+                await messaging.deliver_message(
+                    agent_id, agent_id % agents + 1, f"тик {tick}", relation_delta=1,
+                )
+                await world._sync_mood_to_db(_agent(agent_id, tick))
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    print(
+        f"{name:>12}: {len(commits) / ticks:.0f} коммитов/тик, "
+        f"{elapsed / ticks * 1000:.1f} мс/тик ({agents} агентов)"
+    )
+
+
+async def main_async(agents: int, ticks: int) -> None:
+    with tempfile.TemporaryDirectory() as path:
+        await _run("separate", path, agents, ticks, batched=False)
+        await _run("unit-of-work", path, agents, ticks, batched=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--agents", type=int, default=20)
+    parser.add_argument("--ticks", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.agents, args.ticks))
+
+
+if __name__ == "__main__":
+    main()
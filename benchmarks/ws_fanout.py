@@ -0,0 +1,94 @@
+"""
+Бенчмарк: сколько рассылка WebSocket задерживает симуляцию при одном медленном клиенте.
+Клиенты эмулируются: отправка в «быстрый» сокет занимает ~0, в медленный — --slow-ms.
+Между рассылками --gap-ms (события тика); замеряется время внутри вызовов broadcast.
+  baseline — прежний broadcast: await send_text каждому клиенту по очереди
+  queues   — ConnectionManager: очередь и задача отправки на клиента
+
+Запуск: python -m benchmarks.ws_fanout [--clients 20] [--messages 200] [--slow-ms 50] [--gap-ms 1]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+
+from backend.api.websocket import ConnectionManager
+
+
+class _Socket:
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.received = 0
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, payload: str) -> None:
+        await asyncio.sleep(self.delay)
+        self.received += 1
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+def _sockets(clients: int, slow_ms: float) -> list[_Socket]:
+    return [_Socket(slow_ms / 1000)] + [_Socket(0) for _ in range(clients - 1)]
+
+
+async def _baseline(clients: int, messages: int, slow_ms: float, gap: float) -> float:
+    sockets = _sockets(clients, slow_ms)
+    spent = 0.0
+    for i in range(messages):
+        started = time.perf_counter()
+        payload = json.dumps({"type": "event", "data": {"id": i}}, ensure_ascii=False)
+        for ws in sockets:
+            await ws.send_text(payload)
+        spent += time.perf_counter() - started
+        await asyncio.sleep(gap)
+    return spent / messages * 1000
+
+
+async def _queues(clients: int, messages: int, slow_ms: float, gap: float) -> tuple[float, dict, int]:
+    manager = ConnectionManager(queue_size=64, policy="drop_oldest", ping_interval=60.0)
+    sockets = _sockets(clients, slow_ms)
+    for ws in sockets:
+        await manager.connect(ws)
+    spent = 0.0
+    for i in range(messages):
+        started = time.perf_counter()
+        await manager.broadcast({"type": "event", "data": {"id": i}})
+        spent += time.perf_counter() - started
+        await asyncio.sleep(gap)
+    await asyncio.sleep(0.2)
+    stats = manager.stats()
+    fast_received = min(ws.received for ws in sockets[1:])
+    await manager.aclose()
+    return spent / messages * 1000, stats, fast_received
+
+
+async def main_async(clients: int, messages: int, slow_ms: float, gap_ms: float) -> None:
+    gap = gap_ms / 1000
+    baseline = await _baseline(clients, messages, slow_ms, gap)
+    print(f"baseline: {baseline:.3f} мс внутри broadcast")
+    queued, stats, fast_received = await _queues(clients, messages, slow_ms, gap)
+    print(
+        f"  queues: {queued:.3f} мс внутри broadcast; доставка p95 {stats['latency_ms']['p95']} мс, "
+        f"быстрые клиенты получили {fast_received}/{messages}, выброшено {stats['dropped']}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--slow-ms", type=float, default=50.0)
+    parser.add_argument("--gap-ms", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.clients, args.messages, args.slow_ms, args.gap_ms))
+
+
+if __name__ == "__main__":
+    main()
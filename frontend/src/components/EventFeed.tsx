@@ -3,10 +3,11 @@
  */
 
 import React from "react";
-import type { EventItem } from "../types";
+import type { EventItem, StreamDraft } from "../types";
 
 interface Props {
   events: EventItem[];
+  drafts?: StreamDraft[];
   loading?: boolean;
   compact?: boolean;
 }
@@ -16,7 +17,7 @@ function formatTime(iso: string): string {
   return `[${d.toLocaleTimeString("ru-RU", { hour: "2-digit", minute: "2-digit" })}]`;
 }
 
-export default function EventFeed({ events, loading }: Props) {
+export default function EventFeed({ events, drafts = [], loading }: Props) {
   return (
     <div
       style={{
@@ -47,7 +48,26 @@ export default function EventFeed({ events, loading }: Props) {
         <div style={{ color: "#888", fontSize: 13 }}>Загрузка...</div>
       )}
 
-      {!loading && events.length === 0 && (
+      {drafts.map((d) => (
+        <div
+          key={d.stream_id}
+          style={{
+            fontSize: 13,
+            color: "#9ab",
+            fontStyle: "italic",
+            padding: "4px 0",
+            borderBottom: "1px solid #1a3a25",
+          }}
+        >
+          <span style={{ color: "#9ce0ff", fontWeight: 600 }}>
+            {d.actor_name}
+            {d.target_name ? ` → ${d.target_name}` : ""}:{" "}
+          </span>
+          <span>{d.text}▍</span>
+        </div>
+      ))}
+
+      {!loading && events.length === 0 && drafts.length === 0 && (
         <div style={{ color: "#888", fontSize: 13 }}>Событий пока нет</div>
       )}
 
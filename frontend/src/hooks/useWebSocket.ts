@@ -1,32 +1,66 @@
 /**
  * Хук для WebSocket-подключения к backend.
- * Автоматический реконнект, буфер событий.
+ * Автоматический реконнект, буфер событий, ответ на ping сервера,
+ * подписка (фильтр сообщений на сервере) — отправляется при подключении и при изменении.
+ * При реконнекте передаёт last_seq/epoch: сервер досылает пропущенное или отвечает
+ * resync_required — тогда растёт счётчик resyncs и страница перечитывает состояние.
  */
 
 import { useCallback, useEffect, useRef, useState } from "react";
-import type { WSMessage } from "../types";
+import type { WSMessage, WSResumeData, WSSubscription } from "../types";
 
 const RECONNECT_DELAY = 3000; // мс
 
-export function useWebSocket(url: string) {
+export function useWebSocket(url: string, subscription?: WSSubscription) {
   const wsRef = useRef<WebSocket | null>(null);
   const [connected, setConnected] = useState(false);
   const [lastMessage, setLastMessage] = useState<WSMessage | null>(null);
+  const [resyncs, setResyncs] = useState(0);
+  const lastSeq = useRef<number | null>(null);
+  const epoch = useRef<string | null>(null);
   const reconnectTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
+  const subscriptionRef = useRef(subscription);
+  subscriptionRef.current = subscription;
+  const subscriptionKey = JSON.stringify(subscription ?? null);
 
   const connect = useCallback(() => {
     if (wsRef.current?.readyState === WebSocket.OPEN) return;
 
-    const ws = new WebSocket(url);
+    const resume =
+      lastSeq.current !== null && epoch.current !== null
+        ? `${url.includes("?") ? "&" : "?"}last_seq=${lastSeq.current}&epoch=${epoch.current}`
+        : "";
+    const ws = new WebSocket(url + resume);
 
     ws.onopen = () => {
       setConnected(true);
       console.log("[WS] Подключено");
+      if (subscriptionRef.current) {
+        ws.send(JSON.stringify({ type: "subscribe", data: subscriptionRef.current }));
+      }
     };
 
     ws.onmessage = (ev) => {
       try {
         const msg: WSMessage = JSON.parse(ev.data);
+        // Сервер отключает клиентов, которые не отвечают на ping
+        if (msg.type === "ping") {
+          ws.send(JSON.stringify({ type: "pong", data: msg.data }));
+          return;
+        }
+        if (msg.type === "hello" || msg.type === "resync_required") {
+          const info = msg.data as unknown as WSResumeData;
+          // Та же эпоха после hello — дальше придут пропущенные сообщения
+          if (msg.type === "resync_required" || epoch.current !== info.epoch) {
+            epoch.current = info.epoch;
+            lastSeq.current = info.seq;
+          }
+          if (msg.type === "resync_required") setResyncs((n) => n + 1);
+          return;
+        }
+        if (typeof msg.seq === "number") {
+          lastSeq.current = Math.max(lastSeq.current ?? 0, msg.seq);
+        }
         setLastMessage(msg);
       } catch {
         console.warn("[WS] Невалидное сообщение", ev.data);
@@ -55,5 +89,13 @@ export function useWebSocket(url: string) {
     };
   }, [connect]);
 
-  return { connected, lastMessage };
+  // Подписка изменилась — сообщить серверу, не переподключаясь
+  useEffect(() => {
+    const ws = wsRef.current;
+    if (subscriptionRef.current && ws?.readyState === WebSocket.OPEN) {
+      ws.send(JSON.stringify({ type: "subscribe", data: subscriptionRef.current }));
+    }
+  }, [subscriptionKey]);
+
+  return { connected, lastMessage, resyncs };
 }
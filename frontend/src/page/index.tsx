@@ -4,7 +4,16 @@
  */
 
 import React, { useCallback, useEffect, useState } from "react";
-import type { Agent, EventItem, Relationship, WSMessage } from "../types";
+import type {
+  Agent,
+  EventItem,
+  MessageStreamData,
+  Relationship,
+  RelationUpdateData,
+  StreamDraft,
+  TickBatchData,
+  WSMessage,
+} from "../types";
 import AgentCard from "../components/AgentCard";
 import EventFeed from "../components/EventFeed";
 import RelationGraph from "../components/RelationGraph";
@@ -21,14 +30,20 @@ export default function Main() {
   const [agents, setAgents] = useState<Agent[]>([]);
   const [relationships, setRelationships] = useState<Relationship[]>([]);
   const [events, setEvents] = useState<EventItem[]>([]);
+  const [drafts, setDrafts] = useState<StreamDraft[]>([]);
   const [loading, setLoading] = useState(true);
   const [selectedAgentId, setSelectedAgentId] = useState<number | null>(null);
 
   const isMobile = useIsMobile();
   const isTablet = useIsTablet();
 
-  // WebSocket
-  const { connected, lastMessage } = useWebSocket(WS_URL);
+  // WebSocket: страница показывает весь мир, агент в инспекторе — в фокусе подписки
+  // batch: обновления тика приходят одной рамкой tick_batch — один рендер на тик
+  const { connected, lastMessage, resyncs } = useWebSocket(WS_URL, {
+    types: ["event", "mood_update", "relation_update", "message_stream"],
+    focus: selectedAgentId,
+    batch: true,
+  });
 
   // ── Загрузка данных ───────────────────────────────────────────────
 
@@ -56,15 +71,40 @@ export default function Main() {
     refreshData().finally(() => setLoading(false));
   }, [refreshData]);
 
-  // ── Реакция на WebSocket-сообщения ────────────────────────────────
-
+  // Пропущенные сообщения уже вытеснены из буфера сервера — перечитать состояние
   useEffect(() => {
-    if (!lastMessage) return;
-    const msg = lastMessage as WSMessage;
+    if (resyncs > 0) refreshData();
+  }, [resyncs, refreshData]);
 
+  // ── Реакция на WebSocket-сообщения ────────────────────────────────
+
+  const applyMessage = useCallback((msg: WSMessage) => {
     if (msg.type === "event") {
       const evData = msg.data as unknown as EventItem;
       setEvents((prev) => [evData, ...prev].slice(0, 50));
+      // Итоговое событие заменяет черновик потокового сообщения
+      if (evData.stream_id) {
+        setDrafts((prev) => prev.filter((d) => d.stream_id !== evData.stream_id));
+      }
+    }
+
+    if (msg.type === "message_stream") {
+      const s = msg.data as unknown as MessageStreamData;
+      setDrafts((prev) => {
+        if (s.cancelled) return prev.filter((d) => d.stream_id !== s.stream_id);
+        const existing = prev.find((d) => d.stream_id === s.stream_id);
+        if (!existing) {
+          return [
+            { stream_id: s.stream_id, actor_name: s.actor_name, target_name: s.target_name, text: s.delta },
+            ...prev,
+          ];
+        }
+        return prev.map((d) =>
+          d.stream_id === s.stream_id
+            ? { ...d, target_name: s.target_name ?? d.target_name, text: d.text + s.delta }
+            : d
+        );
+      });
     }
 
     if (msg.type === "mood_update") {
@@ -81,12 +121,34 @@ export default function Main() {
     }
 
     if (msg.type === "relation_update") {
-      fetch(`${API_URL}/api/relationships`)
-        .then((r) => r.json())
-        .then(setRelationships)
-        .catch(() => {});
+      // Сервер присылает только изменившееся ребро — вливаем его без перечитывания графа
+      const edge = msg.data as unknown as RelationUpdateData;
+      setRelationships((prev) => {
+        const i = prev.findIndex(
+          (r) => r.agent_from_id === edge.agent_from_id && r.agent_to_id === edge.agent_to_id
+        );
+        if (i === -1) {
+          return edge.id !== undefined ? [...prev, edge as Relationship] : prev;
+        }
+        const next = prev.slice();
+        next[i] = { ...prev[i], ...edge };
+        return next;
+      });
+    }
+  }, []);
+
+  useEffect(() => {
+    if (!lastMessage) return;
+    const msg = lastMessage as WSMessage;
+
+    if (msg.type === "tick_batch") {
+      // Обновления состояния из всей рамки React применит за один рендер
+      const { messages } = msg.data as unknown as TickBatchData;
+      messages.forEach(applyMessage);
+      return;
     }
-  }, [lastMessage]);
+    applyMessage(msg);
+  }, [lastMessage, applyMessage]);
 
   // ── Рендер ────────────────────────────────────────────────────────
 
@@ -122,7 +184,7 @@ export default function Main() {
         />
 
         {/* Лента событий */}
-        <EventFeed events={events} loading={loading} />
+        <EventFeed events={events} drafts={drafts} loading={loading} />
 
         {/* Панель управления */}
         <ControlPanel agents={agents} onRefresh={refreshData} compact />
@@ -167,7 +229,7 @@ export default function Main() {
         <RelationGraph agents={agents} relationships={relationships}
           onSelectAgent={(id) => setSelectedAgentId((prev) => (prev === id ? null : id))}
         />
-        <EventFeed events={events} loading={loading} />
+        <EventFeed events={events} drafts={drafts} loading={loading} />
         <ControlPanel agents={agents} onRefresh={refreshData} />
       </div>
 
@@ -70,28 +70,87 @@ export interface Relationship {
   display_strength: number;
   from_name?: string;
   to_name?: string;
+  /** Симпатия runtime-агента (-100…100), null — симуляция не запущена */
+  affinity?: number | null;
 }
 
+/** relation_update: ребро целиком (с id) или только новая симпатия пары */
+export type RelationUpdateData = Partial<Relationship> &
+  Pick<Relationship, "agent_from_id" | "agent_to_id">;
+
 // ── Событие ─────────────────────────────────────────────────────────
 
 export interface EventItem {
   id: number;
   content: string;
   created_at: string;
+  actor_id?: number | null;
+  target_id?: number | null;
   actor_name: string | null;
   target_name: string | null;
   mood_after: Mood | null;
   relation_type: RelationType | null;
   relation_delta: number;
+  stream_id?: string;
+}
+
+// ── Потоковое сообщение (агент «печатает») ──────────────────────────
+
+export interface StreamDraft {
+  stream_id: string;
+  actor_name: string;
+  target_name: string | null;
+  text: string;
 }
 
 // ── WebSocket-сообщения ─────────────────────────────────────────────
 
-export type WSMessageType = "event" | "mood_update" | "relation_update";
+export type WSMessageType =
+  | "event"
+  | "mood_update"
+  | "relation_update"
+  | "message_stream"
+  | "ping"
+  | "pong"
+  | "subscribed"
+  | "tick_batch"
+  | "hello"
+  | "resync_required";
 
 export interface WSMessage {
   type: WSMessageType;
   data: Record<string, unknown>;
+  /** Сквозной номер рассылки (у tick_batch — последнего сообщения в рамке) */
+  seq?: number;
+}
+
+/** hello / resync_required: эпоха сервера и номер последней рассылки */
+export interface WSResumeData {
+  epoch: string;
+  seq: number;
+}
+
+/** Фильтр сообщений на сервере (null — без фильтра, отсутствующий ключ — не менять). */
+export interface WSSubscription {
+  types?: WSMessageType[] | null;
+  agent_ids?: number[] | null;
+  focus?: number | null;
+  /** Получать обновления тика одной рамкой tick_batch */
+  batch?: boolean;
+}
+
+export interface TickBatchData {
+  messages: WSMessage[];
+}
+
+export interface MessageStreamData {
+  stream_id: string;
+  agent_id: number;
+  actor_name: string;
+  target_name: string | null;
+  delta: string;
+  done?: boolean;
+  cancelled?: boolean;
 }
 
 export interface MoodUpdateData {
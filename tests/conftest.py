@@ -0,0 +1,8 @@
+"""
+Общие фикстуры тестов.
+"""
+
+import os
+
+# Settings читается при импорте backend.config — ключ нужен до любого импорта backend
+os.environ.setdefault("LLM_API_KEY", "test-key")
@@ -52,6 +52,14 @@ class TestRelationships:
         all_aff[4] = 99
         assert 4 not in rel.affinities
 
+    def test_on_change_observer(self):
+        changes = []
+        rel = Relationships(agent_id=1, on_change=lambda *args: changes.append(args))
+        rel.update_affinity(2, 90)
+        rel.update_affinity(2, 30)  # упёрлись в 100
+        rel.update_affinity(2, 30)  # значение не изменилось — без уведомления
+        assert changes == [(1, 2, 90), (1, 2, 100)]
+
     def test_multiple_agents(self):
         rel = Relationships(agent_id=1)
         rel.update_affinity(2, 50)
@@ -132,3 +140,59 @@ class TestAgentAct:
         await agent.act(["Фыр"])
         assert agent.current_goal is not None
         assert len(agent.current_goal) <= 50
+
+
+# ══════════════════════════════════════════════════════════════════════
+#  Пакетный планировщик
+# ══════════════════════════════════════════════════════════════════════
+
+class TestBatchPlanner:
+    def test_validate_action_accepts_known_target(self):
+        from backend.agents.planner import validate_action
+        action = validate_action(
+            {"agent": "Мо", "type": "message", "target": "Фыр", "content": "Привет!"},
+            ["Фыр", "Роки"],
+        )
+        assert action == {"type": "message", "target": "Фыр", "content": "Привет!"}
+
+    @pytest.mark.parametrize("entry", [
+        None,
+        "не объект",
+        {"type": "move", "target": "Фыр", "content": "иду"},
+        {"type": "message", "target": "Незнакомец", "content": "кто ты?"},
+        {"type": "message", "target": "Фыр", "content": ""},
+    ])
+    def test_validate_action_rejects_invalid(self, entry):
+        from backend.agents.planner import validate_action
+        assert validate_action(entry, ["Фыр", "Роки"]) is None
+
+    @pytest.mark.asyncio
+    async def test_batch_maps_entries_by_agent(self):
+        from backend.agents import planner as planner_module
+
+        mo = MagicMock()
+        mo.name, mo.personality = "Мо", "панда"
+        roki = MagicMock()
+        roki.name, roki.personality = "Роки", "лис"
+        context = {
+            "mood_label": "нейтральное",
+            "recent_memories": "- ничего",
+            "relations": "",
+        }
+        requests = [
+            (mo, {**context, "other_agents_names": ["Роки", "Фыр"]}),
+            (roki, {**context, "other_agents_names": ["Мо", "Фыр"]}),
+        ]
+        response = (
+            'Вот решения: [{"agent": "Роки", "type": "message", "target": "Роки", "content": "сам себе"},'
+            ' {"agent": "Мо", "type": "message", "target": "Фыр", "content": "Привет, Фыр!"}]'
+        )
+        with patch.object(planner_module, "LLMClient") as MockClient:
+            MockClient.return_value.generate = AsyncMock(return_value=response)
+            actions = await planner_module.decide_actions_batch(requests)
+
+        assert actions[0] == {"type": "message", "target": "Фыр", "content": "Привет, Фыр!"}
+        # Роки выбрал недопустимую цель — нужен индивидуальный вызов
+        assert actions[1] is None
+        mo.adopt_action.assert_called_once_with(actions[0])
+        roki.adopt_action.assert_not_called()
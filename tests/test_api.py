@@ -0,0 +1,131 @@
+"""
+Тесты REST API — лента событий (фильтры, курсоры, NDJSON-выгрузка),
+рассылка изменившихся рёбер графа отношений.
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.api import routes, websocket
+from backend.db import directory
+from backend.db.database import WorldSession
+from backend.db.models import AgentModel, Base, EventModel
+from backend.simulation import relations
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    """API поверх SQLite в памяти: агенты 1 и 2, 30 событий."""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, sync_session_class=WorldSession, expire_on_commit=False)
+    agents = directory.AgentDirectory()
+    monkeypatch.setattr(directory, "agent_directory", agents)
+    monkeypatch.setattr(routes, "agent_directory", agents)
+    monkeypatch.setattr(relations, "agent_directory", agents)
+    monkeypatch.setattr(routes, "read_session", factory)
+    monkeypatch.setattr(routes, "async_session", factory)
+    monkeypatch.setattr(routes, "EXPORT_CHUNK_SIZE", 7)
+
+    start = datetime(2026, 1, 1)
+    async with factory() as session:
+        session.add_all([AgentModel(id=1, name="Мо"), AgentModel(id=2, name="Роки")])
+        for i in range(1, 31):
+            session.add(EventModel(
+                id=i,
+                content=f"событие {i}",
+                actor_id=1 if i % 2 else 2,
+                target_id=2 if i % 2 else None,
+                relation_type="друзья" if i % 3 == 0 else None,
+                created_at=start + timedelta(hours=i),
+            ))
+        await session.commit()
+
+    app = FastAPI()
+    app.include_router(routes.router)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+    await engine.dispose()
+
+
+def _ids(response) -> list[int]:
+    assert response.status_code == 200
+    return [e["id"] for e in response.json()]
+
+
+class TestEventFeed:
+    async def test_newest_first(self, client):
+        response = await client.get("/api/events", params={"limit": 3})
+        assert _ids(response) == [30, 29, 28]
+        assert response.json()[0]["actor_name"] == "Роки"
+
+    async def test_keyset_pages(self, client):
+        assert _ids(await client.get("/api/events", params={"limit": 3, "before_id": 28})) == [27, 26, 25]
+        # after_id — ближайшие события после курсора, порядок тот же
+        assert _ids(await client.get("/api/events", params={"limit": 3, "after_id": 5})) == [8, 7, 6]
+
+    async def test_both_cursors_rejected(self, client):
+        response = await client.get("/api/events", params={"before_id": 10, "after_id": 5})
+        assert response.status_code == 400
+
+    async def test_filters(self, client):
+        assert _ids(await client.get("/api/events", params={"actor_id": 2, "limit": 3})) == [30, 28, 26]
+        assert _ids(await client.get("/api/events", params={"target_id": 2, "limit": 2})) == [29, 27]
+        assert _ids(await client.get(
+            "/api/events", params={"relation_type": "друзья", "before_id": 12}
+        )) == [9, 6, 3]
+        assert _ids(await client.get("/api/events", params={
+            "since": "2026-01-01T05:00:00", "until": "2026-01-01T08:00:00",
+        })) == [7, 6, 5]
+        assert len(_ids(await client.get("/api/events", params={"agent_id": 2, "limit": 100}))) == 30
+
+
+class TestEventExport:
+    async def test_streams_all_in_chunks(self, client):
+        response = await client.get("/api/events/export")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [r["id"] for r in rows] == list(range(1, 31))
+
+    async def test_cursor_limit_and_filters(self, client):
+        response = await client.get(
+            "/api/events/export", params={"after_id": 10, "limit": 4, "actor_id": 1}
+        )
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [r["id"] for r in rows] == [11, 13, 15, 17]
+
+
+class TestRelationDeltas:
+    async def test_changed_edges_are_broadcast(self, client, monkeypatch):
+        broadcasts: list[dict] = []
+
+        async def fake_broadcast(message):
+            broadcasts.append(message)
+
+        monkeypatch.setattr(websocket.manager, "broadcast", fake_broadcast)
+        response = await client.post("/api/events", json={
+            "content": "Мо помог Роки", "actorId": 1, "targetId": 2, "moodAfter": "счастлив",
+            "relationType": "друзья", "relationDelta": 10,
+        })
+        assert response.status_code == 201
+        assert [b["type"] for b in broadcasts] == ["relation_update"]
+        edge = broadcasts[0]["data"]
+        assert (edge["agent_from_id"], edge["agent_to_id"], edge["strength"]) == (1, 2, 60)
+        assert edge["display_strength"] == 65
+
+        # Граф из REST совпадает с присланным ребром
+        graph = (await client.get("/api/relationships")).json()
+        assert graph == [{**edge, "affinity": None}]
+
+        # Настроение меняет отображаемую силу — ребро приходит заново
+        await client.patch("/api/agents/2/mood", json={"mood": "злой"})
+        assert broadcasts[-1]["data"]["display_strength"] == 57
+        await client.patch("/api/agents/2/mood", json={"mood": "злой"})
+        assert len(broadcasts) == 2
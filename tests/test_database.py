@@ -0,0 +1,232 @@
+"""
+Тесты подключения к SQLite — database.py (PRAGMA, раздельные пулы записи и чтения,
+индексы горячих запросов и миграция старой схемы).
+"""
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend.db.database import _upgrade_schema, make_engine, sqlite_pragmas
+from backend.db.models import Base, EventModel, GoalModel, MemoryModel, RelationshipModel
+
+
+@pytest.fixture
+async def engines(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'world.db'}"
+    writer = make_engine(url)
+    reader = make_engine(url, read_only=True, pool_size=2)
+    async with writer.begin() as conn:
+        await conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)"))
+    yield writer, reader
+    await reader.dispose()
+    await writer.dispose()
+
+
+class TestPragmas:
+    def test_writer_sets_journal_mode(self):
+        pragmas = sqlite_pragmas()
+        assert "PRAGMA foreign_keys=ON" in pragmas
+        assert any(p.startswith("PRAGMA journal_mode=") for p in pragmas)
+        assert "PRAGMA query_only=ON" not in pragmas
+
+    def test_reader_is_query_only(self):
+        pragmas = sqlite_pragmas(read_only=True)
+        assert pragmas[-1] == "PRAGMA query_only=ON"
+        assert not any(p.startswith("PRAGMA journal_mode=") for p in pragmas)
+
+    async def test_applied_on_connect(self, engines):
+        writer, reader = engines
+        async with writer.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+            assert (await conn.execute(text("PRAGMA foreign_keys"))).scalar() == 1
+
+
+class TestPools:
+    def test_single_writer_connection(self, tmp_path):
+        writer = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'w.db'}")
+        assert writer.pool.size() == 1
+
+    async def test_reader_sees_committed_rows(self, engines):
+        writer, reader = engines
+        async with writer.begin() as conn:
+            await conn.execute(text("INSERT INTO t (v) VALUES ('a')"))
+        async with reader.connect() as conn:
+            assert (await conn.execute(text("SELECT count(*) FROM t"))).scalar() == 1
+
+    async def test_reader_rejects_writes(self, engines):
+        _, reader = engines
+        async with reader.connect() as conn:
+            with pytest.raises(OperationalError):
+                await conn.execute(text("INSERT INTO t (v) VALUES ('b')"))
+
+    async def test_read_during_open_write(self, engines):
+        """В WAL чтение не ждёт незавершённую транзакцию писателя."""
+        writer, reader = engines
+        async with writer.connect() as wconn:
+            await wconn.execute(text("BEGIN IMMEDIATE"))
+            await wconn.execute(text("INSERT INTO t (v) VALUES ('c')"))
+            async with reader.connect() as rconn:
+                assert (await rconn.execute(text("SELECT count(*) FROM t"))).scalar() == 0
+            await wconn.execute(text("ROLLBACK"))
+
+
+@pytest.fixture
+async def schema_conn():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("INSERT INTO agents (id, name, mood, personality_type, "
+                                "personality_title, avatar_emoji, mood_value) VALUES "
+                                "(1, 'Мо', 'счастлив', 'ISFP', '', '🐼', 0), "
+                                "(2, 'Роки', 'грустный', 'ENTP', '', '🦊', 0)"))
+        yield conn
+    await engine.dispose()
+
+
+async def _plan(conn, stmt) -> str:
+    sql = stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    rows = (await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+class TestQueryPlans:
+    """Запросы горячих путей идут по индексу и не сортируют во временном B-дереве."""
+
+    async def test_relationship_pair(self, schema_conn):
+        plan = await _plan(schema_conn, select(RelationshipModel).where(
+            RelationshipModel.agent_from_id == 1, RelationshipModel.agent_to_id == 2,
+        ))
+        assert "ux_relationships_pair" in plan
+
+    async def test_agent_memories(self, schema_conn):
+        plan = await _plan(schema_conn, select(MemoryModel)
+                           .where(MemoryModel.agent_id == 1)
+                           .order_by(MemoryModel.timestamp.desc()).limit(10))
+        assert "ix_memories_agent_ts" in plan
+        assert "TEMP B-TREE" not in plan
+
+    async def test_active_goals(self, schema_conn):
+        plan = await _plan(schema_conn, select(GoalModel)
+                           .where(GoalModel.agent_id == 1, GoalModel.status == "active")
+                           .order_by(GoalModel.created_at.desc()))
+        assert "ix_goals_agent_status" in plan
+        assert "TEMP B-TREE" not in plan
+
+    async def test_events_by_actor(self, schema_conn):
+        plan = await _plan(schema_conn, select(EventModel)
+                           .where(EventModel.actor_id == 1)
+                           .order_by(EventModel.id.desc()).limit(50))
+        assert "ix_events_actor" in plan
+        assert "TEMP B-TREE" not in plan
+
+    async def test_events_by_relation_type_and_period(self, schema_conn):
+        from datetime import datetime
+
+        plan = await _plan(schema_conn, select(EventModel)
+                           .where(EventModel.relation_type == "друзья", EventModel.id < 100)
+                           .order_by(EventModel.id.desc()).limit(20))
+        assert "ix_events_relation" in plan
+        assert "TEMP B-TREE" not in plan
+        plan = await _plan(schema_conn, select(EventModel)
+                           .where(EventModel.created_at >= datetime(2026, 1, 1)))
+        assert "ix_events_created" in plan
+
+    async def test_pair_is_unique(self, schema_conn):
+        insert = text("INSERT INTO relationships (agent_from_id, agent_to_id, relation_type, "
+                      "strength, updated_at) VALUES (1, 2, 'друзья', 50, CURRENT_TIMESTAMP)")
+        await schema_conn.execute(insert)
+        with pytest.raises(IntegrityError):
+            await schema_conn.execute(insert)
+
+
+class TestUpgradeSchema:
+    async def test_dedupes_relationships_and_adds_indexes(self, schema_conn):
+        # Старая БД: индексов нет, у пары 1→2 два отношения
+        for name in ("ux_relationships_pair", "ix_memories_agent_ts", "ix_goals_agent_status",
+                     "ix_events_actor", "ix_events_target", "ix_events_relation"):
+            await schema_conn.execute(text(f"DROP INDEX {name}"))
+        await schema_conn.execute(text(
+            "INSERT INTO relationships (agent_from_id, agent_to_id, relation_type, strength, "
+            "updated_at) VALUES (1, 2, 'друзья', 40, CURRENT_TIMESTAMP), "
+            "(1, 2, 'напряжение', 70, CURRENT_TIMESTAMP), (2, 1, 'друзья', 60, CURRENT_TIMESTAMP)"
+        ))
+
+        await _upgrade_schema(schema_conn)
+        await _upgrade_schema(schema_conn)  # повторный запуск безопасен
+
+        rows = (await schema_conn.execute(text(
+            "SELECT agent_from_id, agent_to_id, relation_type FROM relationships ORDER BY id"
+        ))).fetchall()
+        assert [tuple(r) for r in rows] == [(1, 2, "напряжение"), (2, 1, "друзья")]
+        indexes = {r[0] for r in (await schema_conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        ))).fetchall()}
+        assert {"ux_relationships_pair", "ix_memories_agent_ts", "ix_goals_agent_status",
+                "ix_events_actor", "ix_events_target", "ix_events_relation"} <= indexes
+
+
+@pytest.fixture
+async def directory_db():
+    """SQLite в памяти, сессии WorldSession и свежий справочник агентов."""
+    from unittest.mock import patch
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from backend.db import directory
+    from backend.db.database import WorldSession
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, sync_session_class=WorldSession, expire_on_commit=False)
+    with patch.object(directory, "agent_directory", directory.AgentDirectory()) as fresh:
+        yield factory, fresh
+    await engine.dispose()
+
+
+class TestAgentDirectory:
+    async def test_load(self, directory_db):
+        from backend.db.models import AgentModel
+
+        factory, agents = directory_db
+        async with factory() as session:
+            session.add(AgentModel(id=1, name="Мо", mood="счастлив"))
+            await session.commit()
+        await agents.load(factory)
+        assert agents.loaded
+        assert agents.get(1).mood == "счастлив"
+        assert agents.names() == {1: "Мо"}
+
+    async def test_commit_applies_inserts_and_updates(self, directory_db):
+        from backend.db.models import AgentModel
+
+        factory, agents = directory_db
+        async with factory() as session:
+            session.add(AgentModel(id=7, name="Лея"))
+            await session.commit()
+        assert agents.name(7) == "Лея"
+        assert agents.get(7).mood == "нейтральный"
+
+        async with factory() as session:
+            (await session.get(AgentModel, 7)).mood = "злой"
+            await session.commit()
+        assert agents.get(7).mood == "злой"
+
+    async def test_rollback_discards_flushed_changes(self, directory_db):
+        from backend.db.models import AgentModel
+
+        factory, agents = directory_db
+        async with factory() as session:
+            session.add(AgentModel(id=3, name="Фыр"))
+            await session.flush()
+            assert agents.get(3) is None  # до коммита справочник не меняется
+            await session.rollback()
+        assert agents.get(3) is None
+
+    async def test_unknown_id(self, directory_db):
+        _, agents = directory_db
+        assert agents.name(None) is None
+        assert agents.name(42) is None
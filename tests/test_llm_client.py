@@ -0,0 +1,334 @@
+"""
+Тесты LLM-клиента, общего пула соединений, глобального лимитера, кэша ответов
+и потоковой генерации.
+HTTP подменяется httpx.MockTransport — сеть не используется.
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend.llm import cache as cache_module
+from backend.llm import client as client_module
+from backend.llm.cache import LLMResponseCache
+from backend.llm.client import LLMClient
+from backend.llm.pool import LLMConnectionPool
+from backend.llm.ratelimit import LLMRateLimiter, PrioritySemaphore, TokenBucket, parse_duration
+from backend.llm.streaming import ActionStreamParser
+
+
+def _ok_response(content: str = "ответ") -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+
+@pytest.fixture(autouse=True)
+def memory_cache(monkeypatch):
+    """Кэш только в памяти — тесты не пишут на диск и не видят чужих ответов."""
+    cache = LLMResponseCache(path=None, memory_items=16)
+    monkeypatch.setattr(client_module, "llm_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return _ok_response()
+
+    test_pool = LLMConnectionPool(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(client_module, "llm_pool", test_pool)
+    monkeypatch.setattr(client_module, "llm_limiter", LLMRateLimiter(0, 0, max_concurrency=8))
+    test_pool.requests = requests
+    yield test_pool
+
+
+class TestConnectionPool:
+    @pytest.mark.asyncio
+    async def test_clients_share_one_http_client(self, pool):
+        first = LLMClient(api_key="k", base_url="http://llm.test")
+        second = LLMClient(api_key="k", base_url="http://llm.test")
+        await first.generate("привет")
+        shared = pool.client
+        await second.generate("как дела?")
+        assert pool.client is shared
+        assert len(pool.requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_stats_count_requests(self, pool):
+        llm = LLMClient(api_key="k", base_url="http://llm.test")
+        await llm.generate("раз")
+        await llm.generate("два")
+        stats = pool.stats()
+        assert stats["requests"] == 2
+        assert stats["in_flight"] == 0
+        assert stats["waiting"] == 0
+        # У тестового транспорта нет пула httpcore — best-effort поля пустые
+        assert stats["connections_open"] is None
+
+    @pytest.mark.asyncio
+    async def test_aclose_recreates_client_lazily(self, pool):
+        llm = LLMClient(api_key="k", base_url="http://llm.test")
+        await llm.generate("раз")
+        old = pool.client
+        await pool.aclose()
+        assert old.is_closed
+        await llm.generate("два")
+        assert pool.client is not old
+
+    @pytest.mark.asyncio
+    async def test_generate_returns_content(self, pool):
+        llm = LLMClient(api_key="k", base_url="http://llm.test")
+        assert await llm.generate("вопрос", system_prompt="система") == "ответ"
+        sent = pool.requests[0]
+        assert sent.url.path == "/chat/completions"
+        assert sent.headers["Authorization"] == "Bearer k"
+
+
+# ── Лимитер ──────────────────────────────────────────────────────────
+
+class TestParseDuration:
+    @pytest.mark.parametrize("value,expected", [
+        ("2", 2.0),
+        ("0.5", 0.5),
+        ("250ms", 0.25),
+        ("1m30s", 90.0),
+        ("6m0s", 360.0),
+        (None, None),
+        ("непонятно", None),
+    ])
+    def test_formats(self, value, expected):
+        assert parse_duration(value) == expected
+
+
+class TestTokenBucket:
+    def test_burst_then_wait(self):
+        bucket = TokenBucket(rate=10, capacity=2)
+        assert bucket.wait_time(1) == 0
+        bucket.consume(1)
+        bucket.consume(1)
+        assert bucket.wait_time(1) > 0
+
+    def test_unlimited(self):
+        bucket = TokenBucket(rate=0, capacity=0)
+        bucket.consume(1000)
+        assert bucket.wait_time(1000) == 0
+
+
+class TestPrioritySemaphore:
+    @pytest.mark.asyncio
+    async def test_higher_priority_served_first(self):
+        sem = PrioritySemaphore(1)
+        await sem.acquire(0)
+        order: list[str] = []
+
+        async def waiter(name: str, priority: int):
+            await sem.acquire(priority)
+            order.append(name)
+            sem.release()
+
+        tasks = [
+            asyncio.create_task(waiter("summary", 2)),
+            asyncio.create_task(waiter("action", 0)),
+        ]
+        await asyncio.sleep(0)
+        sem.release()
+        await asyncio.gather(*tasks)
+        assert order == ["action", "summary"]
+
+
+class TestRateLimitedRetries:
+    @pytest.mark.asyncio
+    async def test_retry_after_pauses_and_retries(self, monkeypatch):
+        calls = {"n": 0}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls["n"] += 1
+            if calls["n"] == 1:
+                return httpx.Response(429, headers={"retry-after": "0.05"})
+            return httpx.Response(200, json={
+                "choices": [{"message": {"content": "ок"}}],
+                "usage": {"total_tokens": 42},
+            })
+
+        limiter = LLMRateLimiter(0, 0, max_concurrency=4)
+        monkeypatch.setattr(client_module, "llm_pool", LLMConnectionPool(transport=httpx.MockTransport(handler)))
+        monkeypatch.setattr(client_module, "llm_limiter", limiter)
+
+        llm = LLMClient(api_key="k", base_url="http://llm.test")
+        assert await llm.generate("привет", call_type="action") == "ок"
+        stats = limiter.stats()
+        assert stats["rate_limited"] == 1
+        assert stats["retries"] == 1
+        assert stats["tokens_used"] == 42
+
+    def test_ratelimit_headers_pause(self):
+        limiter = LLMRateLimiter(0, 0, max_concurrency=1)
+        limiter.update_from_headers({
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "2s",
+        })
+        assert limiter.stats()["paused_for_seconds"] > 1
+
+
+# ── Кэш ответов ──────────────────────────────────────────────────────
+
+class TestResponseCache:
+    @pytest.mark.asyncio
+    async def test_repeated_prompt_served_from_cache(self, pool, memory_cache, monkeypatch):
+        # generate сэмплирует с temperature 0.7 — кэш таких ответов включается явно
+        monkeypatch.setattr(cache_module.settings, "llm_cache_skip_nonzero_temperature", False)
+        llm = LLMClient(api_key="k", base_url="http://llm.test")
+        first = await llm.generate("одинаковый промпт", call_type="summary")
+        second = await llm.generate("одинаковый промпт", call_type="summary")
+        assert first == second
+        assert len(pool.requests) == 1
+        assert memory_cache.stats()["hits_memory"] == 1
+
+    def test_key_depends_on_all_parts(self):
+        base = LLMResponseCache.make_key("m", "sys", "prompt", 0.7)
+        assert base == LLMResponseCache.make_key("m", "sys", "prompt", 0.7)
+        assert base != LLMResponseCache.make_key("m2", "sys", "prompt", 0.7)
+        assert base != LLMResponseCache.make_key("m", "sys2", "prompt", 0.7)
+        assert base != LLMResponseCache.make_key("m", "sys", "prompt2", 0.7)
+        assert base != LLMResponseCache.make_key("m", "sys", "prompt", 0.0)
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        cache = LLMResponseCache(path=None, memory_items=2)
+        await cache.set("a", "1", "summary")
+        await cache.set("b", "2", "summary")
+        await cache.get("a", "summary")
+        await cache.set("c", "3", "summary")
+        assert await cache.get("b", "summary") is None
+        assert await cache.get("a", "summary") == "1"
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry(self, monkeypatch):
+        cache = LLMResponseCache(path=None, memory_items=4)
+        monkeypatch.setattr(cache_module.settings, "llm_cache_ttl_action", 10)
+        await cache.set("k", "v", "action")
+        now = cache_module.time.time()
+        monkeypatch.setattr(cache_module.time, "time", lambda: now + 11)
+        assert await cache.get("k", "action") is None
+
+    @pytest.mark.asyncio
+    async def test_disk_tier_survives_restart(self, tmp_path):
+        path = str(tmp_path / "llm_cache.db")
+        cache = LLMResponseCache(path=path, memory_items=4)
+        await cache.set("k", "из диска", "profile")
+        await cache.aclose()
+
+        reopened = LLMResponseCache(path=path, memory_items=4)
+        assert await reopened.get("k", "profile") == "из диска"
+        assert reopened.stats()["hits_disk"] == 1
+        await reopened.aclose()
+
+    def test_nonzero_temperature_bypass(self, monkeypatch):
+        cache = LLMResponseCache(path=None, memory_items=4)
+        # По умолчанию сэмплированные ответы не кэшируются
+        assert cache.should_cache("action", 0.7) is False
+        assert cache.should_cache("action", 0.0) is True
+        monkeypatch.setattr(cache_module.settings, "llm_cache_skip_nonzero_temperature", False)
+        assert cache.should_cache("action", 0.7) is True
+
+
+# ── Потоковая генерация ──────────────────────────────────────────────
+
+def _sse(*deltas: str) -> bytes:
+    lines = [
+        "data: " + json.dumps({"choices": [{"delta": {"content": d}}]}, ensure_ascii=False)
+        for d in deltas
+    ]
+    lines.append("data: [DONE]")
+    return ("\n\n".join(lines) + "\n\n").encode("utf-8")
+
+
+class TestStreaming:
+    @pytest.mark.asyncio
+    async def test_generate_streams_deltas(self, monkeypatch):
+        sent: list[dict] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            sent.append(json.loads(request.content))
+            return httpx.Response(
+                200,
+                content=_sse('{"type": "message", "tar', 'get": "Фыр", "content": "При', 'вет!"}'),
+                headers={"content-type": "text/event-stream"},
+            )
+
+        monkeypatch.setattr(client_module, "llm_pool", LLMConnectionPool(transport=httpx.MockTransport(handler)))
+        monkeypatch.setattr(client_module, "llm_limiter", LLMRateLimiter(0, 0, max_concurrency=4))
+
+        chunks: list[str] = []
+
+        async def on_delta(text: str) -> None:
+            chunks.append(text)
+
+        llm = LLMClient(api_key="k", base_url="http://llm.test")
+        result = await llm.generate("привет", call_type="action", on_delta=on_delta)
+        assert sent[0]["stream"] is True
+        assert len(chunks) == 3
+        assert result == "".join(chunks)
+        assert json.loads(result)["content"] == "Привет!"
+
+    @pytest.mark.asyncio
+    async def test_junk_data_lines_skipped(self, monkeypatch):
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(
+                200,
+                content=b"data: \n\ndata: {oops\n\n" + _sse("При", "вет"),
+                headers={"content-type": "text/event-stream"},
+            )
+
+        monkeypatch.setattr(client_module, "llm_pool", LLMConnectionPool(transport=httpx.MockTransport(handler)))
+        monkeypatch.setattr(client_module, "llm_limiter", LLMRateLimiter(0, 0, max_concurrency=4))
+
+        chunks: list[str] = []
+
+        async def on_delta(text: str) -> None:
+            chunks.append(text)
+
+        llm = LLMClient(api_key="k", base_url="http://llm.test")
+        assert await llm.generate("привет", call_type="action", on_delta=on_delta) == "Привет"
+        assert chunks == ["При", "вет"]
+
+    @pytest.mark.asyncio
+    async def test_cached_answer_delivered_as_single_delta(self, pool, monkeypatch):
+        monkeypatch.setattr(cache_module.settings, "llm_cache_skip_nonzero_temperature", False)
+        llm = LLMClient(api_key="k", base_url="http://llm.test")
+        await llm.generate("один и тот же", call_type="summary")
+        chunks: list[str] = []
+
+        async def on_delta(text: str) -> None:
+            chunks.append(text)
+
+        await llm.generate("один и тот же", call_type="summary", on_delta=on_delta)
+        assert chunks == ["ответ"]
+        assert len(pool.requests) == 1
+
+
+class TestActionStreamParser:
+    FULL = '```json\n{"type": "message", "target": "Алиса", "content": "Привет, \\"друг\\"!\\nКак ты? \\u00e9"}\n```'
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+    def test_any_chunking_gives_same_result(self, chunk_size):
+        parser = ActionStreamParser()
+        events = []
+        for i in range(0, len(self.FULL), chunk_size):
+            events += parser.feed(self.FULL[i:i + chunk_size])
+        deltas = "".join(v for kind, v in events if kind == "content_delta")
+        assert parser.target == "Алиса"
+        assert parser.content == 'Привет, "друг"!\nКак ты? é'
+        assert deltas == parser.content
+        assert [kind for kind, _ in events if kind != "content_delta"] == ["target", "content"]
+
+    def test_target_reported_before_content_finishes(self):
+        parser = ActionStreamParser()
+        events = parser.feed('{"target": "Фыр", "content": "Прив')
+        assert ("target", "Фыр") in events
+        assert ("content_delta", "Прив") in events
+        assert parser.content is None
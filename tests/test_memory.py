@@ -3,14 +3,23 @@
 Используем мок ChromaDB, чтобы не зависеть от внешнего хранилища.
 """
 
+import asyncio
+
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 
 
 @pytest.fixture
 def mock_chroma():
-    """Подменить ChromaDB.Client, чтобы тесты не трогали диск."""
-    with patch("backend.agents.memory.chromadb") as mock_module:
+    """Подменить ChromaDB.PersistentClient, чтобы тесты не трогали диск."""
+    from backend.agents.memory_buffer import MemoryWriteBuffer
+    from backend.agents.memory_store import MemoryStoreRegistry
+
+    with patch("backend.agents.memory_store.chromadb") as mock_module, \
+            patch("backend.agents.memory.memory_stores", MemoryStoreRegistry()), \
+            patch("backend.agents.memory.memory_buffer", MemoryWriteBuffer(64, 60.0)), \
+            patch("backend.agents.memory.memory_archive", AsyncMock()), \
+            patch("backend.agents.memory.memory_sync", MagicMock()):
         mock_client = MagicMock()
         mock_collection = MagicMock()
         mock_collection.count.return_value = 0
@@ -27,7 +36,10 @@ def mock_chroma():
             "ids": [],
         })
         mock_client.get_or_create_collection.return_value = mock_collection
-        mock_module.Client.return_value = mock_client
+        mock_module.PersistentClient.return_value = mock_client
+        mock_module.utils.embedding_functions.DefaultEmbeddingFunction.return_value = MagicMock(
+            side_effect=lambda texts: [[0.0] * 3 for _ in texts]
+        )
 
         yield mock_collection
 
@@ -50,7 +62,12 @@ class TestMemoryInit:
 class TestMemoryAdd:
     @pytest.mark.asyncio
     async def test_add_memory_calls_collection_add(self, memory, mock_chroma):
+        from backend.agents import memory as memory_module
+
         await memory.add_memory("Встретил Роки у реки")
+        # Запись буферизуется до сброса
+        mock_chroma.add.assert_not_called()
+        await memory_module.memory_buffer.flush()
         mock_chroma.add.assert_called_once()
         call_kwargs = mock_chroma.add.call_args
         assert call_kwargs[1]["documents"] == ["Встретил Роки у реки"]
@@ -64,12 +81,13 @@ class TestMemoryAdd:
 
 
 class TestMemorySearch:
-    def test_search_similar_returns_documents(self, memory, mock_chroma):
-        results = memory.search_similar("лес", n_results=2)
+    @pytest.mark.asyncio
+    async def test_search_similar_returns_documents(self, memory, mock_chroma):
+        results = await memory.search_similar("лес", n_results=2)
         mock_chroma.query.assert_called_once()
         assert len(results) == 2
 
-    def test_get_recent_calls_get(self, memory, mock_chroma):
+    def test_get_recent_does_not_read_collection(self, memory, mock_chroma):
         mock_chroma.get.return_value = {
             "documents": ["событие A", "событие B", "событие C"],
             "metadatas": [
@@ -79,5 +97,655 @@ class TestMemorySearch:
             ],
             "ids": ["1", "2", "3"],
         }
-        recent = memory.get_recent(2)
+        mock_chroma.get.reset_mock()
+        recent = memory.get_recent(100)
         assert isinstance(recent, list)
+        mock_chroma.get.assert_not_called()
+
+
+class TestRecentBuffer:
+    @pytest.mark.asyncio
+    async def test_recent_served_from_buffer(self, memory, mock_chroma):
+        await memory.add_memory("первое")
+        await memory.add_memory("второе")
+        mock_chroma.get.reset_mock()
+
+        assert memory.get_recent(5) == ["второе", "первое"]
+        mock_chroma.get.assert_not_called()
+
+    def test_rebuilt_from_collection_on_start(self, mock_chroma):
+        from backend.agents.memory import Memory
+
+        mock_chroma.count.return_value = 3
+        mock_chroma.get.return_value = {
+            "documents": ["B", "A", "C"],
+            "metadatas": [
+                {"timestamp": "2026-02-18T11:00:00"},
+                {"timestamp": "2026-02-18T10:00:00"},
+                {"timestamp": "2026-02-18T12:00:00"},
+            ],
+            "ids": ["2", "1", "3"],
+        }
+        memory = Memory(agent_id=7, persist_directory="./test_data/chroma")
+        assert memory.get_recent(2) == ["C", "B"]
+
+    @pytest.mark.asyncio
+    async def test_summarization_updates_buffer(self, memory, mock_chroma):
+        memory.summarization_limit = 1
+        memory._summarize_texts = AsyncMock(return_value="сводка")
+        for i in range(12):
+            memory._recent.append((f"id{i}", f"2026-02-18T10:{i:02d}:00", f"событие {i}"))
+        memory._count = 12
+        mock_chroma.get.return_value = {
+            "documents": [doc for _, _, doc in memory._recent],
+            "metadatas": [{"timestamp": ts} for _, ts, _ in memory._recent],
+            "ids": [mid for mid, _, _ in memory._recent],
+        }
+
+        await memory._check_and_summarize()
+
+        recent = memory.get_recent(20)
+        assert recent[0] == "сводка"
+        assert "событие 0" not in recent and "событие 11" in recent
+        assert len(recent) == 11
+        # Сырые воспоминания ушли в холодный архив
+        from backend.agents import memory as memory_module
+        archived = memory_module.memory_archive.archive.call_args
+        assert [item[0] for item in archived[0][1]] == ["id0", "id1"]
+
+    @pytest.mark.asyncio
+    async def test_llm_failure_keeps_memories(self, memory, mock_chroma):
+        memory.summarization_limit = 1
+        for i in range(12):
+            memory._recent.append((f"id{i}", f"2026-02-18T10:{i:02d}:00", f"событие {i}"))
+        memory._count = 12
+        mock_chroma.get.return_value = {
+            "documents": [doc for _, _, doc in memory._recent],
+            "metadatas": [{"timestamp": ts} for _, ts, _ in memory._recent],
+            "ids": [mid for mid, _, _ in memory._recent],
+        }
+
+        with patch("backend.agents.memory.LLMClient") as client:
+            client.return_value.generate = AsyncMock(side_effect=RuntimeError("клиент закрыт"))
+            assert await memory._check_and_summarize() is False
+
+        from backend.agents import memory as memory_module
+        memory_module.memory_archive.archive.assert_not_called()
+        mock_chroma.delete.assert_not_called()
+        assert memory._count == 12
+
+
+class TestWriteBuffer:
+    @staticmethod
+    def _memory(embed):
+        mem = MagicMock()
+        mem.embedding_function = embed
+        return mem
+
+    @pytest.mark.asyncio
+    async def test_one_embedding_call_for_all_agents(self):
+        from backend.agents.memory_buffer import MemoryWriteBuffer
+
+        embed = MagicMock(side_effect=lambda texts: [[float(len(t))] for t in texts])
+        first, second = self._memory(embed), self._memory(embed)
+        buffer = MemoryWriteBuffer(flush_size=64, flush_interval=60.0)
+        buffer.enqueue(first, "1", "a", {})
+        buffer.enqueue(second, "2", "bb", {})
+        buffer.enqueue(first, "3", "ccc", {})
+
+        await buffer.flush()
+
+        embed.assert_called_once_with(["a", "bb", "ccc"])
+        first.collection.add.assert_called_once()
+        assert first.collection.add.call_args[1]["ids"] == ["1", "3"]
+        assert first.collection.add.call_args[1]["embeddings"] == [[1.0], [3.0]]
+        assert second.collection.add.call_args[1]["documents"] == ["bb"]
+        assert buffer.stats()["max_batch"] == 3
+
+    @pytest.mark.asyncio
+    async def test_flush_on_size_threshold(self):
+        from backend.agents.memory_buffer import MemoryWriteBuffer
+
+        mem = self._memory(MagicMock(side_effect=lambda texts: [[0.0]] * len(texts)))
+        buffer = MemoryWriteBuffer(flush_size=2, flush_interval=60.0)
+        buffer.enqueue(mem, "1", "a", {})
+        buffer.enqueue(mem, "2", "b", {})
+        assert buffer.pending == 0
+
+        await buffer.flush()
+        assert mem.collection.add.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_requeues(self):
+        from backend.agents.memory_buffer import MemoryWriteBuffer
+
+        mem = self._memory(MagicMock(side_effect=RuntimeError("onnx")))
+        buffer = MemoryWriteBuffer(flush_size=64, flush_interval=60.0)
+        buffer.enqueue(mem, "1", "a", {})
+
+        assert await buffer.flush() is False
+        assert buffer.pending == 1
+        assert buffer.stats()["failed_flushes"] == 1
+
+    @pytest.mark.asyncio
+    async def test_retries_only_failed_collection_then_drops(self):
+        from backend.agents.memory_buffer import MemoryWriteBuffer
+
+        embed = MagicMock(side_effect=lambda texts: [[0.0]] * len(texts))
+        ok, broken = self._memory(embed), self._memory(embed)
+        broken.collection.add.side_effect = RuntimeError("диск")
+        buffer = MemoryWriteBuffer(flush_size=64, flush_interval=0.01)
+        buffer.enqueue(ok, "1", "a", {})
+        buffer.enqueue(broken, "2", "b", {})
+
+        assert await buffer.flush() is False
+        assert buffer.pending == 1
+        # Повтор по таймеру, без новых записей; удачная коллекция не пишется снова
+        await asyncio.sleep(0.05)
+        await buffer.flush()
+        assert ok.collection.add.call_count == 1
+        assert broken.collection.add.call_count == 3
+        assert buffer.pending == 0
+        assert buffer.stats()["dropped"] == 1
+        assert await buffer.flush() is True
+
+    @pytest.mark.asyncio
+    async def test_search_sees_buffered_writes(self, memory, mock_chroma):
+        await memory.add_memory("нашёл грибы")
+        await memory.search_similar("грибы")
+        # add ушёл в коллекцию раньше запроса
+        names = [c[0] for c in mock_chroma.method_calls if c[0] in ("add", "query")]
+        assert names == ["add", "query"]
+
+
+class TestSummarizer:
+    @staticmethod
+    def _memory(name, calls, delay=0.0):
+        mem = MagicMock()
+        mem.collection_name = name
+        mem._count = 100
+        mem.summarization_limit = 50
+        mem.last_summary_tokens = 300
+
+        async def summarize():
+            calls.append(name)
+            await asyncio.sleep(delay)
+            mem._count = 11
+            return True
+
+        mem._check_and_summarize = summarize
+        return mem
+
+    @pytest.mark.asyncio
+    async def test_single_flight_with_debounce(self):
+        from backend.agents.summarizer import SummarizationScheduler
+
+        calls = []
+        scheduler = SummarizationScheduler(max_concurrency=2, debounce=0.02)
+        mem = self._memory("agent_1", calls)
+        for _ in range(5):
+            scheduler.request(mem)
+        await asyncio.sleep(0.1)
+
+        assert calls == ["agent_1"]
+        stats = scheduler.stats()
+        assert (stats["requested"], stats["coalesced"], stats["runs"]) == (5, 4, 1)
+        assert stats["tokens_spent"] == 300
+        assert stats["lag_max_seconds"] >= 0.02
+
+    @pytest.mark.asyncio
+    async def test_global_concurrency_cap(self):
+        from backend.agents.summarizer import SummarizationScheduler
+
+        calls = []
+        scheduler = SummarizationScheduler(max_concurrency=1, debounce=0.0)
+        for i in range(3):
+            scheduler.request(self._memory(f"agent_{i}", calls, delay=0.05))
+        await asyncio.sleep(0.03)
+        assert scheduler.stats()["running"] == 1
+
+        await asyncio.sleep(0.2)
+        assert sorted(calls) == ["agent_0", "agent_1", "agent_2"]
+
+    @pytest.mark.asyncio
+    async def test_under_limit_not_scheduled(self):
+        from backend.agents.summarizer import SummarizationScheduler
+
+        scheduler = SummarizationScheduler(max_concurrency=1, debounce=0.0)
+        mem = self._memory("agent_1", [])
+        mem._count = 10
+        scheduler.request(mem)
+        assert scheduler.stats()["requested"] == 0
+
+
+class TestMemoryService:
+    @pytest.mark.asyncio
+    async def test_runs_off_event_loop(self):
+        """Операция выполняется в потоке пула, loop продолжает работать."""
+        import threading
+        import time
+        from backend.agents.memory_service import MemoryService
+
+        service = MemoryService(workers=1, queue_size=4)
+        loop_thread = threading.get_ident()
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+
+        def blocking():
+            time.sleep(0.1)
+            return threading.get_ident()
+
+        worker_thread = await service.run("add", blocking)
+        task.cancel()
+        service.shutdown()
+
+        assert worker_thread != loop_thread
+        assert ticks >= 5
+        assert service.stats()["ops"]["add"]["count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_queue_is_bounded(self):
+        import threading
+        from backend.agents.memory_service import MemoryService
+
+        service = MemoryService(workers=1, queue_size=2)
+        release = threading.Event()
+        tasks = [asyncio.create_task(service.run("add", release.wait)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+
+        stats = service.stats()
+        assert stats["queue_depth"] == 5
+        assert stats["in_flight"] == 2
+
+        release.set()
+        await asyncio.gather(*tasks)
+        service.shutdown()
+        assert service.stats()["queue_depth"] == 0
+
+    @pytest.mark.asyncio
+    async def test_errors_counted(self):
+        from backend.agents.memory_service import MemoryService
+
+        service = MemoryService(workers=1, queue_size=2)
+
+        def boom():
+            raise ValueError("chroma")
+
+        with pytest.raises(ValueError):
+            await service.run("query", boom)
+        service.shutdown()
+        assert service.stats()["ops"]["query"]["errors"] == 1
+
+
+class TestMemoryStoreRegistry:
+    def test_one_client_for_all_agents(self):
+        """Один PersistentClient на директорию, коллекции кэшируются."""
+        from backend.agents.memory_store import MemoryStoreRegistry
+
+        with patch("backend.agents.memory_store.chromadb") as mock_module:
+            registry = MemoryStoreRegistry()
+            first = registry.get_collection(1, "./test_data/chroma")
+            registry.get_collection(2, "./test_data/chroma")
+            again = registry.get_collection(1, "./test_data/chroma")
+
+            assert mock_module.PersistentClient.call_count == 1
+            assert again is first
+            stats = registry.stats()
+            assert (stats["clients"], stats["collections"]) == (1, 2)
+
+    def test_close_releases_clients(self):
+        from backend.agents.memory_store import MemoryStoreRegistry
+
+        with patch("backend.agents.memory_store.chromadb") as mock_module:
+            registry = MemoryStoreRegistry()
+            registry.get_collection(1, "./test_data/chroma")
+            client = mock_module.PersistentClient.return_value
+
+            registry.close()
+
+            client.clear_system_cache.assert_called_once()
+            client._system.stop.assert_not_called()
+            stats = registry.stats()
+            assert (stats["clients"], stats["collections"]) == (0, 0)
+
+
+def _fake_embed(texts):
+    """Детерминированные эмбеддинги без модели: по буквам «а», «б», «в»."""
+    return [[t.count("а") + 0.1, t.count("б"), t.count("в")] for t in texts]
+
+
+@pytest.fixture
+async def session_factory():
+    """Фабрика сессий SQLite в памяти с одним агентом (id=1)."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from backend.db.models import AgentModel, Base
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as session:
+        session.add(AgentModel(id=1, name="Алиса"))
+        await session.commit()
+    yield factory
+    await engine.dispose()
+
+
+@pytest.fixture
+def archive_db(session_factory):
+    from backend.agents.memory_archive import MemoryArchive
+    return MemoryArchive(session_factory=session_factory)
+
+
+class TestMemoryArchive:
+    @staticmethod
+    def _items(n):
+        return [
+            (f"m{i}", f"событие {i} " * 20, {"timestamp": f"2026-02-18T10:{i:02d}:00", "type": "episodic"})
+            for i in range(n)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_archive_and_lookup(self, archive_db):
+        from datetime import datetime
+
+        await archive_db.archive(1, self._items(5), summary_id="s1")
+
+        found = await archive_db.lookup(
+            1, since=datetime(2026, 2, 18, 10, 1), until=datetime(2026, 2, 18, 10, 4)
+        )
+        assert [m["memory_id"] for m in found] == ["m3", "m2", "m1"]
+        assert found[0]["content"].startswith("событие 3")
+        assert found[0]["summary_id"] == "s1"
+        assert await archive_db.count(1) == 5
+        assert archive_db.stats()["compression_ratio"] < 0.5
+
+    @pytest.mark.asyncio
+    async def test_archive_same_ids_twice(self, archive_db):
+        # Суммаризация упала после архивации — повтор берёт те же воспоминания
+        await archive_db.archive(1, self._items(3), summary_id="s1")
+        await archive_db.archive(1, self._items(4), summary_id="s2")
+        found = await archive_db.lookup(1)
+        assert [m["memory_id"] for m in found] == ["m3", "m2", "m1", "m0"]
+        assert {m["summary_id"] for m in found} == {"s2"}
+
+    @pytest.mark.asyncio
+    async def test_cold_tier_limit(self, archive_db):
+        from backend.config import settings
+
+        with patch.object(settings, "memory_archive_max_per_agent", 3):
+            await archive_db.archive(1, self._items(5))
+        found = await archive_db.lookup(1)
+        assert [m["memory_id"] for m in found] == ["m4", "m3", "m2"]
+        assert archive_db.stats()["pruned"] == 2
+
+
+class TestMemorySync:
+    @staticmethod
+    async def _rows(factory):
+        from sqlalchemy import select
+        from backend.db.models import MemoryModel
+
+        async with factory() as session:
+            result = await session.execute(select(MemoryModel).order_by(MemoryModel.timestamp))
+            return [(m.uid, m.content, m.is_key) for m in result.scalars().all()]
+
+    @pytest.mark.asyncio
+    async def test_adds_and_summary_in_one_batch(self, session_factory):
+        from backend.agents.memory_sync import MemorySyncQueue
+
+        sync = MemorySyncQueue(batch_size=100, interval=60.0, session_factory=session_factory)
+        sync.record_add(1, "a", "гулял", "2026-02-18T10:00:00")
+        sync.record_add(1, "b", "ел ягоды", "2026-02-18T10:01:00")
+        sync.record_summary(1, "s", "день прошёл", "2026-02-18T10:02:00", ["a"])
+        await sync.flush()
+
+        assert await self._rows(session_factory) == [
+            ("b", "ел ягоды", False),
+            ("s", "день прошёл", True),
+        ]
+        assert sync.stats()["batches"] == 1
+
+    @pytest.mark.asyncio
+    async def test_replayed_batch_is_idempotent(self, session_factory):
+        from backend.agents.memory_sync import MemorySyncQueue
+
+        sync = MemorySyncQueue(batch_size=100, interval=60.0, session_factory=session_factory)
+        for _ in range(2):
+            sync.record_add(1, "a", "гулял", "2026-02-18T10:00:00")
+            await sync.flush()
+        assert len(await self._rows(session_factory)) == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_insert_not_overtaken_by_delete(self, session_factory):
+        """Удаление из следующей пачки не обгоняет неудачную вставку того же uid."""
+        import asyncio
+        from backend.agents.memory_sync import MemorySyncQueue
+
+        calls = []
+
+        def flaky_factory():
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionError("база недоступна")
+            return session_factory()
+
+        sync = MemorySyncQueue(batch_size=100, interval=0.01, session_factory=flaky_factory)
+        sync.record_add(1, "a", "гулял", "2026-02-18T10:00:00")
+        sync._start_write()
+        sync.record_summary(1, "s", "день прошёл", "2026-02-18T10:02:00", ["a"])
+        await sync.flush()
+        await asyncio.sleep(0.05)
+
+        assert await self._rows(session_factory) == [("s", "день прошёл", True)]
+        assert sync.stats()["failed_batches"] == 1
+        assert sync.stats()["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_retried_by_timer(self, session_factory):
+        """Неудачная пачка повторяется по таймеру без новых записей."""
+        import asyncio
+        from backend.agents.memory_sync import MemorySyncQueue
+
+        calls = []
+
+        def flaky_factory():
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionError("база недоступна")
+            return session_factory()
+
+        sync = MemorySyncQueue(batch_size=100, interval=0.01, session_factory=flaky_factory)
+        sync.record_add(1, "a", "гулял", "2026-02-18T10:00:00")
+        await sync.flush()
+        assert sync.stats()["pending"] == 1
+
+        await asyncio.sleep(0.05)
+        assert await self._rows(session_factory) == [("a", "гулял", False)]
+        assert sync.stats()["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_upgrade_adds_uid_to_old_schema(self):
+        from sqlalchemy import text
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from backend.db.database import _upgrade_schema
+
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE memories (id INTEGER PRIMARY KEY, agent_id INTEGER NOT NULL,"
+                " content TEXT NOT NULL, timestamp DATETIME NOT NULL,"
+                " is_key BOOLEAN NOT NULL, summary TEXT)"
+            ))
+            await _upgrade_schema(conn)
+            await _upgrade_schema(conn)  # повторный запуск безопасен
+            columns = [r[1] for r in (await conn.execute(text("PRAGMA table_info(memories)")))]
+            indexes = [r[1] for r in (await conn.execute(text("PRAGMA index_list(memories)")))]
+        await engine.dispose()
+
+        assert "uid" in columns
+        assert "ux_memories_uid" in indexes
+
+
+class TestNumpyVectorStore:
+    def test_add_query_get(self, tmp_path):
+        from backend.agents.vector_store import NumpyVectorStore
+
+        store = NumpyVectorStore(str(tmp_path), _fake_embed)
+        store.add(ids=["1", "2", "3"], documents=["ааа", "ббб", "ввв"],
+                  metadatas=[{"n": 1}, {"n": 2}, {"n": 3}])
+
+        result = store.query(query_texts=["бб"], n_results=2)
+        assert result["documents"][0][0] == "ббб"
+        assert result["distances"][0][0] < result["distances"][0][1]
+        assert store.get()["ids"] == ["1", "2", "3"]
+        assert store.count() == 3
+
+    def test_delete_and_reload(self, tmp_path):
+        from backend.agents.vector_store import NumpyVectorStore
+
+        store = NumpyVectorStore(str(tmp_path), _fake_embed)
+        store.add(ids=["1", "2"], documents=["ааа", "ббб"])
+        store.delete(ids=["1"])
+
+        reloaded = NumpyVectorStore(str(tmp_path), _fake_embed)
+        assert reloaded.get()["documents"] == ["ббб"]
+        assert reloaded.query(query_texts=["ааа"], n_results=5)["ids"] == [["2"]]
+
+    def test_compaction(self, tmp_path):
+        from backend.agents.vector_store import NumpyVectorStore
+
+        store = NumpyVectorStore(str(tmp_path), _fake_embed, compact_ratio=0.5)
+        ids = [str(i) for i in range(100)]
+        store.add(ids=ids, documents=["а" * (i % 5 + 1) for i in range(100)])
+        store.delete(ids=ids[:80])
+
+        assert store.stats() == {"rows": 20, "alive": 20}
+        assert store._vectors_path.stat().st_size == 20 * 3 * 4
+        assert not (tmp_path / "vectors.f32").exists()  # старое поколение удалено
+        assert NumpyVectorStore(str(tmp_path), _fake_embed).count() == 20
+
+    def test_add_skips_existing_ids(self, tmp_path):
+        """Повтор пачки с уже записанными id не падает и не дублирует строки."""
+        from backend.agents.vector_store import NumpyVectorStore
+
+        store = NumpyVectorStore(str(tmp_path), _fake_embed)
+        store.add(ids=["1", "2"], documents=["ааа", "ббб"])
+        store.add(ids=["2", "3"], documents=["ббб", "ввв"])
+
+        assert store.stats() == {"rows": 3, "alive": 3}
+        reloaded = NumpyVectorStore(str(tmp_path), _fake_embed)
+        assert reloaded.get()["ids"] == ["1", "2", "3"]
+        assert reloaded.query(query_texts=["ввв"], n_results=1)["ids"] == [["3"]]
+
+    def test_compaction_crash_before_switch(self, tmp_path, monkeypatch):
+        """Сбой до переключения CURRENT оставляет старое поколение целым."""
+        from backend.agents import vector_store
+        from backend.agents.vector_store import NumpyVectorStore
+
+        store = NumpyVectorStore(str(tmp_path), _fake_embed)
+        store.add(ids=["1", "2", "3"], documents=["ааа", "ббб", "ввв"])
+        store.delete(ids=["1"])
+
+        def crash(src, dst):
+            raise OSError("сбой")
+
+        monkeypatch.setattr(vector_store.os, "replace", crash)
+        with pytest.raises(OSError):
+            store.compact()
+        monkeypatch.undo()
+
+        reloaded = NumpyVectorStore(str(tmp_path), _fake_embed)
+        assert reloaded.get()["ids"] == ["2", "3"]
+        assert reloaded.query(query_texts=["ввв"], n_results=1)["ids"] == [["3"]]
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["log.jsonl", "vectors.f32"]
+
+        reloaded.compact()
+        again = NumpyVectorStore(str(tmp_path), _fake_embed)
+        assert again.get()["ids"] == ["2", "3"]
+        assert again.query(query_texts=["ббб"], n_results=1)["ids"] == [["2"]]
+
+    def test_torn_write_truncated(self, tmp_path):
+        from backend.agents.vector_store import NumpyVectorStore
+
+        store = NumpyVectorStore(str(tmp_path), _fake_embed)
+        store.add(ids=["1"], documents=["ааа"])
+        # Вектор записан, а запись журнала — нет
+        with open(tmp_path / "vectors.f32", "ab") as f:
+            f.write(b"\0" * 12)
+
+        reloaded = NumpyVectorStore(str(tmp_path), _fake_embed)
+        reloaded.add(ids=["2"], documents=["ббб"])
+        assert reloaded.query(query_texts=["ббб"], n_results=1)["ids"] == [["2"]]
+
+    @pytest.mark.asyncio
+    async def test_memory_on_numpy_backend(self, tmp_path):
+        """Memory работает поверх numpy-хранилища так же, как поверх ChromaDB."""
+        from backend.agents.memory import Memory
+        from backend.agents.memory_buffer import MemoryWriteBuffer
+        from backend.agents.memory_store import MemoryStoreRegistry
+        from backend.config import settings
+
+        registry = MemoryStoreRegistry()
+        registry._embedding_function = MagicMock(side_effect=_fake_embed)
+        with patch.object(settings, "memory_backend", "numpy"), \
+                patch("backend.agents.memory.memory_stores", registry), \
+                patch("backend.agents.memory.memory_buffer", MemoryWriteBuffer(64, 60.0)), \
+            patch("backend.agents.memory.memory_archive", AsyncMock()), \
+            patch("backend.agents.memory.memory_sync", MagicMock()):
+            memory = Memory(agent_id=1, persist_directory=str(tmp_path))
+            await memory.add_memory("ааа")
+            await memory.add_memory("ввв")
+
+            assert await memory.search_similar("вв", n_results=1) == ["ввв"]
+            assert memory.get_recent(2) == ["ввв", "ааа"]
+            assert Memory(agent_id=1, persist_directory=str(tmp_path)).get_recent(1) == ["ввв"]
+
+
+class TestEmbeddingCache:
+    @staticmethod
+    def _inner():
+        return MagicMock(side_effect=lambda texts: [[float(len(t)), 1.0] for t in texts])
+
+    def test_identical_texts_embedded_once(self):
+        from backend.agents.embedding_cache import CachedEmbeddingFunction
+
+        inner = self._inner()
+        cache = CachedEmbeddingFunction(inner, memory_items=100)
+        first = cache(["[Событие мира] гроза", "[Событие мира]  гроза ", "другое"])
+        second = cache(["[Событие мира] гроза"])
+
+        inner.assert_called_once_with(["[Событие мира] гроза", "другое"])
+        assert list(first[0]) == list(first[1]) == list(second[0])
+        stats = cache.stats()
+        assert (stats["misses"], stats["deduplicated"], stats["hits_memory"]) == (2, 1, 1)
+
+    def test_lru_bounded(self):
+        from backend.agents.embedding_cache import CachedEmbeddingFunction
+
+        cache = CachedEmbeddingFunction(self._inner(), memory_items=2)
+        cache(["a", "b", "c"])
+        assert cache.stats()["memory_items"] == 2
+
+    def test_persistent_store(self, tmp_path):
+        from backend.agents.embedding_cache import CachedEmbeddingFunction
+
+        path = str(tmp_path / "emb.db")
+        cache = CachedEmbeddingFunction(self._inner(), memory_items=10, path=path)
+        cache(["текст"])
+        cache.close()
+
+        inner = self._inner()
+        restored = CachedEmbeddingFunction(inner, memory_items=10, path=path)
+        vectors = restored(["текст"])
+        restored.close()
+
+        inner.assert_not_called()
+        assert list(vectors[0]) == [5.0, 1.0]
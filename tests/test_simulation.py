@@ -1,10 +1,15 @@
 """
-Тесты симуляции — world.py (управление скоростью, загрузка агентов).
+Тесты симуляции — world.py (управление скоростью, загрузка агентов, тики).
 """
 
+import asyncio
+import json
+import time
+
 import pytest
 from unittest.mock import patch, AsyncMock, MagicMock
 
+from backend.simulation import world
 from backend.simulation.world import set_speed, get_speed, is_running
 
 
@@ -29,3 +34,233 @@ class TestSpeed:
 
     def test_initial_not_running(self):
         assert is_running() is False
+
+
+# ── Тик: последовательный и параллельный режимы ──────────────────────
+
+
+def _fake_agent(agent_id: int, name: str, target: str, delay: float = 0.05):
+    agent = MagicMock()
+    agent.id = agent_id
+    agent.name = name
+
+    async def act(other_names, agent_id_map=None, on_delta=None):
+        await asyncio.sleep(delay)
+        action = {"type": "message", "target": target, "content": f"привет от {name}"}
+        if on_delta is not None:
+            raw = json.dumps(action, ensure_ascii=False)
+            for i in range(0, len(raw), 5):
+                await on_delta(raw[i:i + 5])
+        return action
+
+    agent.act = act
+    agent.perceive = AsyncMock()
+    return agent
+
+
+@pytest.fixture
+def fake_world(monkeypatch):
+    agents = {
+        1: _fake_agent(1, "Мо", "Роки", delay=0.08),
+        2: _fake_agent(2, "Роки", "Фыр", delay=0.01),
+        3: _fake_agent(3, "Фыр", "Мо", delay=0.04),
+    }
+    delivered: list[tuple[int, int]] = []
+
+    async def fake_deliver(from_id, to_id, content, relation_delta=0, stream_id=None):
+        delivered.append((from_id, to_id))
+        return {}
+
+    monkeypatch.setattr(world, "_agents_runtime", agents)
+    monkeypatch.setattr(world, "deliver_message", fake_deliver)
+    monkeypatch.setattr(world, "record_event", AsyncMock())
+    monkeypatch.setattr(world, "_sync_mood_to_db", AsyncMock())
+    return agents, delivered
+
+
+class TestTick:
+    def test_unknown_mode_rejected(self):
+        from pydantic import ValidationError
+        from backend.config import Settings
+
+        with pytest.raises(ValidationError):
+            Settings(simulation_tick_mode="sequental")
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("mode", ["sequential", "concurrent"])
+    async def test_actions_applied_in_id_order(self, fake_world, monkeypatch, mode):
+        agents, delivered = fake_world
+        monkeypatch.setattr(world.settings, "simulation_tick_mode", mode)
+        await world._tick()
+        assert delivered == [(1, 2), (2, 3), (3, 1)]
+        agents[2].perceive.assert_awaited_once()
+        assert world.get_tick_stats()["mode"] == mode
+
+    @pytest.mark.asyncio
+    async def test_concurrent_faster_than_sequential(self, fake_world, monkeypatch):
+        monkeypatch.setattr(world.settings, "simulation_tick_mode", "sequential")
+        start = time.perf_counter()
+        await world._tick()
+        sequential = time.perf_counter() - start
+
+        monkeypatch.setattr(world.settings, "simulation_tick_mode", "concurrent")
+        monkeypatch.setattr(world.settings, "simulation_max_concurrency", 8)
+        start = time.perf_counter()
+        await world._tick()
+        concurrent = time.perf_counter() - start
+
+        assert concurrent < sequential
+
+    @pytest.mark.asyncio
+    async def test_failed_decision_skips_agent(self, fake_world, monkeypatch):
+        agents, delivered = fake_world
+        agents[2].act = AsyncMock(side_effect=RuntimeError("LLM недоступен"))
+        monkeypatch.setattr(world.settings, "simulation_tick_mode", "concurrent")
+        await world._tick()
+        assert delivered == [(1, 2), (3, 1)]
+
+    @pytest.mark.asyncio
+    async def test_batched_decisions_fall_back_individually(self, fake_world, monkeypatch):
+        agents, delivered = fake_world
+        batches: list[list[str]] = []
+        batch_answers = {
+            "Мо": {"type": "message", "target": "Фыр", "content": "из пакета"},
+            "Фыр": {"type": "message", "target": "Роки", "content": "из пакета"},
+        }
+
+        async def fake_batch(requests):
+            batches.append([agent.name for agent, _ in requests])
+            # Ответ для Роки «не распознан» — он решает индивидуально
+            return [batch_answers.get(agent.name) for agent, _ in requests]
+
+        monkeypatch.setattr(world, "decide_actions_batch", fake_batch)
+        monkeypatch.setattr(world.settings, "simulation_tick_mode", "concurrent")
+        monkeypatch.setattr(world.settings, "simulation_batch_size", 2)
+        await world._tick()
+
+        assert batches == [["Мо", "Роки"], ["Фыр"]]
+        assert delivered == [(1, 3), (2, 3), (3, 2)]
+
+    @pytest.mark.asyncio
+    async def test_streaming_publishes_partials_and_tags_final_event(self, monkeypatch):
+        agents = {1: _fake_agent(1, "Мо", "Роки", delay=0), 2: _fake_agent(2, "Роки", "Мо", delay=0)}
+        broadcasts: list[dict] = []
+        delivered: list[dict] = []
+
+        async def fake_broadcast(message):
+            broadcasts.append(message)
+
+        async def fake_deliver(from_id, to_id, content, relation_delta=0, stream_id=None):
+            delivered.append({"from": from_id, "stream_id": stream_id})
+            return {}
+
+        monkeypatch.setattr(world, "_agents_runtime", agents)
+        monkeypatch.setattr(world, "deliver_message", fake_deliver)
+        monkeypatch.setattr(world, "record_event", AsyncMock())
+        monkeypatch.setattr(world, "_sync_mood_to_db", AsyncMock())
+        monkeypatch.setattr(world.manager, "broadcast", fake_broadcast)
+        monkeypatch.setattr(world.settings, "llm_streaming", True)
+        monkeypatch.setattr(world.settings, "simulation_tick_mode", "concurrent")
+        await world._tick()
+
+        frames = [b["data"] for b in broadcasts if b["type"] == "message_stream"]
+        mo_frames = [f for f in frames if f["agent_id"] == 1]
+        assert "".join(f["delta"] for f in mo_frames) == "привет от Мо"
+        assert mo_frames[-1]["done"] is True
+        assert mo_frames[-1]["target_name"] == "Роки"
+        # Итоговое сообщение доставлено ровно один раз, с тем же stream_id
+        assert [d["from"] for d in delivered] == [1, 2]
+        assert delivered[0]["stream_id"] == mo_frames[0]["stream_id"]
+
+
+# ── Единица работы тика ──────────────────────────────────────────────
+
+
+@pytest.fixture
+async def world_db(monkeypatch):
+    """SQLite в памяти с двумя агентами, справочником агентов и счётчиком коммитов."""
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from backend.db.database import WorldSession
+    from backend.db.directory import agent_directory
+    from backend.db.models import AgentModel, Base
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, sync_session_class=WorldSession, expire_on_commit=False)
+    monkeypatch.setattr(agent_directory, "_agents", {})
+    async with factory() as session:
+        session.add_all([AgentModel(id=1, name="Мо"), AgentModel(id=2, name="Роки")])
+        await session.commit()
+
+    commits = []
+    event.listen(engine.sync_engine, "commit", lambda conn: commits.append(1))
+    yield factory, commits
+    await engine.dispose()
+
+
+class TestTickUnitOfWork:
+    @pytest.mark.asyncio
+    async def test_tick_writes_in_one_commit_then_broadcasts(self, world_db, monkeypatch):
+        from sqlalchemy import func, select
+        from backend.db.models import AgentModel, EventModel, MessageModel, RelationshipModel
+        from backend.simulation import events, messaging, unit_of_work
+
+        factory, commits = world_db
+        broadcasts: list[dict] = []
+
+        async def fake_broadcast(message):
+            broadcasts.append(message)
+
+        monkeypatch.setattr(unit_of_work.manager, "broadcast", fake_broadcast)
+        async with unit_of_work.tick_unit_of_work(factory) as uow:
+            first = await messaging.deliver_message(1, 2, "привет", relation_delta=60)
+            await events.record_event(
+                "Мо обиделся", actor_id=1, target_id=2, mood_after="злой",
+                relation_type="напряжение", relation_delta=-30,
+            )
+            uow.update_agent(2, mood="счастлив", mood_value=40)
+            # До конца тика — ни записи, ни рассылки
+            assert first["id"] is None
+            assert broadcasts == []
+
+        assert len(commits) == 1
+        assert first["id"] is not None and first["created_at"]
+        assert first["content"] == "Мо → Роки: привет"
+        # После событий — изменившееся ребро с отображаемой силой по новым настроениям
+        assert [b["type"] for b in broadcasts] == ["event", "event", "relation_update"]
+        edge = broadcasts[-1]["data"]
+        assert (edge["agent_from_id"], edge["strength"], edge["display_strength"]) == (1, 20, 23)
+
+        async with factory() as session:
+            assert (await session.execute(select(func.count(EventModel.id)))).scalar() == 2
+            assert (await session.execute(select(func.count(MessageModel.id)))).scalar() == 1
+            rel = (await session.execute(select(RelationshipModel))).scalar_one()
+            # Дельта без типа связи отношение не создаёт — как при отдельных record_event
+            assert (rel.relation_type, rel.strength) == ("напряжение", 20)
+            assert (await session.get(AgentModel, 1)).mood == "злой"
+            assert (await session.get(AgentModel, 2)).mood_value == 40
+
+    @pytest.mark.asyncio
+    async def test_failed_tick_discards_changes(self, world_db, monkeypatch):
+        from backend.simulation import events, unit_of_work
+
+        factory, commits = world_db
+        broadcast = AsyncMock()
+        monkeypatch.setattr(unit_of_work.manager, "broadcast", broadcast)
+        with pytest.raises(RuntimeError):
+            async with unit_of_work.tick_unit_of_work(factory):
+                await events.record_event("потеряно", actor_id=1)
+                raise RuntimeError("сбой тика")
+        assert commits == []
+        broadcast.assert_not_awaited()
+        assert unit_of_work.current_unit_of_work() is None
+
+    @pytest.mark.asyncio
+    async def test_tick_stats_report_writes(self, fake_world, monkeypatch):
+        monkeypatch.setattr(world, "_sync_mood_to_db", AsyncMock())
+        await world._tick()
+        assert world.get_tick_stats()["db_writes"] == {
+            "messages": 0, "events": 0, "relations": 0, "agents": 0,
+        }
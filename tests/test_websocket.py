@@ -0,0 +1,391 @@
+"""
+Тесты WebSocket-рассылки — websocket.py (очереди клиентов, политики, ping/pong,
+подписки, tick_batch, докачка по seq).
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from backend.api.websocket import ConnectionManager
+
+
+class FakeWebSocket:
+    """Сокет, отправка в который ждёт разрешения (медленный клиент)."""
+
+    def __init__(self, blocked: bool = False) -> None:
+        self.sent: list[dict] = []
+        self.closed_with: int | None = None
+        self.gate = asyncio.Event()
+        if not blocked:
+            self.gate.set()
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, payload: str) -> None:
+        await self.gate.wait()
+        self.sent.append(json.loads(payload))
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed_with = code
+
+
+def _mood(agent_id: int, value: int) -> dict:
+    return {"type": "mood_update", "data": {"agent_id": agent_id, "mood": "злой", "mood_value": value}}
+
+
+async def _drain() -> None:
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+async def make_manager():
+    managers: list[ConnectionManager] = []
+
+    def factory(**kwargs) -> ConnectionManager:
+        kwargs.setdefault("ping_interval", 60.0)
+        managers.append(ConnectionManager(**kwargs))
+        return managers[-1]
+
+    yield factory
+    for m in managers:
+        await m.aclose()
+
+
+class TestFanOut:
+    async def test_slow_client_does_not_block_broadcast(self, make_manager):
+        manager = make_manager(queue_size=10)
+        slow, fast = FakeWebSocket(blocked=True), FakeWebSocket()
+        await manager.connect(slow)
+        await manager.connect(fast)
+
+        started = time.perf_counter()
+        for i in range(5):
+            await manager.broadcast({"type": "event", "data": {"id": i}})
+        assert time.perf_counter() - started < 0.05
+
+        await _drain()
+        assert [m["data"]["id"] for m in fast.sent[1:]] == [0, 1, 2, 3, 4]
+        assert slow.sent == []
+        slow.gate.set()
+        await _drain()
+        assert len(_received(slow)) == 5
+        assert manager.stats()["latency_ms"]["max"] > 0
+
+    async def test_drop_oldest(self, make_manager):
+        manager = make_manager(queue_size=3, policy="drop_oldest")
+        ws = FakeWebSocket(blocked=True)
+        await manager.connect(ws)
+        await _drain()  # hello застрял в сокете
+        for i in range(6):
+            await manager.broadcast({"type": "event", "data": {"id": i}})
+        # В очереди остались три последних
+        ws.gate.set()
+        await _drain()
+        assert [m["data"]["id"] for m in ws.sent[1:]] == [3, 4, 5]
+        assert manager.stats()["dropped"] == 3
+
+    async def test_coalesce_replaces_stale_mood(self, make_manager):
+        manager = make_manager(queue_size=10, policy="coalesce")
+        ws = FakeWebSocket(blocked=True)
+        await manager.connect(ws)
+        await _drain()  # hello застрял в сокете
+        await manager.broadcast(_mood(1, 10))
+        await manager.broadcast(_mood(2, 5))
+        await manager.broadcast(_mood(1, 20))
+        ws.gate.set()
+        await _drain()
+        moods = [(m["data"]["agent_id"], m["data"]["mood_value"]) for m in ws.sent[1:]]
+        assert moods == [(2, 5), (1, 20)]
+        assert manager.stats()["coalesced"] == 1
+
+    async def test_coalesce_keeps_seq_order(self, make_manager):
+        manager = make_manager(queue_size=10, policy="coalesce")
+        ws = FakeWebSocket(blocked=True)
+        await manager.connect(ws)
+        await _drain()  # hello застрял в сокете
+        await manager.broadcast(_mood(1, 10))
+        await manager.broadcast({"type": "event", "data": {"id": 1}})
+        await manager.broadcast(_mood(1, 20))
+        ws.gate.set()
+        await _drain()
+        # Докачка по last_seq = максимуму полученного не должна терять событие 2
+        assert _seqs(ws) == [2, 3]
+
+    async def test_disconnect_policy(self, make_manager):
+        manager = make_manager(queue_size=2, policy="disconnect")
+        ws = FakeWebSocket(blocked=True)
+        await manager.connect(ws)
+        await _drain()
+        for i in range(4):
+            await manager.broadcast({"type": "event", "data": {"id": i}})
+        await _drain()
+        assert manager.active_count == 0
+        assert ws.closed_with == 1013
+        assert manager.stats()["slow_disconnects"] == 1
+
+
+class TestPingPong:
+    async def test_ping_and_rtt(self, make_manager):
+        manager = make_manager(ping_interval=0.01, idle_timeout=5.0)
+        ws = FakeWebSocket()
+        client = await manager.connect(ws)
+        await asyncio.sleep(0.03)
+        ping = next(m for m in ws.sent if m["type"] == "ping")
+        client.on_pong(ping["data"])
+        assert client.rtt_ms is not None and client.rtt_ms >= 0
+        assert manager.stats()["ping_rtt_ms"] is not None
+
+    async def test_idle_client_disconnected(self, make_manager):
+        manager = make_manager(ping_interval=0.01, idle_timeout=0.02)
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        await asyncio.sleep(0.08)
+        await _drain()
+        assert manager.active_count == 0
+        assert ws.closed_with == 1001
+        assert manager.stats()["idle_disconnects"] == 1
+
+
+def _received(ws: FakeWebSocket) -> list[tuple]:
+    """(тип, агент) доставленных сообщений, без служебных."""
+    return [
+        (m["type"], m["data"].get("agent_id", m["data"].get("actor_id")))
+        for m in ws.sent if m["type"] not in ("hello", "subscribed", "ping")
+    ]
+
+
+class TestSubscriptions:
+    async def test_filter_by_type(self, make_manager):
+        manager = make_manager()
+        ws = FakeWebSocket()
+        client = await manager.connect(ws)
+        manager.update_subscription(client, "subscribe", {"types": ["mood_update"]})
+        await manager.broadcast({"type": "event", "data": {"id": 1, "actor_id": 1}})
+        await manager.broadcast(_mood(1, 10))
+        await _drain()
+        assert ws.sent[1] == {
+            "type": "subscribed",
+            "data": {"types": ["mood_update"], "agent_ids": None, "focus": None, "batch": False},
+        }
+        assert _received(ws) == [("mood_update", 1)]
+
+    async def test_filter_by_agents_and_focus(self, make_manager):
+        manager = make_manager()
+        ws, everyone = FakeWebSocket(), FakeWebSocket()
+        client = await manager.connect(ws)
+        await manager.connect(everyone)
+        manager.update_subscription(client, "subscribe", {"agent_ids": [1], "focus": 3})
+        for agent_id in (1, 2, 3):
+            await manager.broadcast(_mood(agent_id, 0))
+        # Событие от пользователя — без агента-актора, но с целью 2
+        await manager.broadcast({"type": "event", "data": {"id": 9, "actor_id": None, "target_id": 2}})
+        # Событие мира без агентов — всем
+        await manager.broadcast({"type": "event", "data": {"id": 10}})
+        await _drain()
+        assert _received(ws) == [("mood_update", 1), ("mood_update", 3), ("event", None)]
+        assert len(_received(everyone)) == 5
+        assert manager.stats()["skipped"] == 2
+
+    async def test_unsubscribe(self, make_manager):
+        manager = make_manager()
+        ws = FakeWebSocket()
+        client = await manager.connect(ws)
+        manager.update_subscription(client, "unsubscribe", {"types": ["mood_update", "message_stream"]})
+        assert client.subscription.as_dict()["types"] == ["event", "relation_update"]
+        manager.update_subscription(client, "subscribe", {"agent_ids": [1, 2], "focus": 5})
+        manager.update_subscription(client, "unsubscribe", {"agent_ids": [2], "focus": True})
+        assert client.subscription.as_dict() == {
+            "types": ["event", "relation_update"], "agent_ids": [1], "focus": None, "batch": False,
+        }
+        await manager.broadcast({"type": "event", "data": {"actor_id": 2}})
+        await manager.broadcast({"type": "event", "data": {"actor_id": 1}})
+        await _drain()
+        assert _received(ws) == [("event", 1)]
+
+    async def test_no_serialization_without_recipients(self, make_manager, monkeypatch):
+        from backend.api import websocket
+
+        manager = make_manager()
+        client = await manager.connect(FakeWebSocket())
+        manager.update_subscription(client, "subscribe", {"types": ["event"]})
+        dumps = []
+        monkeypatch.setattr(websocket.json, "dumps", lambda *a, **kw: dumps.append(1) or "{}")
+        for agent_id in range(10):
+            await manager.broadcast(_mood(agent_id, 0))
+        assert dumps == []
+
+
+class TestTickBatch:
+    async def test_batch_clients_get_one_collapsed_frame(self, make_manager, monkeypatch):
+        from backend.api import websocket
+
+        manager = make_manager(batch_window=60.0)
+        batched, other, plain = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        for ws in (batched, other):
+            client = await manager.connect(ws)
+            manager.update_subscription(client, "subscribe", {"batch": True})
+        await manager.connect(plain)
+        await _drain()
+
+        await manager.broadcast({"type": "event", "data": {"id": 1, "actor_id": 1}})
+        await manager.broadcast(_mood(1, 10))
+        await manager.broadcast(_mood(2, 5))
+        await manager.broadcast(_mood(1, 20))
+        await _drain()
+        assert _received(batched) == []
+        assert len(_received(plain)) == 4
+
+        real_dumps = json.dumps
+        frames = []
+        monkeypatch.setattr(
+            websocket.json, "dumps", lambda obj, **kw: frames.append(obj) or real_dumps(obj, **kw)
+        )
+        manager.flush_batch()
+        monkeypatch.undo()
+        await _drain()
+
+        # Одна сериализация на обоих клиентов с одинаковым фильтром
+        assert len(frames) == 1
+        for ws in (batched, other):
+            frame = [m for m in ws.sent if m["type"] == "tick_batch"]
+            assert len(frame) == 1
+            moods = [(m["type"], m["data"].get("mood_value")) for m in frame[0]["data"]["messages"]]
+            assert moods == [("event", None), ("mood_update", 5), ("mood_update", 20)]
+        assert manager.stats()["collapsed"] == 1
+
+    async def test_relation_updates_collapse_per_edge(self, make_manager):
+        manager = make_manager(batch_window=60.0)
+        ws = FakeWebSocket()
+        client = await manager.connect(ws)
+        manager.update_subscription(client, "subscribe", {"batch": True})
+        edge = {"id": 1, "agent_from_id": 1, "agent_to_id": 2}
+        await manager.broadcast({"type": "relation_update", "data": {**edge, "strength": 40}})
+        await manager.broadcast(
+            {"type": "relation_update", "data": {"agent_from_id": 1, "agent_to_id": 2, "affinity": 3}}
+        )
+        await manager.broadcast({"type": "relation_update", "data": {**edge, "strength": 45}})
+        manager.flush_batch()
+        await _drain()
+        frame = next(m for m in ws.sent if m["type"] == "tick_batch")
+        # Симпатия не заменяет ребро целиком
+        assert [m["data"].get("strength", "affinity") for m in frame["data"]["messages"]] == ["affinity", 45]
+
+    async def test_window_flushes_without_tick(self, make_manager):
+        manager = make_manager(batch_window=0.01)
+        ws = FakeWebSocket()
+        client = await manager.connect(ws)
+        manager.update_subscription(client, "subscribe", {"batch": True, "types": ["mood_update"]})
+        await manager.broadcast(_mood(1, 1))
+        await manager.broadcast({"type": "event", "data": {"id": 1}})
+        await asyncio.sleep(0.03)
+        await _drain()
+        frame = next(m for m in ws.sent if m["type"] == "tick_batch")
+        assert [m["type"] for m in frame["data"]["messages"]] == ["mood_update"]
+
+
+def _seqs(ws: FakeWebSocket) -> list[int]:
+    return [m["seq"] for m in ws.sent if "seq" in m]
+
+
+class TestReplay:
+    async def test_seq_and_hello(self, make_manager):
+        manager = make_manager()
+        await manager.broadcast({"type": "event", "data": {"id": 1}})
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        await manager.broadcast({"type": "event", "data": {"id": 2}})
+        await _drain()
+        assert ws.sent[0] == {"type": "hello", "data": {"epoch": manager.epoch, "seq": 1}}
+        assert _seqs(ws) == [2]
+
+    async def test_resume_sends_only_missing(self, make_manager):
+        manager = make_manager(replay_size=10)
+        for i in range(5):
+            await manager.broadcast({"type": "event", "data": {"id": i}})
+        ws = FakeWebSocket()
+        await manager.connect(ws, last_seq=3, epoch=manager.epoch)
+        await manager.broadcast({"type": "event", "data": {"id": 5}})
+        await _drain()
+        # Пропущенное — одной рамкой (клиент ещё не прислал подписку), затем живые сообщения
+        assert [m["type"] for m in ws.sent] == ["hello", "tick_batch", "event"]
+        frame = ws.sent[1]
+        assert frame["seq"] == 5
+        assert [m["seq"] for m in frame["data"]["messages"]] == [4, 5]
+        assert _seqs(ws) == [5, 6]
+        assert manager.stats()["replayed"] == 2
+
+    async def test_resync_when_evicted_or_new_epoch(self, make_manager):
+        manager = make_manager(replay_size=3)
+        for i in range(6):
+            await manager.broadcast({"type": "event", "data": {"id": i}})
+        evicted, restarted, current = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(evicted, last_seq=2, epoch=manager.epoch)
+        await manager.connect(restarted, last_seq=5, epoch="other")
+        await manager.connect(current, last_seq=6, epoch=manager.epoch)
+        await _drain()
+        for ws in (evicted, restarted):
+            assert ws.sent[1] == {"type": "resync_required", "data": {"epoch": manager.epoch, "seq": 6}}
+            assert _seqs(ws) == []
+        assert [m["type"] for m in current.sent] == ["hello"]
+        assert manager.stats()["resyncs"] == 2
+
+    async def test_stream_frames_not_replayed(self, make_manager):
+        """Фрагменты message_stream идут без seq и не занимают буфер докачки."""
+        manager = make_manager(replay_size=3)
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        await manager.broadcast({"type": "event", "data": {"id": 1}})
+
+        def chunk(delta: str, done: bool = False) -> dict:
+            return {"type": "message_stream",
+                    "data": {"stream_id": "s1", "agent_id": 1, "delta": delta, "done": done}}
+
+        await manager.broadcast(chunk("При"))
+        await _drain()
+        assert [m.get("seq") for m in ws.sent[1:]] == [1, None]
+
+        # Клиент отключился посреди генерации; фрагментов больше, чем вмещает буфер
+        for delta in ("вет", ", ", "как ", "дела?"):
+            await manager.broadcast(chunk(delta))
+        await manager.broadcast(chunk("", done=True))
+        await manager.broadcast({"type": "event", "data": {"id": 2, "stream_id": "s1"}})
+
+        resumed = FakeWebSocket()
+        await manager.connect(resumed, last_seq=1, epoch=manager.epoch)
+        await _drain()
+        assert [m["type"] for m in resumed.sent] == ["hello", "tick_batch"]
+        frame = resumed.sent[1]
+        assert frame["seq"] == 2
+        assert frame["data"]["messages"] == [{"type": "event", "data": {"id": 2, "stream_id": "s1"}, "seq": 2}]
+        assert manager.stats()["replay_buffered"] == 2
+
+    async def test_stream_only_batch_has_no_seq(self, make_manager):
+        manager = make_manager(batch_window=60.0)
+        ws = FakeWebSocket()
+        client = await manager.connect(ws)
+        manager.update_subscription(client, "subscribe", {"batch": True})
+        await manager.broadcast({"type": "message_stream", "data": {"stream_id": "s1", "agent_id": 1,
+                                                                    "delta": "а", "done": False}})
+        manager.flush_batch()
+        await _drain()
+        frame = next(m for m in ws.sent if m["type"] == "tick_batch")
+        assert "seq" not in frame
+        assert manager.seq == 0
+
+    async def test_tick_batch_carries_last_seq(self, make_manager):
+        manager = make_manager(batch_window=60.0)
+        ws = FakeWebSocket()
+        client = await manager.connect(ws)
+        manager.update_subscription(client, "subscribe", {"batch": True})
+        await manager.broadcast(_mood(1, 1))
+        await manager.broadcast(_mood(2, 2))
+        manager.flush_batch()
+        await _drain()
+        frame = next(m for m in ws.sent if m["type"] == "tick_batch")
+        assert frame["seq"] == 2
+        assert [m["seq"] for m in frame["data"]["messages"]] == [1, 2]